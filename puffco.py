@@ -1,112 +1,74 @@
+from puffco import trace  # first, so the cold-start timeline includes every import
+trace.configure()
+
 import builtins
+import os
+import signal
 import sys
 
-from asyncio import all_tasks, CancelledError, ensure_future, get_event_loop, sleep
-from datetime import datetime
+from asyncio import all_tasks, CancelledError, set_event_loop
 
 from PyQt6.QtGui import QFont, QFontDatabase
 from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QSettings
+from qasync import QEventLoop
 
+from puffco.gateway import Gateway, gateway_port
+from puffco.httpd import metrics_port, serve_metrics
+from puffco.log import PuffcoLog, level_from_name
+from puffco.settings import Settings
+from puffco.tasks import TASKS
 from puffco.ui.themes import THEMES
 from puffco.ui import PuffcoMain
 
-
-class LogAndOutput:
-    TIMESTAMP_FORMAT = '[%m/%d/%Y %H:%M:%S]'
-
-    def __init__(self):
-        self.console = sys.stdout
-        self.log_file = open("puffco.log", "w+", encoding='utf-8')
-
-    def close_log(self):
-        if (not self.log_file) or self.log_file.closed:
-            return
-
-        print('Exiting..')
-        self.log_file.close()
-
-    def write(self, text: str):
-        if not isinstance(text, str):
-            return
-
-        if self.log_file.closed:
-            return
-
-        time = datetime.now().strftime(self.TIMESTAMP_FORMAT)
-        if text.rstrip():  # skip over newlines
-            text = ': '.join([time, text])
-        self.log_file.write(text)
-        self.log_file.flush()
-        self.console.write(text)
-
-    def flush(self):  # needed for py3
-        pass
-
-
-async def process():
-    # replacement for app._exec, allowing us to use
-    # asyncio's event loops to update the UI
-    while True:
-        try:
-            app.processEvents()
-            await sleep(0)
-        except (CancelledError, KeyboardInterrupt):
-            break
-
-
-def initialize_settings(_settings):
-    _settings.beginGroup('General')
-    _settings.setValue('TemperatureUnit', 'fahrenheit')  # TODO: implement
-    _settings.setValue('Theme', 'unset')
-    _settings.endGroup()
-
-    _settings.beginGroup('Modes')
-    _settings.setValue('Lantern', False)
-    _settings.setValue('Ready', False)
-    _settings.setValue('Boost', None)  # TODO (setting temp/time sliders)
-    _settings.setValue('Stealth', False)
-    _settings.endGroup()
-
-    _settings.beginGroup('Home')
-    _settings.setValue('HideDabCounts', False)
-    _settings.endGroup()
-
-    # TODO: think of (and implement) profile settings
-    _settings.beginGroup('Profiles')
-    _settings.endGroup()
-
-
-builtins.settings = settings = QSettings('settings.ini', QSettings.Format.IniFormat)
-if not settings.allKeys():
-    initialize_settings(settings)
-
-logger = builtins.logger = sys.stdout = LogAndOutput()
-main_loop = builtins.loop = get_event_loop()
+builtins.settings = settings = Settings('settings.ini')
+logger = builtins.logger = sys.stdout = PuffcoLog(
+    level=level_from_name(os.environ.get('PUFFCO_LOG_LEVEL') or settings.value('General/LogLevel', 'INFO', str)))
 builtins.theme = THEMES.get(settings.value('General/Theme', 'unset', str), THEMES['basic'])
+trace.mark('imports')
 
 
 if __name__ == "__main__":
-    app = QApplication([])
+    app = QApplication(sys.argv)
     QFontDatabase.addApplicationFont(':/fonts/puffco_slick.ttf')
     QFontDatabase.addApplicationFont(':/fonts/bigshoulders_medium.ttf')
     app.setFont(QFont('Big Shoulders Display Medium', 16))
+    trace.mark('application')
+
+    # asyncio runs on top of Qt's event dispatcher, so both wait (and wake) together
+    main_loop = builtins.loop = QEventLoop(app)
+    set_event_loop(main_loop)
+    try:
+        # Ctrl+C has to wake the loop itself, Python never runs while Qt is waiting
+        main_loop.add_signal_handler(signal.SIGINT, main_loop.stop)
+    except NotImplementedError:  # windows
+        pass
 
     try:
-        ensure_future(process())
-        ensure_future(PuffcoMain().connect(), loop=main_loop)
+        window = PuffcoMain()
+        port = metrics_port(sys.argv, settings)
+        if port:
+            TASKS.spawn(serve_metrics(window, port), 'metrics server', scope='app')
+        port = gateway_port(sys.argv, settings)
+        if port:
+            TASKS.spawn(Gateway(window, port).start(), 'gateway', scope='app')
+        TASKS.spawn(window.connect(), 'connect', scope='app', critical=True)
         main_loop.run_forever()
     except (KeyboardInterrupt, CancelledError):
         pass
     finally:
+        trace_path = trace.stop()
+        if trace_path:
+            print(f'Trace written to {trace_path}')
+
         # flush and close our custom log handler
+        settings.sync()
         logger.close_log()
-        if main_loop:
-            # stop all of our tasks:
-            for task in all_tasks(main_loop):
-                task.cancel()
 
-            # stop our main loop, and close the app
-            main_loop.stop()
+        # stop all of our tasks:
+        TASKS.cancel_all()
+        for task in all_tasks(main_loop):
+            task.cancel()
 
+        # stop our main loop, and close the app
+        main_loop.stop()
         app.quit()
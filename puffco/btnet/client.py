@@ -1,7 +1,9 @@
 import builtins
+import logging
 import math
 import contextlib
-from asyncio import Event, ensure_future, TimeoutError, wait_for
+import time
+from asyncio import Event, Lock, TimeoutError, ensure_future, shield, wait_for
 from datetime import datetime
 from typing import Union
 
@@ -10,8 +12,11 @@ from hashlib import sha256
 
 from bleak import BleakClient, BleakError
 
+from puffco.tasks import TASKS
+from puffco.telemetry.metrics import BLE_METRICS
 from . import *
 from .buffer import Buffer
+from .state import DeviceState
 
 PROFILE_TO_BYTE_ARRAY = {0: bytearray([0, 0, 0, 0]),
                          1: bytearray([0, 0, 128, 63]),
@@ -20,25 +25,37 @@ PROFILE_TO_BYTE_ARRAY = {0: bytearray([0, 0, 0, 0]),
 
 
 REVISION_CHARS = "ABCDEFGHJKMNPRTUVWXYZ"
+READ_TIMEOUT = 3  # seconds to wait for a lorax reply
+READ_RETRIES = 1
+BOOST_MAX_AGE = 3  # seconds a polled target temperature may be old and still be boosted from without a read
+LORAX_OPCODE_NAMES = {value: name for name, value in vars(LoraxOpCodes).items() if not name.startswith('_')}
+CHAR_NAMES = {value: name for chars in (Characteristics, LoraxCharacteristics)
+              for name, value in vars(chars).items() if isinstance(value, str) and not name.startswith('_')}
+
+log = logging.getLogger(__name__)
 
 
 class PuffcoBleakClient(BleakClient):
     DEVICE_NAME, DEVICE_MAC_ADDRESS, RETRIES = '', None, 0
-    LANTERN_ENABLED, LANTERN_COLOR = None, None
 
     SEQUENCE_ID = 0
     USE_LORAX_PROTOCOL, LORAX_PROTO_VER = False, None
     MAX_PAYLOAD, MAX_FILES, MAX_CMDS = 0, 0, 0  # received from getLimits opcode
 
-    def __init__(self, device_mac_addr, **kwargs):
+    def __init__(self, device_mac_addr, *, state: DeviceState = None, **kwargs):
         builtins.client = self
+        self.state = state if state is not None else DeviceState()  # the window's, which outlives its clients
         self.transactions = {}
         self.transaction_responses = {}
+        self.reads_in_flight = {}  # (char, number) -> task, shared by every concurrent read of it
+        self.boosting = Lock()  # a quick second tap boosts from what the first one wrote
         super(PuffcoBleakClient, self).__init__(device_mac_addr, **kwargs)
 
     async def write_gatt_char(self, char, data: Union[bytes, bytearray], *, response: bool = None, number=0) -> None:
+        # a read already on the air may return the value from before this write: later reads must not join it
+        self.reads_in_flight.pop((char, number or 0), None)
         if char in (Characteristics.LANTERN_COLOR, LoraxCharacteristics.LANTERN_COLOR):
-            self.LANTERN_COLOR = data
+            self.state.update(lantern_color=bytes(data))
 
         if self.USE_LORAX_PROTOCOL:
             if char not in LoraxCharacteristics.PROTOCOL_CHARS:
@@ -51,12 +68,32 @@ class PuffcoBleakClient(BleakClient):
 
                 return await self.write_short(lorax_path, data)
 
-        return await super(PuffcoBleakClient, self).write_gatt_char(char, data, response=response)
+        return await self._timed('write', char, super(PuffcoBleakClient, self).write_gatt_char(char, data,
+                                                                                              response=response))
 
     async def read_gatt_char(self, char, **kwargs) -> bytearray:
+        # single-flight: a read of a characteristic (and index) that is already on the air waits for that one
+        key = (char, kwargs.get('number') or 0)  # (no number reads index 0)
+        read = self.reads_in_flight.get(key)
+        if read is None:
+            read = self.reads_in_flight[key] = ensure_future(self._read_gatt_char(char, **kwargs))
+            read.add_done_callback(lambda _read: self._read_done(key, _read))
+            read.add_done_callback(lambda _read: _read.cancelled() or _read.exception())  # retrieved if abandoned
+        else:
+            BLE_METRICS.deduplicate(('read', CHAR_NAMES.get(str(char), str(char))))
+
+        # shielded, so a cancelled caller does not cancel the read for everyone else
+        data = await shield(read)
+        return bytearray(data) if isinstance(data, (bytes, bytearray)) else data
+
+    def _read_done(self, key, read):
+        if self.reads_in_flight.get(key) is read:  # (unless a write has dropped it since)
+            del self.reads_in_flight[key]
+
+    async def _read_gatt_char(self, char, **kwargs) -> bytearray:
         if self.USE_LORAX_PROTOCOL:
             if char in LoraxCharacteristics.PROTOCOL_CHARS:
-                data = await super(PuffcoBleakClient, self).read_gatt_char(char, **kwargs)
+                data = await self._timed('read', char, super(PuffcoBleakClient, self).read_gatt_char(char, **kwargs))
             else:
                 lorax_path = CHAR_UUID2LORAX_PATH[char]
                 if '%N' in lorax_path:
@@ -68,13 +105,28 @@ class PuffcoBleakClient(BleakClient):
 
                 data = await self.read_short(lorax_path)
         else:
-            data = await super(PuffcoBleakClient, self).read_gatt_char(char, **kwargs)
+            data = await self._timed('read', char, super(PuffcoBleakClient, self).read_gatt_char(char, **kwargs))
 
         if char in (Characteristics.LANTERN_COLOR, LoraxCharacteristics.LANTERN_COLOR):
-            self.LANTERN_COLOR = data
+            self.state.update(lantern_color=bytes(data))
 
         return data
 
+    @staticmethod
+    async def _timed(operation, char, request):
+        key = (operation, CHAR_NAMES.get(str(char), str(char)))
+        start = time.perf_counter()
+        try:
+            result = await request
+        except TimeoutError:
+            BLE_METRICS.timeout(key)
+            raise
+        except (BleakError, OSError):
+            BLE_METRICS.error(key)
+            raise
+        BLE_METRICS.record(key, time.perf_counter() - start)
+        return result
+
     @staticmethod
     def create_auth_token(access_seed, handshake_key):
         new_key = bytearray(32)
@@ -110,18 +162,20 @@ class PuffcoBleakClient(BleakClient):
         sequence_id = buffer.readUInt16LE(0)
         bu = buffer.readUInt8(2)
 
-        transaction = self.transactions.get(sequence_id, None)
+        transaction = self.transactions.pop(sequence_id, None)
         if not transaction:
-            print(f'Lorax replied with unrecognized sequenceId: {sequence_id}')
-            if transaction['flag']:  # callback is asyncio.Event.set
-                self.transaction_responses[f"{sequence_id}-{transaction['path']}"] = None
-                transaction['deferred']()  # set flag
+            # unknown, or a read that already timed out
+            log.debug('Lorax replied with unrecognized sequenceId: %s', sequence_id)
+            BLE_METRICS.error(('reply', 'unknown sequenceId'))
             return
 
         opcode = transaction['opcode']
         path = transaction['path']
+        key = self.transaction_key(transaction)
+        BLE_METRICS.record(key, time.perf_counter() - transaction['sent'])
         if bu:
-            print(f'Lorax replied with error "{bu}" for seq {sequence_id}  op: {opcode}  path: {path}')
+            BLE_METRICS.error(key)
+            log.warning('Lorax replied with error "%s" for seq %s  op: %s  path: %s', bu, sequence_id, opcode, path)
             if transaction['flag']:  # callback is asyncio.Event.set
                 self.transaction_responses[f"{sequence_id}-{transaction['path']}"] = None
                 transaction['deferred']()  # set flag
@@ -158,7 +212,7 @@ class PuffcoBleakClient(BleakClient):
 
     @staticmethod
     def lorax_event(*args, **kwargs):  # TODO: loraxEventHandler (do i even need this?)
-        print('lorax_event', args, kwargs)
+        log.debug('lorax_event %s %s', args, kwargs)
 
     async def init_lorax_proto(self):
         try:
@@ -237,11 +291,28 @@ class PuffcoBleakClient(BleakClient):
     async def read_short(self, char_path):
         bm = 0  # not sure what this is supposed to be, but it is always 0
         bp = self.read_short_cmd(bm, self.MAX_PAYLOAD, char_path)
-        resp = Event()
-        read_tx = self.make_transaction(LoraxOpCodes.READ_SHORT, char_path, bp, callback=resp.set, flag=True)
-        ensure_future(self.write_gatt_char(LoraxCharacteristics.LORAX_COMMAND, read_tx['cmd'], response=False))
-        await resp.wait()
-        return self.transaction_responses.pop(f"{read_tx['sequenceId']}-{char_path}")
+        for attempt in range(READ_RETRIES + 1):
+            resp = Event()
+            read_tx = self.make_transaction(LoraxOpCodes.READ_SHORT, char_path, bp, callback=resp.set, flag=True)
+            TASKS.spawn(self.write_gatt_char(LoraxCharacteristics.LORAX_COMMAND, read_tx['cmd'], response=False),
+                        'lorax read command', critical=True)
+            try:
+                await wait_for(resp.wait(), timeout=READ_TIMEOUT)
+            except TimeoutError:
+                # forget the transaction; a late reply is counted as unrecognized
+                self.transactions.pop(read_tx['sequenceId'], None)
+                key = self.transaction_key(read_tx)
+                BLE_METRICS.timeout(key)
+                if attempt < READ_RETRIES:
+                    BLE_METRICS.retry(key)
+                    continue
+                raise BleakError(f'Timed out reading {char_path}')
+
+            return self.transaction_responses.pop(f"{read_tx['sequenceId']}-{char_path}")
+
+    @staticmethod
+    def transaction_key(transaction):
+        return LORAX_OPCODE_NAMES.get(transaction['opcode'], str(transaction['opcode'])), transaction['path']
 
     def make_transaction(self, op_code, char_path, bf, callback=None, args=None, flag=False):
         tx_id = self.get_next_sequence_id()
@@ -255,6 +326,7 @@ class PuffcoBleakClient(BleakClient):
             'deferred': callback,
             'args': args,
             'flag': flag,
+            'sent': time.perf_counter(),
         }
 
         self.transactions[tx_id] = transaction
@@ -304,15 +376,18 @@ class PuffcoBleakClient(BleakClient):
     async def preheat(self, cancel=False) -> None:
         await self.send_mode_command(DeviceCommands.HEAT_CYCLE_ABORT if cancel else DeviceCommands.HEAT_CYCLE_START)
 
-    async def get_battery_charge_eta(self):
+    async def get_battery_charge_eta(self, is_charging: bool = None):
         """
         Get the estimated seconds until the battery is fully charged
+        :param is_charging: the charge state, if the caller has just read it (saves reading it again)
         :returns:
             None (DEVICE NOT CHARGING)
             -1 (DEVICE FULLY CHARGED ?)
             int (CHARGING; SECONDS UNTIL CHARGED)
         """
-        if not (await self.is_currently_charging())[0]:
+        if is_charging is None:
+            is_charging = (await self.is_currently_charging())[0]
+        if not is_charging:
             return None
 
         full_eta = parse(await self.read_gatt_char(Characteristics.BATTERY_CHARGE_FULL_ETA))
@@ -334,11 +409,16 @@ class PuffcoBleakClient(BleakClient):
         raw_dpd_data = await self.read_gatt_char(Characteristics.DABS_PER_DAY)
         return str(round(float(parse(raw_dpd_data)), 1))
 
+    async def get_heater_temp(self) -> float:
+        return float(parse(await self.read_gatt_char(Characteristics.HEATER_TEMP)))  # celsius
+
     async def get_bowl_temperature(self, celsius=False, integer=False) -> str:
-        heater_temp_data = parse(await self.read_gatt_char(Characteristics.HEATER_TEMP))
-        if heater_temp_data.lower() == 'nan':  # temp_celsius is nan when the atomizer is removed
+        return self.format_temperature(await self.get_heater_temp(), celsius=celsius, integer=integer)
+
+    @staticmethod
+    def format_temperature(temp_celsius: float, celsius=False, integer=False):
+        if math.isnan(temp_celsius):  # temp_celsius is nan when the atomizer is removed
             return f'--- °{"C" if celsius else "F"}'
-        temp_celsius = float(heater_temp_data)
 
         if celsius:
             celsius = int(temp_celsius)
@@ -438,36 +518,51 @@ class PuffcoBleakClient(BleakClient):
         return float(parse(await self.read_gatt_char(Characteristics.HEATER_TARGET_TEMP)))
 
     async def boost(self, val: float, is_time: bool = False) -> None:
-        if is_time:
-            char = Characteristics.TIME_OVERRIDE
-            total = max(await self.get_state_ttime(), 0)
-            elapsed = max(total - val, 0)
-            elapsed += Constants.DABBING_ADDED_TIME
-            val = elapsed
-        else:
-            char = Characteristics.TEMPERATURE_OVERRIDE
-            target_temp = await self.get_target_temp()  # celsius
-            increment = Constants.DABBING_ADDED_TEMP_CELSIUS
-            # NOTE: DABBING_ADDED_TEMP_FAHRENHEIT is unused because it causes a HUGE increase in bowl temp
-
-            # fe((0, b.bleAddDabbingTemp)(targetTemp - profileBaseTemp + At, Ne))
-            # At = DABBING_ADDED_TEMP_CELSIUS or DABBING_ADDED_TEMP_FAHRENHEIT
-            # Ne = temp. unit (converts to celsius prior to sending to device)
-            val = target_temp - val + increment
-
-        await self.write_gatt_char(char, struct.pack('f', val))
+        # boosting from what the pollers last read (and earlier boosts changed) takes one write instead of
+        # a read and a write; only a stale value is read again
+        async with self.boosting:
+            if is_time:
+                char = Characteristics.TIME_OVERRIDE
+                # (the device's own boost button changes it too, so it is polled like the target temperature)
+                total = self.state.fresh('total_time', BOOST_MAX_AGE, since='operating_state')
+                if total is None:
+                    total = await self.get_state_ttime()
+                total = max(total, 0)
+                elapsed = max(total - val, 0)
+                elapsed += Constants.DABBING_ADDED_TIME
+                boosted = {'total_time': val + elapsed}
+                val = elapsed
+            else:
+                char = Characteristics.TEMPERATURE_OVERRIDE
+                target_temp = self.state.fresh('target_temp', BOOST_MAX_AGE, since='operating_state')
+                if target_temp is None:
+                    target_temp = await self.get_target_temp()  # celsius
+                increment = Constants.DABBING_ADDED_TEMP_CELSIUS
+                boosted = {'target_temp': target_temp + increment}
+                # NOTE: DABBING_ADDED_TEMP_FAHRENHEIT is unused because it causes a HUGE increase in bowl temp
+
+                # fe((0, b.bleAddDabbingTemp)(targetTemp - profileBaseTemp + At, Ne))
+                # At = DABBING_ADDED_TEMP_CELSIUS or DABBING_ADDED_TEMP_FAHRENHEIT
+                # Ne = temp. unit (converts to celsius prior to sending to device)
+                val = target_temp - val + increment
+
+            await self.write_gatt_char(char, struct.pack('f', val))
+            self.state.update(**boosted)  # what the override made it (polls begun earlier keep off it)
 
     async def get_state_etime(self) -> float:
         return float(parse(await self.read_gatt_char(Characteristics.STATE_ELAPSED_TIME)))
 
     async def get_state_ttime(self) -> float:
-        return float(parse(await self.read_gatt_char(Characteristics.STATE_TOTAL_TIME)))
+        started = time.monotonic()
+        total = float(parse(await self.read_gatt_char(Characteristics.STATE_TOTAL_TIME)))
+        self.state.update_since(started, total_time=total)  # unless a boost was written meanwhile
+        return total
 
     async def send_lantern_status(self, status: bool) -> None:
-        if status == self.LANTERN_ENABLED:
+        if status == self.state.lantern_enabled:
             return
 
-        self.LANTERN_ENABLED = status
+        self.state.update(lantern_enabled=status)
         if self.USE_LORAX_PROTOCOL:
             data = bytearray([int(status)])
         else:
@@ -503,11 +598,23 @@ class PuffcoBleakClient(BleakClient):
         # return the highest value, since the LEDs will always have the same brightness
         return max(brightness_data)
 
-    async def send_boost_settings(self, slider: str, val: int) -> None:
-        characteristic = Characteristics.BOOST_TEMP if slider == 'temp' else Characteristics.BOOST_TIME
-        await self.write_gatt_char(characteristic, struct.pack('f', val))
+    async def send_boost_settings(self, slider: str, val: int, i: int) -> None:
+        if slider == 'temp':
+            await self.set_boost_temp(val, i)
+        else:
+            await self.set_boost_time(val, i)
 
     async def get_boost_settings(self, i) -> (int, int):
-        raw_boost_temp = await self.read_gatt_char(Characteristics.BOOST_TEMP, number=i)
-        raw_boost_time = await self.read_gatt_char(Characteristics.BOOST_TIME, number=i)
-        return int(float(parse(raw_boost_temp))), int(float(parse(raw_boost_time)))
+        return await self.get_boost_temp(i), await self.get_boost_time(i)
+
+    async def set_boost_temp(self, temperature: int, i: int) -> None:
+        await self.write_gatt_char(Characteristics.BOOST_TEMP, struct.pack('<f', temperature), number=i)
+
+    async def get_boost_temp(self, i) -> int:
+        return int(float(parse(await self.read_gatt_char(Characteristics.BOOST_TEMP, number=i))))
+
+    async def set_boost_time(self, seconds: int, i: int) -> None:
+        await self.write_gatt_char(Characteristics.BOOST_TIME, struct.pack('<f', seconds), number=i)
+
+    async def get_boost_time(self, i) -> int:
+        return int(float(parse(await self.read_gatt_char(Characteristics.BOOST_TIME, number=i))))
@@ -0,0 +1,122 @@
+"""
+Operating state machine.
+
+The poller feeds every operating state it reads to `observe`; the machine decides when the device has actually
+moved to another state and runs the hooks registered for that move, once:
+
+    machine.on_exit(HEAT_CYCLE_STATES, on_cycle_end)     # from PREHEAT or ACTIVE to anything else
+    machine.on_enter(HEAT_CYCLE_STATES, on_cycle_start)  # from anything else to PREHEAT or ACTIVE
+    machine.on_transition(OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE, on_heated_up)
+
+States given as a group are entered and left as a whole, so moving within the group (PREHEAT -> ACTIVE) is
+neither an exit nor an enter. Debounced states only count once they have been seen for their hold time, so a
+momentary one (the battery display after a button press) never fires hooks for itself or the state around it.
+"""
+import logging
+import time
+from collections import deque, namedtuple
+
+from puffco.tasks import EXPECTED_ERRORS
+from . import OperatingState
+
+Transition = namedtuple('Transition', ('source', 'target', 'at', 'duration'))  # duration: seconds spent in source
+
+log = logging.getLogger(__name__)
+
+
+def _states(states) -> frozenset:
+    if isinstance(states, (int, OperatingState)):
+        return frozenset((OperatingState(states),))
+    return frozenset(OperatingState(state) for state in states)
+
+
+class OperatingStateMachine:
+    def __init__(self, state, debounce: dict = None, history: int = 64):
+        """ `state`: the DeviceState whose operating_state this machine owns; debounce: {state: hold seconds} """
+        self.state = state
+        self.debounce = {OperatingState(s): hold for s, hold in (debounce or {}).items()}
+        self.entered_at = None
+        self.history = deque(maxlen=history)
+        self.debounced = 0  # transient states that never became current
+        self._hooks = []  # (sources or None, targets or None, hook, group entered/left as a whole or None)
+        self._pending = None  # (state, first seen) while a debounced state is waiting out its hold
+
+    @property
+    def current(self):
+        return None if self.state.operating_state is None else OperatingState(self.state.operating_state)
+
+    def time_in_state(self) -> float:
+        return 0.0 if self.entered_at is None else time.monotonic() - self.entered_at
+
+    # hooks are called with the Transition, and may be coroutine functions
+    def on_enter(self, states, hook):
+        group = _states(states)
+        self._hooks.append((None, group, hook, group))
+
+    def on_exit(self, states, hook):
+        group = _states(states)
+        self._hooks.append((group, None, hook, group))
+
+    def on_transition(self, sources, targets, hook):
+        self._hooks.append((_states(sources), _states(targets), hook, None))
+
+    def hooks_for(self, source, target) -> list:
+        hooks = []
+        for sources, targets, hook, group in self._hooks:
+            if sources is not None and source not in sources:
+                continue
+            if targets is not None and target not in targets:
+                continue
+            if group is not None and (source in group) == (target in group):
+                continue  # moving within (or outside of) the group
+            hooks.append(hook)
+        return hooks
+
+    async def observe(self, operating_state, now: float = None):
+        """ Take a polled operating state, returns the Transition it caused (hooks run by then) or None """
+        now = time.monotonic() if now is None else now
+        target, source = OperatingState(operating_state), self.current
+        if target == source:
+            if self._pending is not None:
+                self.debounced += 1
+                self._pending = None
+            return None
+
+        hold = self.debounce.get(target)
+        if hold:
+            if self._pending is None or self._pending[0] != target:
+                if self._pending is not None:
+                    self.debounced += 1
+                self._pending = (target, now)
+                return None
+            if now - self._pending[1] < hold:
+                return None
+        elif self._pending is not None:
+            self.debounced += 1
+        self._pending = None
+
+        transition = Transition(source, target, now, None if self.entered_at is None else now - self.entered_at)
+        self.entered_at = now
+        self.history.append(transition)
+        self.state.update(operating_state=target)
+        if source is None:
+            return transition  # the first state seen (after connecting) is where we start, not a change
+
+        log.debug('OpState changed %s --> %s', source.name, target.name)
+        for hook in self.hooks_for(source, target):
+            try:
+                result = hook(transition)
+                if hasattr(result, '__await__'):
+                    await result
+            except EXPECTED_ERRORS as e:
+                log.warning('%s -> %s hook %s failed: %r', source.name, target.name,
+                            getattr(hook, '__qualname__', hook), e)
+            except Exception:
+                log.exception('%s -> %s hook %s crashed', source.name, target.name,
+                              getattr(hook, '__qualname__', hook))
+        return transition
+
+    def reset(self):
+        """ The device is gone; the next state observed is a fresh start """
+        self._pending = None
+        self.entered_at = None
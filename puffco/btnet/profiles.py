@@ -0,0 +1,110 @@
+from asyncio import gather
+
+from bleak import BleakError
+
+PROFILE_COUNT = 4  # heat profiles on every device
+# profile attribute -> (client setter, client getter, does the value read back match the one written)
+PROFILE_FIELDS = {
+    'name': ('set_profile_name', 'get_profile_name',
+             lambda written, read: str(read).upper() == str(written).upper()),
+    'temperature': ('set_profile_temp', 'get_profile_temp',  # read back rounded to whole degrees
+                    lambda written, read: abs(float(read) - float(written)) < 1),
+    'duration': ('set_profile_time', 'get_profile_time',
+                 lambda written, read: int(read) == int(written)),
+    'color_bytes': ('set_profile_color', 'get_profile_color',
+                    lambda written, read: list(read)[:len(written)] == list(written)),
+    'boost_temp': ('set_boost_temp', 'get_boost_temp',
+                   lambda written, read: abs(float(read) - float(written)) < 1),
+    'boost_time': ('set_boost_time', 'get_boost_time',
+                   lambda written, read: int(read) == int(written)),
+}
+
+
+class ProfileWriteError(BleakError):
+    def __init__(self, idx, fields, cause=None):
+        self.idx = idx
+        self.fields = fields
+        super(ProfileWriteError, self).__init__(f'Profile {idx + 1}: the device did not take {", ".join(fields)}'
+                                                + (f' ({cause})' if cause else ''))
+
+
+class ProfileTransaction:
+    """
+    Saves a locally edited profile.
+    Only the fields that differ from `profile.device` (what the device is known to hold) are written, and read back
+    to confirm them, in one pipeline; on failure the profile is rolled back to what the device actually has.
+    """
+
+    def __init__(self, client, profile):
+        self.client = client
+        self.profile = profile
+
+    def diff(self) -> dict:
+        local = self.profile.snapshot()
+        return {field: value for field, value in local.items()
+                if value is not None and value != self.profile.device.get(field)}  # None: not known locally
+
+    async def commit(self) -> dict:
+        """ Write and verify the changes, returns them. Raises ProfileWriteError after rolling back """
+        changes = self.diff()
+        if not changes:
+            return changes
+
+        client, profile, idx = self.client, self.profile, self.profile.idx
+        device = dict(profile.device)
+        # the select (non-lorax firmware: points the profile characteristics at this one), the writes and the reads
+        # are all queued on the link now, in that order, rather than each step waiting for the one before
+        requests = [client.change_profile(idx)]
+        requests += [getattr(client, PROFILE_FIELDS[field][0])(value, idx) for field, value in changes.items()]
+        requests += [getattr(client, PROFILE_FIELDS[field][1])(idx) for field in changes]
+        try:
+            results = await gather(*requests, return_exceptions=True)
+            for result in results[:len(changes) + 1]:
+                if isinstance(result, (BleakError, OSError)):
+                    raise ProfileWriteError(idx, list(changes), result) from result
+                elif isinstance(result, BaseException):
+                    raise result
+        except BaseException:
+            profile.restore(device)  # nothing could be confirmed (whatever went wrong, cancelled included)
+            raise
+        read_back = results[len(changes) + 1:]
+
+        failed = []
+        for (field, written), read in zip(changes.items(), read_back):
+            if isinstance(read, BaseException):
+                failed.append(field)
+            elif PROFILE_FIELDS[field][2](written, read):
+                device[field] = written
+            else:
+                failed.append(field)
+                device[field] = list(read) if field == 'color_bytes' else read
+
+        profile.device = device
+        if failed:
+            profile.restore(device)
+            raise ProfileWriteError(idx, failed)
+        return changes
+
+
+async def commit_profiles(client, profiles) -> dict:
+    """
+    Commit every profile's ProfileTransaction, returns {idx: changes}.
+    Lorax firmware addresses each profile by number, so all of them are written and verified at once; older
+    firmware has one set of profile characteristics, pointed at a profile by change_profile, so they go one by one.
+    Every profile is attempted; the first ProfileWriteError is raised once they all have finished.
+    """
+    transactions = [ProfileTransaction(client, profile) for profile in profiles]
+    if client.USE_LORAX_PROTOCOL:
+        results = await gather(*(transaction.commit() for transaction in transactions), return_exceptions=True)
+    else:
+        results = []
+        for transaction in transactions:
+            try:
+                results.append(await transaction.commit())
+            except ProfileWriteError as e:
+                results.append(e)
+
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return {profile.idx: changes for profile, changes in zip(profiles, results)}
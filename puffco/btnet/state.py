@@ -0,0 +1,95 @@
+"""
+What is known about the connected device, in one place.
+
+Pollers, the client and the UI write readings with `state.update(...)`; readers take `state.snapshot()`, an immutable
+tuple that is only rebuilt after something changed. Every field remembers when it was last written, so a reader can
+tell a fresh value from a stale one (`state.age('target_temp')`).
+"""
+import math
+import time
+from collections import namedtuple
+
+FIELDS = (
+    'connected', 'device',  # link
+    'operating_state', 'profile', 'profile_name',  # see btnet.OperatingState; the profile (0-3) selected on the device
+    'heater_temp', 'target_temp', 'elapsed', 'total_time',  # celsius, seconds into / total of the current state
+    'battery', 'charging', 'bulk_charging', 'charge_eta',
+    'total_dabs', 'daily_dabs',
+    'lantern_enabled', 'lantern_color', 'lantern_brightness',
+    'boost_temp', 'boost_time',  # the boost settings of the selected profile
+)
+
+Snapshot = namedtuple('Snapshot', ('version',) + FIELDS)
+
+
+class DeviceState:
+    __slots__ = FIELDS + ('version', 'written', '_snapshot', '_listeners')
+
+    def __init__(self):
+        self.version = 0
+        self.written = {}  # field -> time.monotonic() of its last update
+        self._snapshot = None
+        self._listeners = []
+        for field in FIELDS:
+            setattr(self, field, None)
+
+    def update(self, **fields) -> dict:
+        """ Write `fields` (nan is stored as None), returns the ones whose value changed """
+        now = time.monotonic()
+        delta = {}
+        for field, value in fields.items():
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            if getattr(self, field) != value:
+                setattr(self, field, value)
+                delta[field] = value
+            self.written[field] = now
+
+        if delta:
+            self.version += 1
+            for listener in self._listeners:
+                listener(delta)
+        return delta
+
+    def update_since(self, started: float, **fields) -> dict:
+        """ update(), skipping the fields written after `started` (the time.monotonic() a read of them began at) """
+        return self.update(**{field: value for field, value in fields.items()
+                              if self.written.get(field, -math.inf) <= started})
+
+    def age(self, field) -> float:
+        """ Seconds since `field` was last written, inf if it never was """
+        written = self.written.get(field)
+        return math.inf if written is None else time.monotonic() - written
+
+    def fresh(self, field, max_age: float, since: str = None):
+        """
+        The value of `field` if it was written in the last `max_age` seconds (and, given `since`, no earlier than that
+        field last was), else None
+        """
+        age = self.age(field)
+        if age > max_age or (since is not None and self.age(since) < age):
+            return None
+        return getattr(self, field)
+
+    def snapshot(self) -> Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != self.version:
+            snapshot = self._snapshot = Snapshot(self.version, *(getattr(self, field) for field in FIELDS))
+        return snapshot
+
+    def listen(self, callback):
+        """ Call `callback(delta)` after every update that changed something """
+        self._listeners.append(callback)
+
+    def clear(self, *keep):
+        """ Forget everything (but `keep`), e.g. once the device is gone """
+        delta = {field: None for field in FIELDS if field not in keep and getattr(self, field) is not None}
+        for field in FIELDS:
+            if field not in keep:
+                self.written.pop(field, None)
+        if delta:
+            for field in delta:
+                setattr(self, field, None)
+            self.version += 1
+            for listener in self._listeners:
+                listener(delta)
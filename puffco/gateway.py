@@ -0,0 +1,288 @@
+"""
+Local control gateway: REST commands for the connected device and a WebSocket feed of its state.
+
+    GET  /state                       everything known right now (no device reads)
+    POST /preheat                     {"cancel": false}
+    POST /boost                       {"time": false}   boost the running heat cycle's temperature (or time)
+    POST /profile                     {"profile": 2}    make profile 2 (0-3) current
+    POST /lantern/color               {"color": [255, 0, 0]} or {"color": "#ff0000"}
+    POST /profiles/{idx}              any of {"name", "temperature" (celsius), "time" (seconds), "color"},
+                                      written and verified together (502, and the profile rolled back to what
+                                      the device holds, if it did not take them)
+    GET  /library                     the local profile library: {"profiles": [...], "sets": {name: [4 names]}}
+    POST /library/profiles            {"profile": 2, "name": "EVENING"}  store device profile 2 (under its own
+                                      name if none is given)
+    POST /library/sets/{name}         {"profiles": ["EVENING", null, "FLAVOR", "CLOUDS"]}  null leaves that slot alone
+    POST /library/load                {"profiles": [4 names or nulls]} or {"set": "NIGHT"}: put them on the device,
+                                      writing only the fields that differ (502 as for /profiles/{idx})
+    GET  /ws                          WebSocket: a snapshot, then one JSON delta per change
+
+Command bodies are JSON (and must be sent as application/json). Requests coming from a browser page
+(an Origin header other than localhost) or addressed to another host name are refused.
+"""
+import json
+import logging
+
+from bleak import BleakError
+
+from puffco.btnet import Constants
+from puffco.btnet.profiles import PROFILE_COUNT, ProfileTransaction
+from puffco.httpd import HttpServer, Response, configured_port
+from puffco.library import ProfileLibrary
+from puffco.tasks import TASKS
+
+DEFAULT_GATEWAY_PORT = 9478
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '[::1]')
+
+log = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    def __init__(self, message, status=400):
+        super(GatewayError, self).__init__(message)
+        self.status = status
+
+
+def json_response(body, status=200) -> Response:
+    return Response(json.dumps(body), status, 'application/json')
+
+
+def parse_color(value) -> tuple:
+    if isinstance(value, str):
+        value = value.lstrip('#')
+        if len(value) != 6:
+            raise GatewayError('color must be "#rrggbb" or [r, g, b]')
+        return tuple(bytes.fromhex(value))
+    if not isinstance(value, (list, tuple)) or len(value) != 3 or \
+            not all(isinstance(c, int) and 0 <= c <= 255 for c in value):
+        raise GatewayError('color must be "#rrggbb" or [r, g, b]')
+    return tuple(value)
+
+
+class Gateway:
+    """ HTTP + WebSocket front end for `window` (a PuffcoMain); every subscriber shares the window's StateFeed """
+
+    def __init__(self, window, port=DEFAULT_GATEWAY_PORT, host='127.0.0.1', library=None):
+        self.window = window
+        self.feed = window.feed
+        self.server = HttpServer(host, port)
+        self.subscribers = 0
+        self._library = library
+        for method, path, handler in (('GET', '/state', self.state),
+                                      ('POST', '/preheat', self.preheat),
+                                      ('POST', '/boost', self.boost),
+                                      ('POST', '/profile', self.change_profile),
+                                      ('POST', '/lantern/color', self.lantern_color),
+                                      ('POST', '/profiles/{idx}', self.update_profile),
+                                      ('GET', '/library', self.library_index),
+                                      ('POST', '/library/profiles', self.library_save),
+                                      ('POST', '/library/sets/{name}', self.library_save_set),
+                                      ('POST', '/library/load', self.library_load)):
+            self.server.route(method, path, self._guarded(handler))
+        self.server.websocket('/ws', self.stream)
+
+    async def start(self) -> int:
+        port = await self.server.start()
+        log.info('Control gateway listening on http://%s:%s (WebSocket: /ws)', self.server.host, port)
+        return port
+
+    async def stop(self):
+        await self.server.stop()
+
+    # plumbing
+    @staticmethod
+    def is_local(request) -> bool:
+        host = request.headers.get('host', '')
+        origin = request.headers.get('origin')
+        host_name = host.rsplit(':', 1)[0] if not host.endswith(']') else host
+        if host_name not in LOCAL_HOSTS:
+            return False
+        if origin is None:
+            return True
+        origin_host = origin.split('://', 1)[-1]
+        origin_name = origin_host.rsplit(':', 1)[0] if not origin_host.endswith(']') else origin_host
+        return origin_name in LOCAL_HOSTS
+
+    def _guarded(self, handler):
+        async def guarded(request):
+            if not self.is_local(request):
+                return json_response({'error': 'forbidden'}, 403)
+            try:
+                if request.method == 'POST':
+                    if not request.headers.get('content-type', '').startswith('application/json'):
+                        raise GatewayError('expected an application/json body', 415)
+                    try:
+                        body = json.loads(request.body or b'{}')
+                    except ValueError:
+                        raise GatewayError('invalid JSON body')
+                    if not isinstance(body, dict):
+                        raise GatewayError('expected a JSON object')
+                    result = await handler(request, body)
+                else:
+                    result = await handler(request)
+            except GatewayError as e:
+                return json_response({'error': str(e)}, e.status)
+            except (TypeError, ValueError) as e:  # a field of the wrong type
+                return json_response({'error': str(e)}, 400)
+            except (BleakError, OSError) as e:
+                return json_response({'error': f'device error: {e}'}, 502)
+            return json_response(result if result is not None else {'ok': True})
+        return guarded
+
+    @property
+    def client(self):
+        client = self.window._client
+        if client is None or not client.is_connected:
+            raise GatewayError('no device connected', 503)
+        return client
+
+    @property
+    def library(self) -> ProfileLibrary:
+        if self._library is None:
+            self._library = ProfileLibrary()
+        return self._library
+
+    def profile(self, idx):
+        try:
+            idx = int(idx)
+        except (TypeError, ValueError):
+            raise GatewayError('profile must be 0-3')
+        if not 0 <= idx < PROFILE_COUNT:
+            raise GatewayError('profile must be 0-3')
+        profiles = self.window.PROFILES  # (the list read on the latest connect)
+        if len(profiles) != PROFILE_COUNT:
+            raise GatewayError('profiles are not loaded yet', 503)
+        return profiles[idx]
+
+    # routes
+    async def state(self, _request):
+        return self.feed.snapshot()
+
+    async def preheat(self, _request, body):
+        await self.client.preheat(cancel=bool(body.get('cancel', False)))
+
+    async def boost(self, _request, body):
+        client = self.client
+        window = self.window
+        active = window.active_profile_window
+        profile = self.profile(active.idx if active else window.LAST_PROFILE_ID)
+        is_time = bool(body.get('time', False))
+        await client.boost(profile.duration if is_time else profile.temperature, is_time=is_time)
+        window.sessions.boost('time' if is_time else 'temp',  # once the device has it
+                              Constants.DABBING_ADDED_TIME if is_time else Constants.DABBING_ADDED_TEMP_CELSIUS)
+
+    async def change_profile(self, _request, body):
+        client = self.client
+        profile = self.profile(body.get('profile'))
+        await client.change_profile(profile.idx, current=True)
+        window = self.window
+        window.state.update(profile=profile.idx)  # published to the feed from there
+        # (update_loop only redraws the home screen for profile changes it did not know about)
+        if window.home.view.set('active_profile', profile.name):
+            window.home.device.colorize(*profile.color)
+
+    async def lantern_color(self, _request, body):
+        await self.client.send_lantern_color(parse_color(body.get('color')))
+
+    async def update_profile(self, request, body):
+        client = self.client
+        profile = self.profile(request.params['idx'])
+        unknown = set(body) - {'name', 'temperature', 'time', 'color'}
+        if unknown:
+            raise GatewayError(f'unknown fields: {", ".join(sorted(unknown))}')
+
+        values = profile.snapshot()
+        if 'name' in body:
+            values['name'] = str(body['name'])[:31].upper()
+        if 'temperature' in body:
+            values['temperature'] = float(body['temperature'])
+        if 'time' in body:
+            values['duration'] = int(body['time'])
+        if 'color' in body:
+            color_bytes = list(parse_color(body['color'])) + values['color_bytes'][3:]
+            if color_bytes[3] and not color_bytes[5]:
+                color_bytes[3] = 0  # disable disco
+                color_bytes[5] = 1  # enable LED
+            values['color_bytes'] = color_bytes
+
+        profile.restore(values)
+        try:
+            await ProfileTransaction(client, profile).commit()  # rolls the profile back if the device disagrees
+        finally:
+            if self.window._profiles is not None:
+                await self.window._profiles.fill(profile.idx)
+        return {'profile': profile.idx, 'name': profile.name, 'temperature': profile.temperature,
+                'time': profile.duration, 'color': list(profile.color)}
+
+    async def library_index(self, _request):
+        return {'profiles': self.library.entries(), 'sets': self.library.sets()}
+
+    async def library_save(self, _request, body):
+        name = body.get('name')
+        return self.library.save_profile(self.profile(body.get('profile')), None if name is None else str(name))
+
+    async def library_save_set(self, request, body):
+        profiles = body.get('profiles')
+        if not isinstance(profiles, list):
+            raise GatewayError('profiles must be a list of 4 names (or nulls)')
+        self.library.save_set(request.params['name'], profiles)
+        return {'set': request.params['name'], 'profiles': self.library.get_set(request.params['name'])}
+
+    async def library_load(self, _request, body):
+        client = self.client
+        profiles = self.window.PROFILES
+        if len(profiles) != PROFILE_COUNT:
+            raise GatewayError('profiles are not loaded yet', 503)
+        if 'set' in body:
+            names = self.library.get_set(str(body['set']))
+        elif isinstance(body.get('profiles'), list):
+            names = body['profiles']
+        else:
+            raise GatewayError('expected {"profiles": [...]} or {"set": name}')
+
+        try:
+            changes = await self.library.load(client, profiles, names)
+        finally:
+            if self.window._profiles is not None:
+                for idx, name in enumerate(names):
+                    if name is not None and idx < PROFILE_COUNT:
+                        await self.window._profiles.fill(idx)
+        return {'changed': {idx: sorted(fields) for idx, fields in changes.items()}}
+
+    async def stream(self, websocket, request):
+        if not self.is_local(request):
+            return await websocket.close(1008)
+
+        queue = self.feed.subscribe()
+        self.subscribers += 1
+
+        def closed(_incoming):
+            self.feed.unsubscribe(queue)  # nothing more is queued for it
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)  # wakes the sender below
+
+        incoming = TASKS.spawn(self._drain(websocket), 'gateway subscriber', scope='gateway', critical=True)
+        incoming.add_done_callback(closed)
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                await websocket.send(json.dumps(message))
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers -= 1
+            self.feed.unsubscribe(queue)
+            incoming.cancel()
+
+    @staticmethod
+    async def _drain(websocket):
+        # answers pings; the feed is one-way, so anything else a subscriber sends is ignored
+        while await websocket.receive() is not None:
+            pass
+
+
+def gateway_port(argv=None, settings=None) -> int:
+    return configured_port('--gateway', 'Gateway/Port', DEFAULT_GATEWAY_PORT, argv, settings)
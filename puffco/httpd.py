@@ -0,0 +1,294 @@
+"""
+Minimal asyncio HTTP/1.1 + WebSocket server for local tooling (the Prometheus /metrics endpoint, the control gateway).
+It only ever listens on localhost; every plain HTTP response closes its connection.
+"""
+import asyncio
+import logging
+import re
+import struct
+import sys
+from base64 import b64encode
+from hashlib import sha1
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_METRICS_PORT = 9477
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+READ_TIMEOUT = 10
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+log = logging.getLogger(__name__)
+
+
+class Request:
+    __slots__ = ('method', 'path', 'query', 'headers', 'body', 'params')
+
+    def __init__(self, method, path, query, headers, body=b''):
+        self.method, self.path, self.query, self.headers, self.body = method, path, query, headers, body
+        self.params = {}  # the {name} segments of the matched route
+
+
+class Response:
+    __slots__ = ('status', 'body', 'content_type', 'headers')
+
+    def __init__(self, body=b'', status=200, content_type='text/plain; charset=utf-8', headers=None):
+        self.status = status
+        self.body = body.encode() if isinstance(body, str) else body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    def encode(self) -> bytes:
+        reason = HTTPStatus(self.status).phrase
+        head = [f'HTTP/1.1 {self.status} {reason}', f'Content-Type: {self.content_type}',
+                f'Content-Length: {len(self.body)}', 'Connection: close']
+        head += [f'{name}: {value}' for name, value in self.headers.items()]
+        return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + self.body
+
+
+class WebSocketClosed(ConnectionError):
+    pass
+
+
+class WebSocket:
+    """ Server end of an RFC 6455 connection: text and binary messages, ping/pong and the closing handshake """
+    CONTINUATION, TEXT, BINARY, CLOSE, PING, PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    @staticmethod
+    def accept_key(key: str) -> str:
+        return b64encode(sha1(key.encode() + WEBSOCKET_GUID).digest()).decode()
+
+    @staticmethod
+    def frame(opcode, payload: bytes) -> bytes:
+        n = len(payload)
+        if n < 126:
+            head = struct.pack('!BB', 0x80 | opcode, n)
+        elif n < 1 << 16:
+            head = struct.pack('!BBH', 0x80 | opcode, 126, n)
+        else:
+            head = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+        return head + payload  # server frames are never masked
+
+    @staticmethod
+    def unmask(payload: bytes, mask: bytes) -> bytes:
+        n = len(payload)
+        key = (mask * (n // 4 + 1))[:n]
+        return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+    async def send(self, message):
+        if self.closed:
+            raise WebSocketClosed()
+        if isinstance(message, str):
+            self.writer.write(self.frame(self.TEXT, message.encode()))
+        else:
+            self.writer.write(self.frame(self.BINARY, bytes(message)))
+        await self.writer.drain()
+
+    async def _read_frame(self):
+        first, second = await self.reader.readexactly(2)
+        fin, opcode, masked, n = first & 0x80, first & 0x0F, second & 0x80, second & 0x7F
+        if n == 126:
+            n, = struct.unpack('!H', await self.reader.readexactly(2))
+        elif n == 127:
+            n, = struct.unpack('!Q', await self.reader.readexactly(8))
+        if not masked or n > MAX_BODY_BYTES:
+            raise ValueError('unmasked or oversized client frame')
+
+        mask = await self.reader.readexactly(4)
+        return fin, opcode, self.unmask(await self.reader.readexactly(n), mask)
+
+    async def receive(self):
+        """ The next message (str for text, bytes for binary), None once the connection is closed """
+        parts, message_opcode = [], None
+        while not self.closed:
+            try:
+                fin, opcode, payload = await self._read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                self.closed = True
+                break
+
+            if opcode == self.PING:
+                self.writer.write(self.frame(self.PONG, payload))
+                continue
+            if opcode == self.PONG:
+                continue
+            if opcode == self.CLOSE:
+                await self.close()
+                break
+
+            if opcode != self.CONTINUATION:
+                message_opcode = opcode
+            parts.append(payload)
+            if sum(map(len, parts)) > MAX_BODY_BYTES:
+                await self.close(1009)
+                break
+            if fin:
+                data = b''.join(parts)
+                return data.decode() if message_opcode == self.TEXT else data
+        return None
+
+    async def close(self, code=1000):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.writer.write(self.frame(self.CLOSE, struct.pack('!H', code)))
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+class HttpServer:
+    """
+    Routes (method, path) to `handler(request)`, which returns (or resolves to) a Response.
+    Paths may contain {name} segments, matched into request.params. WebSocket routes get `handler(websocket, request)`
+    and keep their connection until the handler returns.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self.websockets = {}
+        self.requests = 0
+        self._patterns = []
+        self._server = None
+
+    def route(self, method, path, handler):
+        if '{' in path:
+            pattern = re.compile('^' + re.sub(r'\{(\w+)}', r'(?P<\1>[^/]+)', path) + '$')
+            self._patterns.append((method, pattern, handler))
+        else:
+            self.routes[(method, path)] = handler
+
+    def websocket(self, path, handler):
+        self.websockets[path] = handler
+
+    def resolve(self, request):
+        """ The handler for `request` (filling in request.params), or the Response to send instead """
+        handler = self.routes.get((request.method, request.path))
+        if handler is not None:
+            return handler
+
+        path_matches = any(path == request.path for _method, path in self.routes)
+        for method, pattern, handler in self._patterns:
+            match = pattern.match(request.path)
+            if match:
+                if method == request.method:
+                    request.params = match.groupdict()
+                    return handler
+                path_matches = True
+        return Response('Method Not Allowed\n', 405) if path_matches else Response('Not Found\n', 404)
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader):
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), READ_TIMEOUT)
+        request_line, *header_lines = head.decode('latin-1').split('\r\n')
+        method, target, _version = request_line.split(' ', 2)
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError('request body too large')
+        body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b''
+        url = urlsplit(target)
+        return Request(method, url.path, dict(parse_qsl(url.query)), headers, body)
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                request = await self._read_request(reader)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                return
+            except ValueError:
+                writer.write(Response('Bad Request\n', 400).encode())
+                return
+
+            self.requests += 1
+            if request.headers.get('upgrade', '').lower() == 'websocket' and request.path in self.websockets:
+                return await self._upgrade(request, reader, writer)
+
+            handler = self.resolve(request)
+            if isinstance(handler, Response):
+                response = handler
+            else:
+                try:
+                    response = handler(request)
+                    if asyncio.iscoroutine(response):
+                        response = await response
+                except Exception:
+                    log.exception('Error handling %s %s', request.method, request.path)
+                    response = Response('Internal Server Error\n', 500)
+
+            writer.write(response.encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _upgrade(self, request, reader, writer):
+        key = request.headers.get('sec-websocket-key')
+        if request.method != 'GET' or not key or request.headers.get('sec-websocket-version') != '13':
+            writer.write(Response('Bad WebSocket Handshake\n', 400, headers={'Sec-WebSocket-Version': '13'}).encode())
+            return
+
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {WebSocket.accept_key(key)}\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        websocket = WebSocket(reader, writer)
+        try:
+            await self.websockets[request.path](websocket, request)
+        except Exception:
+            log.exception('Error in WebSocket handler for %s', request.path)
+            await websocket.close(1011)
+        else:
+            await websocket.close()
+
+
+def configured_port(flag, key, default, argv=None, settings=None) -> int:
+    """ {flag}[=PORT] on the command line, else the `key` setting; 0 means the server is off """
+    argv = sys.argv if argv is None else argv
+    port = settings.value(key, 0, int) if settings is not None else 0
+    for arg in argv:
+        if arg == flag:
+            port = port or default
+        elif arg.startswith(flag + '='):
+            port = int(arg.split('=', 1)[1])
+    return port
+
+
+def metrics_port(argv=None, settings=None) -> int:
+    return configured_port('--metrics', 'Metrics/Port', DEFAULT_METRICS_PORT, argv, settings)
+
+
+async def serve_metrics(window, port, host='127.0.0.1') -> HttpServer:
+    """ Start the /metrics endpoint for `window` (a PuffcoMain) """
+    from puffco.telemetry.exposition import MetricsExporter
+
+    exporter = MetricsExporter(window)
+    exporter.loop_lag.start(asyncio.get_running_loop())
+    server = HttpServer(host, port)
+    server.route('GET', '/metrics', lambda _request: Response(exporter.render(), content_type=exporter.CONTENT_TYPE))
+    await server.start()
+    log.info('Serving metrics on http://%s:%s/metrics', host, server.port)
+    return server
@@ -0,0 +1,175 @@
+"""
+Local profile library: any number of named heat profiles, and named sets of four of them, kept in an indexed sqlite
+file next to settings.ini. Entries use the same fields as Profile.snapshot():
+
+    {'name': 'EVENING', 'temperature': 232.0, 'duration': 45, 'color_bytes': [...], 'boost_temp': 8, 'boost_time': 15}
+
+Loading entries onto the device only writes the fields that differ from what its profiles already hold
+(see commit_profiles), so swapping in a set that shares most of its values with the current one costs a few writes.
+"""
+import sqlite3
+import time
+
+from puffco.btnet.profiles import PROFILE_COUNT, PROFILE_FIELDS, commit_profiles
+
+MAX_NAME_LENGTH = 31  # what a device profile name can hold
+SET_SIZE = PROFILE_COUNT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    temperature REAL NOT NULL,
+    duration INTEGER NOT NULL,
+    color_bytes BLOB NOT NULL,
+    boost_temp INTEGER,
+    boost_time INTEGER,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_sets (
+    name TEXT NOT NULL COLLATE NOCASE,
+    slot INTEGER NOT NULL CHECK (slot BETWEEN 0 AND 3),
+    profile_id INTEGER NOT NULL REFERENCES profiles (id) ON DELETE CASCADE,
+    PRIMARY KEY (name, slot)
+);
+"""
+
+
+class LibraryError(ValueError):
+    pass
+
+
+class ProfileLibrary:
+    def __init__(self, path='profiles.db'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(SCHEMA)
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM profiles').fetchone()[0]
+
+    def __contains__(self, name):
+        return self.db.execute('SELECT 1 FROM profiles WHERE name = ?', (name,)).fetchone() is not None
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def _entry(row) -> dict:
+        name, temperature, duration, color_bytes, boost_temp, boost_time = row
+        return {'name': name, 'temperature': temperature, 'duration': duration, 'color_bytes': list(color_bytes),
+                'boost_temp': boost_temp, 'boost_time': boost_time}
+
+    # profiles
+    def save(self, values: dict) -> dict:
+        """ Add or replace (by name, ignoring case) the entry `values`, returns it as stored """
+        name = str(values.get('name') or '').strip()
+        if not 0 < len(name) <= MAX_NAME_LENGTH:
+            raise LibraryError(f'profile names are 1-{MAX_NAME_LENGTH} characters')
+        color_bytes = bytes(values['color_bytes'])
+        if len(color_bytes) < 3:
+            raise LibraryError('color_bytes needs at least [r, g, b]')
+        boost_temp, boost_time = values.get('boost_temp'), values.get('boost_time')
+
+        entry = (name, float(values['temperature']), int(values['duration']), color_bytes,
+                 None if boost_temp is None else int(boost_temp), None if boost_time is None else int(boost_time))
+        with self.db:
+            self.db.execute('INSERT INTO profiles (name, temperature, duration, color_bytes, boost_temp, boost_time, '
+                            'updated) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET '
+                            'name = excluded.name, temperature = excluded.temperature, duration = excluded.duration, '
+                            'color_bytes = excluded.color_bytes, boost_temp = excluded.boost_temp, '
+                            'boost_time = excluded.boost_time, updated = excluded.updated', entry + (time.time(),))
+        return self._entry(entry)
+
+    def save_profile(self, profile, name: str = None) -> dict:
+        """ Store a device Profile (what it currently holds locally), under its own name unless given another """
+        values = profile.snapshot()
+        if name is not None:
+            values['name'] = name
+        return self.save(values)
+
+    def get(self, name: str) -> dict:
+        row = self.db.execute('SELECT name, temperature, duration, color_bytes, boost_temp, boost_time FROM profiles '
+                              'WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise LibraryError(f'no profile named {name!r} in the library')
+        return self._entry(row)
+
+    def delete(self, name: str) -> bool:
+        with self.db:
+            return self.db.execute('DELETE FROM profiles WHERE name = ?', (name,)).rowcount > 0
+
+    def names(self) -> list:
+        return [name for name, in self.db.execute('SELECT name FROM profiles ORDER BY name')]
+
+    def entries(self) -> list:
+        return [self._entry(row) for row in self.db.execute(
+            'SELECT name, temperature, duration, color_bytes, boost_temp, boost_time FROM profiles ORDER BY name')]
+
+    # sets of four
+    def save_set(self, name: str, profile_names):
+        """ Remember `profile_names` (one per device profile, None to leave that one alone) as the set `name` """
+        profile_names = list(profile_names)
+        if len(profile_names) != SET_SIZE:
+            raise LibraryError(f'a set has {SET_SIZE} profiles (null to leave one unchanged)')
+        slots = [(slot, self._id(profile_name)) for slot, profile_name in enumerate(profile_names)
+                 if profile_name is not None]
+        with self.db:
+            self.db.execute('DELETE FROM profile_sets WHERE name = ?', (name,))
+            self.db.executemany('INSERT INTO profile_sets (name, slot, profile_id) VALUES (?, ?, ?)',
+                                [(name, slot, profile_id) for slot, profile_id in slots])
+
+    def get_set(self, name: str) -> list:
+        """ The set's profile names by slot (None where it leaves the device profile alone) """
+        rows = self.db.execute('SELECT slot, profiles.name FROM profile_sets JOIN profiles ON profiles.id = profile_id '
+                               'WHERE profile_sets.name = ?', (name,)).fetchall()
+        if not rows:
+            raise LibraryError(f'no profile set named {name!r} in the library')
+        names = [None] * SET_SIZE
+        for slot, profile_name in rows:
+            names[slot] = profile_name
+        return names
+
+    def sets(self) -> dict:
+        sets = {}
+        for set_name, slot, profile_name in self.db.execute(
+                'SELECT profile_sets.name, slot, profiles.name FROM profile_sets '
+                'JOIN profiles ON profiles.id = profile_id ORDER BY profile_sets.name'):
+            sets.setdefault(set_name, [None] * SET_SIZE)[slot] = profile_name
+        return sets
+
+    def _id(self, name):
+        row = self.db.execute('SELECT id FROM profiles WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise LibraryError(f'no profile named {name!r} in the library')
+        return row[0]
+
+    # device
+    async def load(self, client, profiles, names) -> dict:
+        """
+        Put the library entries `names` (one per device profile, None to leave it alone) on the device's `profiles`,
+        writing only what differs; returns {idx: changed fields}. Raises ProfileWriteError (with every profile that
+        could not be confirmed rolled back to what the device holds) after all of them have been attempted.
+        """
+        names = list(names)
+        if len(names) > PROFILE_COUNT:
+            raise LibraryError(f'the device has {PROFILE_COUNT} profiles')
+        if len(profiles) != PROFILE_COUNT:
+            raise LibraryError('the device profiles are not loaded yet')
+        entries = [None if name is None else self.get(name) for name in names]  # all or nothing, before any writes
+
+        targets = []
+        for profile, entry in zip(profiles, entries):
+            if entry is None:
+                continue
+            values = profile.snapshot()
+            values.update({field: value for field, value in entry.items()
+                           if field in PROFILE_FIELDS and value is not None})  # unknown boost: keep the device's
+            values['name'] = values['name'][:MAX_NAME_LENGTH].upper()
+            profile.restore(values)
+            targets.append(profile)
+        return await commit_profiles(client, targets)
+
+    async def load_set(self, client, profiles, name: str) -> dict:
+        return await self.load(client, profiles, self.get_set(name))
@@ -0,0 +1,146 @@
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import RotatingFileHandler
+
+LOG_FORMAT = '[%(asctime)s] %(levelname)s: %(message)s'
+DATE_FORMAT = '%m/%d/%Y %H:%M:%S'
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 5
+BATCH_SIZE = 256
+
+
+class _BatchFlushMixin:
+    """ Handlers only flush when the writer thread has drained a batch, not after every record """
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super(_BatchFlushMixin, self).flush()
+
+
+class _ConsoleHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class _FileHandler(_BatchFlushMixin, RotatingFileHandler):
+    def __init__(self, filename):
+        super(_FileHandler, self).__init__(filename, mode='a', maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+                                           encoding='utf-8', delay=True)
+        self.namer = lambda name: name + '.zst'
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source, dest):
+        import zstandard  # only needed once a log file fills up
+
+        with open(source, 'rb') as src, open(dest, 'wb') as dst:
+            zstandard.ZstdCompressor(level=10).copy_stream(src, dst)
+        os.remove(source)
+
+
+class _EnqueueHandler(logging.Handler):
+    # formatting (and strftime) is left to the writer thread; the caller only pays for a queue put
+    def __init__(self, records):
+        super(_EnqueueHandler, self).__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.put(record)
+
+
+class PuffcoLog:
+    """
+    Logging backend for the app: records are queued on the calling thread and written, in batches,
+    by a background thread to the console and a size-rotated log file (older segments are zstd compressed).
+    It also stands in for sys.stdout so plain print() calls end up in the log at INFO level.
+    """
+
+    def __init__(self, path='puffco.log', level=logging.INFO):
+        self.console = sys.stdout
+        self.logger = logging.getLogger('puffco')
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        self._line = ''
+        self._records = queue.SimpleQueue()
+
+        formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+        self.handlers = [_FileHandler(path), _ConsoleHandler(self.console)]
+        for handler in self.handlers:
+            handler.setFormatter(formatter)
+
+        self._enqueue = _EnqueueHandler(self._records)
+        self.logger.addHandler(self._enqueue)
+        self._writer = threading.Thread(target=self._write_loop, name='puffco-log', daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        records = self._records
+        while True:
+            batch = [records.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for record in batch:
+                if record is None:
+                    stop = True
+                    continue
+
+                for handler in self.handlers:
+                    handler.handle(record)
+
+            for handler in self.handlers:
+                handler.flush_batch()
+
+            if stop:
+                return
+
+    def set_level(self, level):
+        self.logger.setLevel(level)
+
+    def close_log(self):
+        if not self._writer.is_alive():
+            return
+
+        self.write_line('Exiting..')
+        self._records.put(None)
+        self._writer.join(timeout=5)
+        self.logger.removeHandler(self._enqueue)
+        for handler in self.handlers:
+            handler.flush_batch()
+            handler.close()
+
+        if sys.stdout is self:
+            sys.stdout = self.console
+
+    def write_line(self, text):
+        self.logger.info(text)
+
+    # sys.stdout interface
+    def write(self, text: str):
+        if not isinstance(text, str):
+            return
+
+        self._line += text
+        if '\n' not in self._line:
+            return
+
+        *lines, self._line = self._line.split('\n')
+        for line in lines:
+            if line.rstrip():  # skip over blank lines
+                self.write_line(line)
+
+    def flush(self):  # needed for py3
+        pass
+
+
+def level_from_name(name, default=logging.INFO):
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else default
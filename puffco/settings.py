@@ -0,0 +1,107 @@
+import logging
+import os
+
+from PyQt6.QtCore import QObject, QSettings, QTimer, pyqtSignal
+
+log = logging.getLogger(__name__)
+
+# key: (type, default)
+SCHEMA = {
+    'General/TemperatureUnit': (str, 'fahrenheit'),  # TODO: implement
+    'General/LogLevel': (str, 'INFO'),
+    'General/Theme': (str, 'unset'),
+    'Modes/Lantern': (bool, False),
+    'Modes/Ready': (bool, False),
+    'Modes/Stealth': (bool, False),
+    'Home/HideDabCounts': (bool, False),
+    'Metrics/Port': (int, 0),  # localhost Prometheus endpoint, 0 = off (unless started with --metrics)
+    'Gateway/Port': (int, 0),  # localhost HTTP/WebSocket control gateway, 0 = off (unless started with --gateway)
+    # TODO: Modes/Boost (setting temp/time sliders), think of (and implement) profile settings
+}
+
+
+class Settings(QObject):
+    """
+    settings.ini, loaded once and kept in memory.
+    Reads never touch the disk; writes update memory, notify subscribers through `changed`
+    and are persisted together WRITE_DELAY ms later by writing a temporary file and swapping it in.
+    """
+    changed = pyqtSignal(str, object)
+    WRITE_DELAY = 1000
+
+    def __init__(self, path='settings.ini'):
+        super(Settings, self).__init__()
+        self.path = path
+        self._values = {}
+        self._timer = None
+
+        stored = QSettings(path, QSettings.Format.IniFormat)
+        for key in stored.allKeys():
+            if key in SCHEMA:
+                _type, default = SCHEMA[key]
+                self._values[key] = stored.value(key, default, _type)
+            else:
+                self._values[key] = stored.value(key)
+
+        missing = {key: default for key, (_type, default) in SCHEMA.items() if key not in self._values}
+        self._values.update(missing)
+        if missing:
+            self.sync()
+
+    def value(self, key, default=None, type=None):
+        value = self._values.get(key, default)
+        if type is bool and isinstance(value, str):  # unknown keys keep their raw ini text
+            return value.lower() == 'true'
+        if type is not None and value is not None and not isinstance(value, type):
+            return type(value)
+        return value
+
+    def setValue(self, key, value):
+        if key in self._values and self._values[key] == value:
+            return
+
+        self._values[key] = value
+        self.changed.emit(key, value)
+        self._schedule_write()
+
+    def allKeys(self):
+        return list(self._values)
+
+    def subscribe(self, key, callback):
+        """ Call `callback(value)` whenever `key` changes """
+        def on_change(changed_key, value):
+            if changed_key == key:
+                callback(value)
+
+        self.changed.connect(on_change)
+        return on_change
+
+    def _schedule_write(self):
+        if self._timer is None:
+            self._timer = QTimer(self)
+            self._timer.setSingleShot(True)
+            self._timer.setInterval(self.WRITE_DELAY)
+            self._timer.timeout.connect(self.sync)
+
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def sync(self):
+        """ Write every value to disk now """
+        if self._timer is not None:
+            self._timer.stop()
+
+        tmp_path = self.path + '.tmp'
+        tmp = QSettings(tmp_path, QSettings.Format.IniFormat)
+        tmp.clear()
+        for key, value in self._values.items():
+            tmp.setValue(key, value)
+        tmp.sync()
+        if tmp.status() != QSettings.Status.NoError:
+            log.error('Failed to save settings (%s)', tmp.status().name)
+            return
+        del tmp
+
+        with open(tmp_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
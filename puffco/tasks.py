@@ -0,0 +1,141 @@
+"""
+Supervised background tasks.
+
+Everything the UI starts without awaiting goes through TASKS.spawn, which names the task, logs its failure
+instead of dropping it, and keeps per-name counts and durations:
+
+    TASKS.spawn(self.update_loop, 'update_loop', single_flight=True)   # skipped while the last run is still going
+    TASKS.spawn(lambda: client.send_lantern_brightness(val), 'lantern brightness', latest=True)
+
+Tasks belong to a scope ('connection' by default); on_disconnect cancels that scope, so nothing keeps talking to a
+device that is gone. When more than `max_pending` tasks are outstanding new ones are dropped, except `critical` ones.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from bleak import BleakError
+
+from puffco.telemetry.metrics import Histogram
+
+EXPECTED_ERRORS = (BleakError, OSError, asyncio.TimeoutError)  # a lost or busy link, logged without a traceback
+OUTCOMES = ('started', 'finished', 'failed', 'cancelled', 'skipped', 'dropped')
+
+log = logging.getLogger(__name__)
+
+
+class TaskSupervisor:
+    def __init__(self, max_pending: int = 64):
+        self.max_pending = max_pending
+        self.durations = {}
+        self.counts = {outcome: Counter() for outcome in OUTCOMES}
+        self._tasks = {}  # task -> (name, scope, started)
+        self._running = {}  # name -> task, for single-flight names
+        self._next = {}  # name -> coroutine (factory) to run once the current one finishes, for `latest` names
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def spawn(self, coro, name: str = None, *, scope: str = 'connection', single_flight: bool = False,
+              latest: bool = False, critical: bool = False):
+        """
+        Run `coro` (a coroutine, or a callable returning one, so skipped runs never create theirs) as a task.
+        single_flight: skip it while a task with the same name is running.
+        latest: like single_flight, but remember the newest skipped one and run it when the current one ends.
+        Returns the task, or None if it was skipped, queued or dropped.
+        """
+        name = name or getattr(coro, '__qualname__', None) or repr(coro)
+        if single_flight or latest:
+            running = self._running.get(name)
+            if running is not None and not running.done():
+                if latest:
+                    self._discard(self._next.pop(name, None))
+                    self._next[name] = (coro, scope, critical)
+                else:
+                    self._discard(coro)
+                self.counts['skipped'][name] += 1
+                return None
+
+        if not critical and len(self._tasks) >= self.max_pending:
+            self._discard(coro)
+            self.counts['dropped'][name] += 1
+            log.warning('Too many pending tasks (%s), dropped %s', len(self._tasks), name)
+            return None
+
+        if not asyncio.iscoroutine(coro):
+            coro = coro()
+        task = asyncio.ensure_future(coro)
+        self._tasks[task] = (name, scope, time.perf_counter())
+        if single_flight or latest:
+            self._running[name] = task
+        self.counts['started'][name] += 1
+        task.add_done_callback(self._done)
+        return task
+
+    def cancel_scope(self, scope: str) -> int:
+        """ Cancel every task (and queued `latest` run) started in `scope`, returns how many were cancelled """
+        for name, (coro, queued_scope, _critical) in list(self._next.items()):
+            if queued_scope == scope:
+                del self._next[name]
+                self._discard(coro)
+
+        tasks = [task for task, (_name, task_scope, _started) in self._tasks.items() if task_scope == scope]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    def cancel_all(self):
+        for scope in {scope for _name, scope, _started in self._tasks.values()}:
+            self.cancel_scope(scope)
+
+    def pending(self, scope: str = None) -> int:
+        if scope is None:
+            return len(self._tasks)
+        return sum(1 for _name, task_scope, _started in self._tasks.values() if task_scope == scope)
+
+    def rows(self):
+        """ (name, started, failed, cancelled, skipped, dropped, p50 us, max us) per task name, most started first """
+        rows = []
+        for name in set().union(*self.counts.values()):
+            histogram = self.durations.get(name) or Histogram()
+            rows.append((name, self.counts['started'][name], self.counts['failed'][name],
+                         self.counts['cancelled'][name], self.counts['skipped'][name], self.counts['dropped'][name],
+                         histogram.percentile(50), histogram.max))
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
+
+    @staticmethod
+    def _discard(coro):
+        if coro is not None and asyncio.iscoroutine(coro):
+            coro.close()  # never started, don't warn about it never being awaited
+
+    def _done(self, task):
+        name, scope, started = self._tasks.pop(task)
+        if self._running.get(name) is task:
+            del self._running[name]
+
+        if task.cancelled():
+            self.counts['cancelled'][name] += 1
+        else:
+            error = task.exception()
+            if error is None:
+                self.counts['finished'][name] += 1
+                histogram = self.durations.get(name)
+                if histogram is None:
+                    histogram = self.durations[name] = Histogram()
+                histogram.record((time.perf_counter() - started) * 1e6)
+            else:
+                self.counts['failed'][name] += 1
+                if isinstance(error, EXPECTED_ERRORS):
+                    log.warning('%s failed: %r', name, error)
+                else:
+                    log.error('%s crashed', name, exc_info=error)
+
+        queued = self._next.pop(name, None)
+        if queued is not None:
+            coro, queued_scope, critical = queued
+            self.spawn(coro, name, scope=queued_scope, latest=True, critical=critical)
+
+
+TASKS = TaskSupervisor()
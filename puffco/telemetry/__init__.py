@@ -0,0 +1 @@
+from .ring import FIELDS, TelemetryRing
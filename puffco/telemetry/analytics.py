@@ -0,0 +1,144 @@
+import numpy as np
+
+from puffco.btnet import OperatingState
+
+BAND = 5.0  # celsius either side of the target that counts as "at temperature"
+BOOST_WINDOW = 10.0  # seconds after a boost used to measure its effect
+METRICS = ('time_to_target', 'ramp_rate', 'overshoot', 'steady_state_error', 'time_in_band', 'boost_effect')
+
+
+class SessionBatch:
+    """
+    Many sessions packed end to end into flat arrays; `starts[i]:ends[i]` is the slice belonging to session i.
+    Every metric below is computed over the whole batch at once with reduceat/bincount, never per sample in Python.
+    """
+
+    def __init__(self, sessions):
+        sessions = [s for s in sessions if len(s)]
+        self.count = len(sessions)
+        lengths = np.fromiter((len(s) for s in sessions), dtype=np.int64, count=self.count)
+        self.ends = np.cumsum(lengths)
+        self.starts = self.ends - lengths
+        self.profiles = np.fromiter((s.profile for s in sessions), dtype=np.int64, count=self.count)
+
+        def flat(name, dtype):
+            if not sessions:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate([np.frombuffer(s.columns[name], dtype=dtype) for s in sessions])
+
+        self.t = flat('t', np.float64)
+        self.temp = flat('heater_temp', np.float32).astype(np.float64)
+        self.target = flat('target_temp', np.float32).astype(np.float64)
+        self.state = flat('operating_state', np.int8)
+        self.seg = np.repeat(np.arange(self.count), lengths)  # session id of every sample
+
+        # fall back to the profile temperature for samples taken before the target was read
+        meta_target = np.array([s.meta.get('target_temp') or np.nan for s in sessions], dtype=np.float64)
+        missing = np.isnan(self.target)
+        self.target[missing] = meta_target[self.seg[missing]]
+
+        boosts = [(i, b[0], b[2]) for i, s in enumerate(sessions) for b in s.boosts if b[1] == 'temp']
+        boosts = np.array(boosts, dtype=np.float64).reshape(-1, 3)
+        self.boost_session = boosts[:, 0].astype(np.int64)
+        self.boost_t, self.boost_amount = boosts[:, 1], boosts[:, 2]
+
+
+def analyze(sessions, band: float = BAND) -> dict:
+    """ Per-session metrics for `sessions` (HeatSession objects or a SessionBatch); one array per name in METRICS """
+    batch = sessions if isinstance(sessions, SessionBatch) else SessionBatch(sessions)
+    n = batch.count
+    if not n:
+        return {name: np.empty(0) for name in METRICS} | {'profile': np.empty(0, dtype=np.int64)}
+
+    t, temp, target, seg, starts = batch.t, batch.temp, batch.target, batch.seg, batch.starts
+    size = len(t)
+    positions = np.arange(size)
+    error = temp - target
+    valid = ~np.isnan(error)
+
+    # time to target: first sample within the band below the target
+    reached = valid & (error >= -band)
+    first = np.minimum.reduceat(np.where(reached, positions, size), starts)
+    hit = first < batch.ends
+    first_c = np.minimum(first, size - 1)
+    time_to_target = np.where(hit, t[first_c] - t[starts], np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ramp_rate = np.where(hit & (time_to_target > 0), (temp[first_c] - temp[starts]) / time_to_target, np.nan)
+
+    # overshoot: largest excursion above the target once it was reached
+    after = valid & hit[seg] & (positions >= first_c[seg])
+    overshoot = np.fmax.reduceat(np.where(after, error, np.nan), starts)
+    overshoot = np.where(hit, np.fmax(overshoot, 0), np.nan)
+
+    # steady-state error: mean absolute error while the cycle is active
+    active = valid & (batch.state == OperatingState.HEAT_CYCLE_ACTIVE)
+    active_n = np.bincount(seg[active], minlength=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        steady_state_error = np.bincount(seg[active], weights=np.abs(error[active]), minlength=n) / active_n
+
+    # time in band: each sample holds until the next one in the same session
+    dt = np.zeros(size)
+    dt[:-1] = np.diff(t)
+    dt[batch.ends - 1] = 0
+    in_band = valid & (np.abs(error) <= band)
+    time_in_band = np.bincount(seg, weights=dt * in_band, minlength=n)
+
+    # boost effect: temperature gained within BOOST_WINDOW per degree requested
+    boost_effect = np.full(n, np.nan)
+    if len(batch.boost_session):
+        span = (t.max() - t.min()) + BOOST_WINDOW + 1
+        key = seg * span + t  # strictly increasing across the batch, so one searchsorted covers every session
+        b_key = batch.boost_session * span + batch.boost_t
+        b_start = batch.starts[batch.boost_session]
+        b_end = batch.ends[batch.boost_session] - 1
+        i0 = np.clip(np.searchsorted(key, b_key), b_start, b_end)
+        i1 = np.clip(np.searchsorted(key, b_key + BOOST_WINDOW, side='right') - 1, b_start, b_end)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gain = (temp[i1] - temp[i0]) / batch.boost_amount
+        ok = ~np.isnan(gain) & np.isfinite(gain)
+        counts = np.bincount(batch.boost_session[ok], minlength=n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            boost_effect = np.bincount(batch.boost_session[ok], weights=gain[ok], minlength=n) / counts
+
+    return {'time_to_target': time_to_target, 'ramp_rate': ramp_rate, 'overshoot': overshoot,
+            'steady_state_error': steady_state_error, 'time_in_band': time_in_band,
+            'boost_effect': boost_effect, 'profile': batch.profiles}
+
+
+class ProfileStats:
+    """ Running per-profile totals, so sessions stored later are folded in without analysing the earlier ones again """
+
+    def __init__(self, profiles: int = 4):
+        self.profiles = profiles
+        self.sessions = np.zeros(profiles, dtype=np.int64)
+        self.totals = {name: np.zeros(profiles) for name in METRICS}
+        self.counts = {name: np.zeros(profiles, dtype=np.int64) for name in METRICS}
+
+    def add(self, metrics: dict):
+        """ Fold in analyze() results """
+        idx = metrics['profile']
+        keep = (idx >= 0) & (idx < self.profiles)
+        idx = idx[keep]
+        self.sessions += np.bincount(idx, minlength=self.profiles)
+        for name in METRICS:
+            values = metrics[name][keep]
+            ok = ~np.isnan(values)
+            self.counts[name] += np.bincount(idx[ok], minlength=self.profiles)
+            self.totals[name] += np.bincount(idx[ok], weights=values[ok], minlength=self.profiles)
+
+    def summary(self) -> dict:
+        """ {profile index: {'sessions': n, <metric>: mean ignoring sessions where it is undefined}} """
+        summary = {i: {'sessions': int(self.sessions[i])} for i in range(self.profiles)}
+        for name in METRICS:
+            totals, counts = self.totals[name], self.counts[name]
+            for i in range(self.profiles):
+                summary[i][name] = float(totals[i] / counts[i]) if counts[i] else None
+        return summary
+
+
+def profile_summary(metrics: dict, profiles: int = 4) -> dict:
+    """ {profile index: {'sessions': n, <metric>: mean ignoring sessions where it is undefined}} """
+    stats = ProfileStats(profiles)
+    stats.add(metrics)
+    return stats.summary()
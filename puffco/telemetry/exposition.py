@@ -0,0 +1,151 @@
+import math
+
+from puffco.btnet import OperatingState
+from puffco.tasks import OUTCOMES, TASKS
+from .metrics import BLE_METRICS, Histogram, LoopLag
+
+# Prometheus buckets (seconds); each counts up to the end of the HDR bucket holding its bound, so within ~6%
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _label_value(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class MetricsExporter:
+    """
+    Renders the state the app already keeps in memory (telemetry ring, home screen view model,
+    BLE operation metrics) in the Prometheus text exposition format; rendering never talks to the device
+    """
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, window, metrics=BLE_METRICS, tasks=TASKS):
+        self.window = window
+        self.metrics = metrics
+        self.tasks = tasks
+        self.loop_lag = LoopLag()
+        self._bucket_indexes = [Histogram.index(int(bound * 1e6)) for bound in LATENCY_BUCKETS]
+
+    def render(self) -> str:
+        lines = []
+        self._device(lines)
+        self._ble(lines)
+        self._tasks(lines)
+        self._histogram(lines, 'puffco_event_loop_lag_seconds', 'How late the event loop ran a 1s timer',
+                        {(): self.loop_lag.histogram})
+        self._gauge(lines, 'puffco_event_loop_lag_last_seconds', 'Lag of the most recent event loop tick',
+                    self.loop_lag.last)
+        return '\n'.join(lines) + '\n'
+
+    # device state
+    def _device(self, lines):
+        window = self.window
+        latest = window.telemetry.latest()
+        if latest is not None:
+            _timestamp, heater_temp, target_temp, *_rest = latest
+            self._gauge(lines, 'puffco_heater_temperature_celsius', 'Last heater temperature read', heater_temp)
+            self._gauge(lines, 'puffco_target_temperature_celsius', 'Target temperature of the running heat cycle',
+                        target_temp)
+        self._counter(lines, 'puffco_telemetry_samples_total', 'Temperature samples taken', window.telemetry.count)
+
+        state = window.state.snapshot()
+        if state.operating_state is not None:
+            self._gauge(lines, 'puffco_operating_state', 'Device operating state (' + ', '.join(
+                f'{s.value}={s.name}' for s in OperatingState) + ')', int(state.operating_state))
+
+        if state.battery is not None:
+            self._gauge(lines, 'puffco_battery_percent', 'Battery state of charge', state.battery)
+
+        if state.charging is not None:
+            self._gauge(lines, 'puffco_battery_charging', '1 while the device is charging', int(bool(state.charging)))
+            self._gauge(lines, 'puffco_battery_bulk_charging', '1 while charging in the bulk (fast) phase',
+                        int(bool(state.bulk_charging)))
+
+        for value, name, kind, doc in ((state.total_dabs, 'puffco_dabs_total', 'counter', 'Lifetime dab count'),
+                                       (state.daily_dabs, 'puffco_dabs_per_day', 'gauge', 'Average dabs per day')):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            self._metric(lines, name, kind, doc, value)
+
+    # transport
+    def _ble(self, lines):
+        client = self.window._client
+        self._gauge(lines, 'puffco_ble_connected', '1 while connected to a device',
+                    int(bool(client is not None and client.is_connected)))
+        self._counter(lines, 'puffco_ble_disconnects_total', 'Connections lost since start',
+                      self.window.disconnects)
+
+        metrics = self.metrics
+        self._histogram(lines, 'puffco_ble_operation_latency_seconds', 'BLE round trip latency per operation',
+                        {self._key_labels(key): histogram for key, histogram in metrics.histograms.items()})
+        for name, counts, doc in (('puffco_ble_operation_errors_total', metrics.errors, 'Failed BLE operations'),
+                                  ('puffco_ble_operation_timeouts_total', metrics.timeouts, 'Timed out BLE operations'),
+                                  ('puffco_ble_operation_retries_total', metrics.retries,
+                                   'Retried BLE operations (connect retries are reconnect attempts)'),
+                                  ('puffco_ble_reads_deduplicated_total', metrics.deduplicated,
+                                   'Reads answered by an identical read already in flight')):
+            lines.append(f'# HELP {name} {doc}')
+            lines.append(f'# TYPE {name} counter')
+            for key, count in counts.items():
+                lines.append(f'{name}{_labels(**dict(self._key_labels(key)))} {count}')
+
+    # background tasks
+    def _tasks(self, lines):
+        tasks = self.tasks
+        self._gauge(lines, 'puffco_tasks_pending', 'Supervised tasks not finished yet', len(tasks))
+        lines.append('# HELP puffco_tasks_total Supervised tasks per name and outcome')
+        lines.append('# TYPE puffco_tasks_total counter')
+        for outcome in OUTCOMES:
+            for name, count in tasks.counts[outcome].items():
+                lines.append(f'puffco_tasks_total{_labels(name=name, outcome=outcome)} {count}')
+        self._histogram(lines, 'puffco_task_duration_seconds', 'Run time of tasks that finished',
+                        {(('name', name),): histogram for name, histogram in tasks.durations.items()})
+
+    @staticmethod
+    def _key_labels(key) -> tuple:
+        operation, target = key
+        return ('operation', operation), ('target', target)
+
+    # formatting
+    @staticmethod
+    def _metric(lines, name, kind, doc, value):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return
+        lines.append(f'# HELP {name} {doc}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'{name} {_number(value)}')
+
+    def _gauge(self, lines, name, doc, value):
+        self._metric(lines, name, 'gauge', doc, value)
+
+    def _counter(self, lines, name, doc, value):
+        self._metric(lines, name, 'counter', doc, value)
+
+    def _histogram(self, lines, name, doc, histograms):
+        """ `histograms` maps a tuple of (label, value) pairs to a Histogram """
+        lines.append(f'# HELP {name} {doc}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, histogram in histograms.items():
+            labels = dict(labels)
+            counts, seen, start = histogram.counts, 0, 0
+            for bound, index in zip(LATENCY_BUCKETS, self._bucket_indexes):
+                seen += sum(counts[start:index + 1])
+                start = index + 1
+                lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {seen}')
+            lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram.count}')
+            lines.append(f'{name}_sum{_labels(**labels)} {_number(histogram.total / 1e6)}')
+            lines.append(f'{name}_count{_labels(**labels)} {histogram.count}')
@@ -0,0 +1,60 @@
+import asyncio
+import math
+
+
+class StateFeed:
+    """
+    Latest known device state, and the subscribers following its changes.
+    The app publishes what it has just read; every subscriber receives the same delta (only the fields that changed),
+    so adding subscribers never adds device reads. A subscriber that falls behind gets its pending deltas merged into
+    one instead of an ever-growing queue.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self.state = {}
+        self.version = 0
+        self.coalesced = 0
+        self._subscribers = set()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def snapshot(self) -> dict:
+        return {'version': self.version, **self.state}
+
+    def update(self, **fields) -> dict:
+        """ Publish `fields`, returns the ones that changed (nan is published as None) """
+        delta = {}
+        for name, value in fields.items():
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            if name not in self.state or self.state[name] != value:
+                self.state[name] = delta[name] = value
+
+        if delta:
+            self.version += 1
+            message = {'version': self.version, **delta}
+            for queue in self._subscribers:
+                self._offer(queue, message)
+        return delta
+
+    def subscribe(self) -> asyncio.Queue:
+        """ A queue of deltas, starting with a snapshot of everything known so far """
+        queue = asyncio.Queue(self.maxsize)
+        queue.put_nowait(self.snapshot())
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _offer(self, queue, message):
+        if queue.full():
+            merged = {}
+            while not queue.empty():
+                merged.update(queue.get_nowait())
+            merged.update(message)
+            message = merged
+            self.coalesced += 1
+        queue.put_nowait(message)
@@ -0,0 +1,146 @@
+import time
+from array import array
+from collections import Counter
+
+SUB_BUCKET_BITS = 5  # 16 buckets per power of two above 32 us: every value is kept within 1/16 (~6%)
+MAX_MICROSECONDS = 60 * 1000 * 1000
+
+
+class Histogram:
+    """
+    HDR-style latency histogram over integer microseconds.
+    Values below 2**SUB_BUCKET_BITS get a bucket each; above that every power of two is split into
+    2**(SUB_BUCKET_BITS - 1) equal buckets, so the relative error stays constant from microseconds to a minute
+    while the whole histogram is a few hundred counters.
+    """
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF = SUB_BUCKETS >> 1
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * (self.index(MAX_MICROSECONDS) + 1)))
+        self.count = self.total = self.max = 0
+        self.min = None
+
+    @classmethod
+    def index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return cls.SUB_BUCKETS + (shift - 1) * cls.HALF + (value >> shift) - cls.HALF
+
+    @classmethod
+    def highest_equivalent(cls, index: int) -> int:
+        """ The largest value that lands in bucket `index` """
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift, offset = divmod(index - cls.SUB_BUCKETS, cls.HALF)
+        shift += 1
+        return ((offset + cls.HALF + 1) << shift) - 1
+
+    def record(self, microseconds):
+        value = min(max(int(microseconds), 0), MAX_MICROSECONDS)
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def percentile(self, p: float) -> int:
+        """ Value (in microseconds) at or below which `p` percent of the recorded values fall """
+        if not self.count:
+            return 0
+
+        target = max(1, round(self.count * p / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.highest_equivalent(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class OperationMetrics:
+    """ Latency histogram and error/timeout/retry counters per transport operation, e.g. ('READ_SHORT', path) """
+
+    def __init__(self):
+        self.histograms = {}
+        self.errors = Counter()
+        self.timeouts = Counter()
+        self.retries = Counter()
+        self.deduplicated = Counter()  # requests answered by an identical one already in flight
+        self.started = time.monotonic()
+
+    def record(self, key, seconds):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.record(seconds * 1e6)
+
+    def error(self, key):
+        self.errors[key] += 1
+
+    def timeout(self, key):
+        self.timeouts[key] += 1
+
+    def retry(self, key):
+        self.retries[key] += 1
+
+    def deduplicate(self, key):
+        self.deduplicated[key] += 1
+
+    def keys(self):
+        return set(self.histograms) | set(self.errors) | set(self.timeouts) | set(self.retries)
+
+    def total(self) -> int:
+        return sum(histogram.count for histogram in self.histograms.values())
+
+    def rows(self):
+        """ (key, count, p50 us, p99 us, max us, errors, timeouts, retries) for every operation, busiest first """
+        rows = []
+        for key in self.keys():
+            histogram = self.histograms.get(key) or Histogram()
+            rows.append((key, histogram.count, histogram.percentile(50), histogram.percentile(99), histogram.max,
+                         self.errors[key], self.timeouts[key], self.retries[key]))
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
+
+    def reset(self):
+        self.__init__()
+
+
+class LoopLag:
+    """ How late the event loop runs a callback it was asked to run every `interval` seconds """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.histogram = Histogram()
+        self.last = 0.0
+        self._loop = self._handle = None
+        self._expected = 0.0
+
+    def start(self, loop):
+        self._loop = loop
+        self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._expected = self._loop.time() + self.interval
+        self._handle = self._loop.call_at(self._expected, self._tick)
+
+    def _tick(self):
+        self.last = max(self._loop.time() - self._expected, 0.0)
+        self.histogram.record(self.last * 1e6)
+        self._schedule()
+
+
+BLE_METRICS = OperationMetrics()
@@ -0,0 +1,133 @@
+from array import array
+from bisect import bisect_left
+from time import monotonic
+
+NAN = float('nan')
+FIELDS = ('timestamp', 'heater_temp', 'target_temp', 'operating_state', 'elapsed', 'battery')
+# typecode per column; 'b' columns use -1 as their "unknown" marker, 'd' columns use nan
+TYPECODES = {'timestamp': 'd', 'heater_temp': 'd', 'target_temp': 'd',
+             'operating_state': 'b', 'elapsed': 'd', 'battery': 'b'}
+
+
+class TelemetryRing:
+    """
+    Fixed-capacity ring of device samples, stored column-wise in flat arrays.
+    Every sample gets a sequence number (0, 1, 2, ...) so readers can poll for anything newer than what they have seen.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.count = 0  # total samples ever appended; the next sample's sequence number
+        for name in FIELDS:
+            typecode = TYPECODES[name]
+            setattr(self, name, array(typecode, bytes(array(typecode).itemsize * capacity)))
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def first_seq(self) -> int:
+        return self.count - len(self)
+
+    def append(self, heater_temp: float, target_temp: float = NAN, operating_state: int = None,
+               elapsed: float = NAN, battery: int = None, timestamp: float = None) -> int:
+        seq = self.count
+        i = seq % self.capacity
+        self.timestamp[i] = monotonic() if timestamp is None else timestamp
+        self.heater_temp[i] = heater_temp
+        self.target_temp[i] = target_temp
+        self.operating_state[i] = -1 if operating_state is None else int(operating_state)
+        self.elapsed[i] = elapsed
+        self.battery[i] = -1 if battery is None else int(battery)
+        self.count = seq + 1
+        return seq
+
+    def clear(self):
+        self.count = 0
+
+    def sample(self, seq: int) -> tuple:
+        if not (self.first_seq <= seq < self.count):
+            raise IndexError(f'sample {seq} is not in the ring')
+
+        i = seq % self.capacity
+        return tuple(getattr(self, name)[i] for name in FIELDS)
+
+    def latest(self):
+        if not self.count:
+            return None
+        return self.sample(self.count - 1)
+
+    def column(self, name: str, start_seq: int = None, end_seq: int = None) -> array:
+        """ Copy of a column between two sequence numbers, oldest first """
+        start_seq, end_seq = self._clamp(start_seq, end_seq)
+        col = getattr(self, name)
+        if start_seq >= end_seq:
+            return array(col.typecode)
+
+        start, end = start_seq % self.capacity, end_seq % self.capacity
+        if start < end:
+            return col[start:end]
+        return col[start:] + col[:end]  # wrapped around the end of the buffer
+
+    def since(self, seq: int):
+        """ Yield (seq, sample) for every sample newer than or equal to `seq` """
+        for s in range(max(seq, self.first_seq), self.count):
+            yield s, self.sample(s)
+
+    def seq_at(self, timestamp: float) -> int:
+        """ Sequence number of the first sample taken at or after `timestamp` """
+        cap = self.capacity
+        return bisect_left(range(self.first_seq, self.count), timestamp,
+                           key=lambda s: self.timestamp[s % cap]) + self.first_seq
+
+    def window(self, seconds: float, name: str = 'heater_temp', now: float = None):
+        """ (min, max, mean) of a column over the last `seconds`; None if there are no valid samples """
+        import numpy as np  # readers only, keeps it off the startup path
+
+        if now is None:
+            now = monotonic()
+        values = self._values(name, *self._clamp(self.seq_at(now - seconds), None))
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return None
+        return float(values.min()), float(values.max()), float(values.mean())
+
+    def decimate(self, buckets: int, name: str = 'heater_temp', start_seq: int = None, end_seq: int = None):
+        """
+        Reduce a range of samples to at most `buckets` (timestamp, min, max) triples,
+        keeping the extremes of each bucket so spikes survive the downsampling
+        """
+        start_seq, end_seq = self._clamp(start_seq, end_seq)
+        n = end_seq - start_seq
+        if n <= 0 or buckets <= 0:
+            return []
+
+        import numpy as np
+
+        stamps = self._values('timestamp', start_seq, end_seq)
+        values = self._values(name, start_seq, end_seq)
+        starts = np.arange(0, n, max(n / buckets, 1)).astype(np.int64)  # first sample of every bucket
+        lows, highs = np.fmin.reduceat(values, starts), np.fmax.reduceat(values, starts)  # (nan only if all are)
+        keep = ~np.isnan(lows)
+        return list(zip(stamps[starts[keep]].tolist(), lows[keep].tolist(), highs[keep].tolist()))
+
+    def _clamp(self, start_seq, end_seq):
+        first = self.first_seq
+        start_seq = first if start_seq is None else min(max(start_seq, first), self.count)
+        end_seq = self.count if end_seq is None else min(max(end_seq, start_seq), self.count)
+        return start_seq, end_seq
+
+    def _values(self, name, start_seq, end_seq):
+        """ A column between two (clamped) sequence numbers as a float64 numpy array, unknown values as nan """
+        import numpy as np
+
+        col = getattr(self, name)
+        ring = np.frombuffer(col, dtype=col.typecode)
+        start, end = start_seq % self.capacity, start_seq % self.capacity + end_seq - start_seq
+        if end <= self.capacity:
+            values = ring[start:end].astype(np.float64)
+        else:  # wrapped around the end of the buffer
+            values = np.concatenate((ring[start:], ring[:end - self.capacity])).astype(np.float64)
+        if col.typecode == 'b':
+            values[values < 0] = np.nan
+        return values
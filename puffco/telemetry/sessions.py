@@ -0,0 +1,279 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .ring import NAN
+
+log = logging.getLogger(__name__)
+
+# chunk layout: header | zstd(meta json | column data)
+CHUNK_MAGIC = b'PCSC'
+CHUNK_VERSION = 1
+CHUNK_HEADER = struct.Struct('<4sHHddIII')  # magic, version, flags, start, end, samples, meta length, payload length
+# one fixed-size record per chunk, so the index can be read (and appended) without parsing anything
+INDEX_RECORD = struct.Struct('<QIddb3x')  # offset, chunk length, start, end, profile index
+COLUMNS = (('t', 'd'), ('heater_temp', 'f'), ('target_temp', 'f'), ('operating_state', 'b'))
+
+
+class HeatSession:
+    def __init__(self, start, end, meta, columns):
+        self.start = start  # unix time
+        self.end = end
+        self.meta = meta
+        self.columns = columns  # name -> array, sample times are seconds since `start`
+
+    @property
+    def profile(self) -> int:
+        return self.meta.get('profile', -1)
+
+    @property
+    def boosts(self) -> list:
+        return self.meta.get('boosts', [])
+
+    def __len__(self):
+        return len(self.columns['t'])
+
+    def __str__(self):
+        return f'HeatSession({time.ctime(self.start)}, {len(self)} samples, {self.meta})'
+
+
+class SessionStore:
+    """
+    Append-only heat cycle history.
+    Every session is one zstd compressed chunk of columns in `path`, and `path` + '.idx' holds one fixed-size record per
+    chunk. Reads go through a memory map and the in-memory index, so only the chunks inside a queried time range are
+    ever decompressed.
+    """
+
+    def __init__(self, path='sessions.pcs'):
+        import zstandard  # the store is opened on first use, keep it off the startup path
+
+        self.path = path
+        self.index_path = path + '.idx'
+        self.offsets, self.lengths = array('Q'), array('I')
+        self.starts, self.ends = array('d'), array('d')
+        self.profiles = array('b')
+        self._mmap = None
+        self._mapped_size = 0
+        self._compressor = zstandard.ZstdCompressor(level=9)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._corrupt = (zstandard.ZstdError, struct.error, ValueError)  # what decoding a damaged chunk raises
+        self._load_index()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _load_index(self):
+        indexed_end = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                raw = f.read()
+
+            usable = len(raw) - (len(raw) % INDEX_RECORD.size)  # drop a partially written record
+            for offset, length, start, end, profile in INDEX_RECORD.iter_unpack(raw[:usable]):
+                self._add_to_index(offset, length, start, end, profile)
+            if self.offsets:
+                indexed_end = self.offsets[-1] + self.lengths[-1]
+
+            if usable != len(raw):
+                with open(self.index_path, 'r+b') as f:
+                    f.truncate(usable)
+
+        if not os.path.exists(self.path):
+            return
+
+        data_size = os.path.getsize(self.path)
+        if indexed_end > data_size:  # index points past the data, rebuild it from scratch
+            self.offsets, self.lengths = array('Q'), array('I')
+            self.starts, self.ends = array('d'), array('d')
+            self.profiles = array('b')
+            indexed_end = 0
+            open(self.index_path, 'wb').close()
+
+        if indexed_end < data_size:
+            self._recover(indexed_end, data_size)
+
+    def _recover(self, offset, data_size):
+        # chunks were written after the last index record (crash between the two writes); re-index them
+        records = []
+        with open(self.path, 'rb') as f:
+            while offset + CHUNK_HEADER.size <= data_size:
+                f.seek(offset)
+                magic, version, _flags, start, end, _n, _meta_len, payload_len = \
+                    CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+                length = CHUNK_HEADER.size + payload_len
+                if magic != CHUNK_MAGIC or offset + length > data_size:
+                    break
+
+                try:
+                    meta = self._read_meta(f.read(payload_len))
+                except self._corrupt as e:  # a whole chunk with a damaged payload: treated like a torn one
+                    log.warning('Session data at byte %s is corrupt: %r', offset, e)
+                    break
+                records.append((offset, length, start, end, meta.get('profile', -1)))
+                offset += length
+
+        if offset < data_size:  # torn (or corrupt) chunk at the end of the file
+            log.warning('Discarding %s bytes of incomplete session data', data_size - offset)
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+
+        if records:
+            with open(self.index_path, 'ab') as f:
+                for record in records:
+                    f.write(INDEX_RECORD.pack(*record))
+                    self._add_to_index(*record)
+
+    def _read_meta(self, payload):
+        raw = self._decompressor.decompress(payload)
+        meta_len = struct.unpack_from('<I', raw)[0]
+        meta = json.loads(raw[4:4 + meta_len])
+        if not isinstance(meta, dict):
+            raise ValueError(f'session meta is a {type(meta).__name__}')
+        return meta
+
+    def _add_to_index(self, offset, length, start, end, profile):
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.profiles.append(profile)
+
+    def append(self, start: float, end: float, meta: dict, columns: dict):
+        meta_raw = json.dumps(meta).encode()
+        body = [struct.pack('<I', len(meta_raw)), meta_raw]
+        samples = len(columns['t'])
+        for name, typecode in COLUMNS:
+            col = columns.get(name)
+            if not isinstance(col, array) or col.typecode != typecode:
+                col = array(typecode, col if col is not None else [0] * samples)
+            body.append(col.tobytes())
+
+        payload = self._compressor.compress(b''.join(body))
+        header = CHUNK_HEADER.pack(CHUNK_MAGIC, CHUNK_VERSION, 0, start, end, samples, len(meta_raw), len(payload))
+
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(header + payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        record = (offset, len(header) + len(payload), start, end, int(meta.get('profile', -1)))
+        with open(self.index_path, 'ab') as f:
+            f.write(INDEX_RECORD.pack(*record))
+        self._add_to_index(*record)
+
+    def _map(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if self._mmap is None or size != self._mapped_size:
+            self.close()
+            if not size:
+                return None
+
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+        return self._mmap
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mapped_size = 0
+
+    def query(self, start: float = None, end: float = None, profile: int = None, first: int = 0):
+        """ Yield every session overlapping [start, end] (skipping the `first` stored ones), oldest first """
+        lo = max(first, 0 if start is None else bisect_left(self.ends, start))
+        hi = len(self) if end is None else bisect_right(self.starts, end)
+        if lo >= hi:
+            return
+
+        mapped = self._map()
+        for i in range(lo, hi):
+            if profile is not None and self.profiles[i] != profile:
+                continue
+            yield self._decode(mapped, self.offsets[i], self.lengths[i])
+
+    def _decode(self, mapped, offset, length) -> HeatSession:
+        _magic, _version, _flags, start, end, samples, meta_len, _payload_len = \
+            CHUNK_HEADER.unpack_from(mapped, offset)
+        raw = self._decompressor.decompress(mapped[offset + CHUNK_HEADER.size:offset + length])
+        pos = 4 + meta_len
+        meta = json.loads(raw[4:pos])
+        columns = {}
+        for name, typecode in COLUMNS:
+            col = array(typecode)
+            size = col.itemsize * samples
+            col.frombytes(raw[pos:pos + size])
+            columns[name] = col
+            pos += size
+
+        return HeatSession(start, end, meta, columns)
+
+
+class SessionRecorder:
+    """ Turns the telemetry ring into stored sessions; begin() on preheat, finish() once the cycle has faded """
+
+    def __init__(self, ring, path='sessions.pcs'):
+        self.ring = ring
+        self.path = path
+        self._store = None
+        self._session = None
+
+    @property
+    def store(self) -> SessionStore:
+        if self._store is None:  # opened on first use, keeps the index read out of startup
+            self._store = SessionStore(self.path)
+        return self._store
+
+    @property
+    def recording(self) -> bool:
+        return self._session is not None
+
+    def begin(self, profile: int, profile_name: str = None, target_temp: float = NAN, battery: int = None):
+        self._session = {
+            'start': time.time(),
+            'start_mono': time.monotonic(),
+            'start_seq': self.ring.count,
+            'meta': {'profile': profile, 'profile_name': profile_name, 'target_temp': target_temp,
+                     'battery_before': battery, 'battery_after': None, 'boosts': []},
+        }
+
+    def boost(self, kind: str, value: float):
+        if self._session is None:
+            return
+
+        offset = time.monotonic() - self._session['start_mono']
+        self._session['meta']['boosts'].append([round(offset, 3), kind, value])
+
+    def cancel(self):
+        self._session = None
+
+    def finish(self, battery: int = None):
+        session, self._session = self._session, None
+        if session is None:
+            return None
+
+        ring = self.ring
+        start_seq = session['start_seq']
+        stamps = ring.column('timestamp', start_seq)
+        if not stamps:
+            return None
+
+        origin = session['start_mono']
+        columns = {
+            't': array('d', (ts - origin for ts in stamps)),
+            'heater_temp': array('f', ring.column('heater_temp', start_seq)),
+            'target_temp': array('f', ring.column('target_temp', start_seq)),
+            'operating_state': ring.column('operating_state', start_seq),
+        }
+        meta = session['meta']
+        meta['battery_after'] = battery
+        end = session['start'] + (stamps[-1] - origin)
+        self.store.append(session['start'], end, meta, columns)
+        return meta
@@ -0,0 +1,279 @@
+"""
+Cold-start timeline and on-demand tracing.
+
+The timeline is a handful of named points in time, in seconds since this module was first imported
+(puffco.py imports it before anything else); it is always recorded.
+
+Tracing is off unless started with --trace / --profile (or PUFFCO_TRACE=1), or toggled at runtime
+(Ctrl+Shift+P in the main window). While it is on, spans, puffco.* import times and, optionally, call stacks
+sampled from the main thread are collected and written as a Chrome trace-event JSON file
+(open it in chrome://tracing or ui.perfetto.dev). Only the latest MAX_EVENTS spans and MAX_SAMPLES samples
+(about five minutes of sampling) are kept, so a long session does not grow without bound. While it is off, span() hands back a shared no-op
+and traced() functions cost one global lookup per call.
+"""
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+START = time.perf_counter()
+MARKS = []
+TRACE = None  # the active Trace, None while tracing is off
+SAMPLE_INTERVAL = 0.002
+MAX_EVENTS = 200_000
+MAX_SAMPLES = 150_000  # five minutes at SAMPLE_INTERVAL
+_NO_SPAN = nullcontext()
+
+
+def _us(seconds):
+    return round((seconds - START) * 1e6, 1)
+
+
+def mark(name):
+    MARKS.append((name, time.perf_counter() - START))
+
+
+def elapsed(name):
+    for marked, seconds in MARKS:
+        if marked == name:
+            return seconds
+    return None
+
+
+def timeline() -> str:
+    return ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in MARKS)
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'cat', 'args', 'start', 'id')
+
+    def __init__(self, trace, name, cat, args, is_async):
+        self.trace, self.name, self.cat, self.args = trace, name, cat, args
+        self.id = next(trace.ids) if is_async else None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.id is not None:
+            self.trace.add(ph='b', name=self.name, cat=self.cat, ts=_us(self.start), id=self.id, args=self.args)
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        if self.id is not None:
+            self.trace.add(ph='e', name=self.name, cat=self.cat, ts=_us(end), id=self.id)
+        else:
+            self.trace.add(ph='X', name=self.name, cat=self.cat, ts=_us(self.start),
+                           dur=round((end - self.start) * 1e6, 1), args=self.args)
+        return False
+
+
+class _ImportTracer:
+    """ sys.meta_path hook timing the execution of every `prefix` module """
+
+    def __init__(self, trace, prefix='puffco'):
+        self.trace = trace
+        self.prefix = prefix
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != self.prefix and not fullname.startswith(self.prefix + '.'):
+            return None
+
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self.trace)
+                return spec
+        return None
+
+
+class _TimedLoader:
+    def __init__(self, loader, trace):
+        self._loader = loader
+        self._trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self._trace.span(module.__name__, 'import'):
+            self._loader.exec_module(module)
+
+
+class Trace:
+    def __init__(self):
+        self.events = deque(maxlen=MAX_EVENTS)  # the oldest are dropped first
+        self.ids = itertools.count(1)
+        self.pid = os.getpid()
+        self.main_tid = threading.main_thread().ident
+        self.stack_frames = {}
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self._frame_ids = {}
+        self._sampler = None
+        self._sampling = threading.Event()
+        self._import_tracer = None
+
+    def add(self, **event):
+        event.setdefault('pid', self.pid)
+        event.setdefault('tid', threading.get_ident())
+        if event.get('args') is None:
+            event.pop('args', None)
+        self.events.append(event)
+
+    def span(self, name, cat='puffco', args=None, is_async=False):
+        return _Span(self, name, cat, args, is_async)
+
+    def instant(self, name, cat='puffco', args=None):
+        self.add(ph='i', s='t', name=name, cat=cat, ts=_us(time.perf_counter()), args=args)
+
+    # imports
+    def trace_imports(self, prefix='puffco'):
+        if self._import_tracer is None:
+            self._import_tracer = _ImportTracer(self, prefix)
+            sys.meta_path.insert(0, self._import_tracer)
+
+    def stop_imports(self):
+        if self._import_tracer in sys.meta_path:
+            sys.meta_path.remove(self._import_tracer)
+        self._import_tracer = None
+
+    # sampling profiler
+    def start_sampling(self, interval=SAMPLE_INTERVAL):
+        if self._sampler is not None:
+            return
+
+        self._sampling.set()
+        self._sampler = threading.Thread(target=self._sample_loop, args=(interval,), name='puffco-sampler',
+                                         daemon=True)
+        self._sampler.start()
+
+    def stop_sampling(self):
+        if self._sampler is None:
+            return
+
+        self._sampling.clear()
+        self._sampler.join()
+        self._sampler = None
+
+    def _frame_id(self, frame):
+        # one stackFrames entry per (caller entry, function), so shared call paths are stored once
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+
+        parent = None
+        for code in reversed(stack):
+            key = (parent, code)
+            frame_id = self._frame_ids.get(key)
+            if frame_id is None:
+                frame_id = self._frame_ids[key] = len(self._frame_ids) + 1
+                entry = {'name': f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})',
+                         'category': code.co_filename}
+                if parent is not None:
+                    entry['parent'] = parent
+                self.stack_frames[frame_id] = entry
+            parent = frame_id
+        return parent
+
+    def _sample_loop(self, interval):
+        while self._sampling.is_set():
+            time.sleep(interval)
+            frame = sys._current_frames().get(self.main_tid)
+            if frame is None:
+                continue
+
+            self.samples.append({'cpu': 0, 'tid': self.main_tid, 'ts': _us(time.perf_counter()),
+                                 'name': 'main thread', 'sf': self._frame_id(frame), 'weight': 1})
+            del frame
+
+    def dump(self, path):
+        self.stop_sampling()
+        self.stop_imports()
+        metadata = [{'ph': 'M', 'pid': self.pid, 'tid': thread.ident, 'name': 'thread_name',
+                     'args': {'name': thread.name}} for thread in threading.enumerate()]
+        metadata += [{'ph': 'i', 's': 'g', 'pid': self.pid, 'tid': self.main_tid, 'name': name, 'cat': 'startup',
+                      'ts': round(seconds * 1e6, 1)} for name, seconds in MARKS]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': metadata + list(self.events), 'stackFrames': self.stack_frames,
+                       'samples': list(self.samples), 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+def span(name, cat='puffco', args=None, is_async=False):
+    """ Context manager timing its body, a no-op while tracing is off. Use is_async for spans around awaits """
+    if TRACE is None:
+        return _NO_SPAN
+    return TRACE.span(name, cat, args, is_async)
+
+
+def instant(name, cat='puffco', args=None):
+    """ A point in time on the trace (e.g. the next step of a longer coroutine) """
+    if TRACE is not None:
+        TRACE.instant(name, cat, args)
+
+
+def traced(name=None, cat='puffco'):
+    """ Decorator recording a span for every call of a coroutine function """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if TRACE is None:
+                return await fn(*args, **kwargs)
+            with TRACE.span(label, cat, is_async=True):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start(*, imports=False, sample=False):
+    global TRACE
+    if TRACE is None:
+        TRACE = Trace()
+    if imports:
+        TRACE.trace_imports()
+    if sample:
+        TRACE.start_sampling()
+    return TRACE
+
+
+def stop(path=None):
+    """ Stop tracing and write what was collected, returns the file written (or None if tracing was off) """
+    global TRACE
+    if TRACE is None:
+        return None
+
+    trace, TRACE = TRACE, None
+    return trace.dump(path or time.strftime('puffco-trace-%Y%m%d-%H%M%S.json'))
+
+
+def toggle():
+    """ Start tracing with the sampling profiler, or stop and write the trace file """
+    if TRACE is None:
+        start(sample=True)
+        return None
+    return stop()
+
+
+def configure(argv=None, environ=None):
+    """
+    --trace: trace from startup (imports, connect phases), --profile: also sample the main thread (the trace file
+    keeps the last MAX_SAMPLES samples)
+    """
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    profile = '--profile' in argv
+    if profile or '--trace' in argv or environ.get('PUFFCO_TRACE'):
+        start(imports=True, sample=profile)
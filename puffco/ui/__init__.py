@@ -1,16 +1,30 @@
 import builtins
-from asyncio import exceptions, ensure_future, sleep
-
-from PyQt6.QtCore import QSize, QMetaObject, QTimer
-from PyQt6.QtGui import QIcon, QPixmap, QColor
-from PyQt6.QtWidgets import QPushButton, QMainWindow, QLabel
+import logging
+import math
+import time
+from asyncio import exceptions, gather, sleep
+
+from PyQt6.QtCore import QSize, QTimer, Qt
+from PyQt6.QtGui import QIcon, QColor, QKeySequence, QShortcut
+from PyQt6.QtWidgets import QApplication, QPushButton, QMainWindow, QLabel
 from bleak import BleakError, BleakScanner
 
+from puffco import trace
+from puffco.tasks import TASKS
+
 from puffco.btnet.client import PuffcoBleakClient
 from puffco.btnet import Characteristics, LoraxCharacteristics, DEVICE_HANDSHAKE_KEY, OperatingState, LanternAnimation
+from puffco.btnet.opstate import OperatingStateMachine
+from puffco.btnet.profiles import PROFILE_COUNT
+from puffco.btnet.state import DeviceState
+from puffco.telemetry import TelemetryRing
+from puffco.telemetry.feed import StateFeed
+from puffco.telemetry.metrics import BLE_METRICS
+from puffco.telemetry.sessions import SessionRecorder
 from .control_center import ControlCenter
 from .elements import ImageButton
 from .homescreen import HomeScreen
+from .pixmaps import PIXMAPS
 from .profiles import HeatProfiles, Profile
 from .themes import DEVICE_THEME_MAP
 
@@ -18,19 +32,28 @@ DISABLED_BUTTON_STYLESHEET = 'QPushButton {color: gray;}'
 ENABLED_BUTTON_STYLESHEET = 'QPushButton {color: white;}'
 ACTIVE_TAB_STYLESHEET = 'QPushButton {text-decoration: underline;}'
 INACTIVE_TAB_STYLESHEET = 'QPushButton {text-decoration: none;}'
-UPDATE_COUNT = 0
-CURRENT_TAB = 'home'
-LAST_CHARGING_STATE = [None, None]
-LAST_OPERATING_STATE = None
+HEAT_CYCLE_STATES = (OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE)
+SETTLED_STATES = set(OperatingState) - set(HEAT_CYCLE_STATES) - {OperatingState.HEAT_CYCLE_FADE}
+# momentary states (a button press) only count once they are seen on two polls in a row
+# target temperature, elapsed and total time only move by a boost (or with the clock) during a heat cycle,
+# so they are read every few seconds rather than every temperature tick
+SLOW_SAMPLE_INTERVAL = 2
+DEBOUNCED_STATES = {OperatingState.TEMP_SELECT: 1, OperatingState.BATTERY_DISPLAY: 1,
+                    OperatingState.VERSION_DISPLAY: 1}
+FEED_FIELDS = ('connected', 'device', 'operating_state', 'profile', 'heater_temp', 'target_temp', 'elapsed',
+               'battery', 'charging', 'bulk_charging', 'charge_eta')  # the DeviceState fields the gateway streams
+
+log = logging.getLogger(__name__)
 
 
 class PuffcoMain(QMainWindow):
-    PROFILES = []
     SIZE = QSize(480, 720)
-    LAST_PROFILE_ID = 0
 
     def __init__(self):
         self._client = None  # overridden
+        self.state = DeviceState()  # shared with every client this window connects
+        self.PROFILES = []  # read again (into a new list) on every connect
+        self.current_tab = 'home'
         super(PuffcoMain, self).__init__(parent=None)
         self.setWindowTitle("Puffco Connect (PC)")
         self.setMinimumSize(self.SIZE)
@@ -43,16 +66,30 @@ class PuffcoMain(QMainWindow):
 
         self.timer = QTimer(self)
         self.timer.setInterval(1000 * 2)  # 2s
-        self.timer.timeout.connect(lambda: ensure_future(self.update_loop()).done())
+        # a poll that is still waiting on the device when the timer fires again is skipped, not stacked
+        self.timer.timeout.connect(lambda: TASKS.spawn(self.update_loop, 'update_loop', single_flight=True))
         self.temp_timer = QTimer(self)
         self.temp_timer.setInterval(1000)  # 1s
-        self.temp_timer.timeout.connect(lambda: ensure_future(self.update_temp()).done())
-
-        self.puffco_icon = ImageButton(':/icons/logo.png', self, size=(64, 64),
-                                       callback=lambda: self.dob.setVisible(not self.dob.isVisible()))
+        self.temp_timer.timeout.connect(lambda: TASKS.spawn(self.update_temp, 'update_temp', single_flight=True))
+        self.telemetry = TelemetryRing()
+        self._slow_sampled_at = -math.inf
+        self.feed = StateFeed()  # what the control gateway streams to its subscribers
+        self.state.listen(self.on_state_change)
+        self.operating = OperatingStateMachine(self.state, DEBOUNCED_STATES)
+        self.operating.on_exit(HEAT_CYCLE_STATES, self.on_heat_cycle_end)
+        self.operating.on_enter(HEAT_CYCLE_STATES, lambda _transition: self.begin_session())
+        self.operating.on_enter(SETTLED_STATES, self.on_heat_cycle_settled)
+        # preheat and the cycle itself each have their own total time; read it now, so boosting needs no read
+        self.operating.on_transition(OperatingState, HEAT_CYCLE_STATES, lambda _t: self._client.get_state_ttime())
+        self.disconnects = 0
+        self.sessions = SessionRecorder(self.telemetry)
+
+        self._diagnostics = None
+        self.puffco_icon = ImageButton(':/icons/logo.png', self, size=(64, 64), callback=self.on_logo_clicked)
         self.puffco_icon.move(210, 0)
 
-        self.control_center = ControlCenter(self)
+        self._control_center = None  # the control center and heat profiles are built on first use
+        self._profiles = None
         self.ctrl_center_btn = ImageButton(':/icons/control_center.png', self,
                                            lambda: self.control_center.setHidden(not self.control_center.isHidden()),
                                            size=(36, 36), color=QColor(*theme.TEXT_COLOR))
@@ -73,8 +110,6 @@ class PuffcoMain(QMainWindow):
         self.home_button.setGeometry(0, self.height() - 70, self.width() / 2, 70)
         self.home_button.clicked.connect(lambda: self.show_tab(self.home))
 
-        self.profiles = HeatProfiles(self)
-        self.profiles.lower()
         self.profiles_button = QPushButton('HEAT PROFILES', self)
         self.profiles_button.setStyleSheet(DISABLED_BUTTON_STYLESHEET)
         self.profiles_button.setGeometry(self.home_button.width() + 2, self.home_button.y(),
@@ -83,90 +118,119 @@ class PuffcoMain(QMainWindow):
         self.profiles_button.setDisabled(True)
 
         divider = QLabel('', self)
-        divider.setPixmap(QPixmap(':/themes/menu_separator.png'))
+        divider.setPixmap(PIXMAPS.source(':/themes/menu_separator.png'))
         divider.setScaledContents(True)
         divider.setGeometry(-92, self.home_button.y() - 4, 573, 4)
         divider.setStyleSheet('background: transparent;')
 
+        settings.subscribe('Modes/Stealth', self.home.device.set_stealth)
+        self.home.device.set_stealth(settings.value('Modes/Stealth', False, bool))
+
         # draw up the home screen upon launching the app
         self.home.setVisible(True)
         self.show()
+        trace.mark('window shown')
+
+        QShortcut(QKeySequence('Ctrl+Shift+P'), self).activated.connect(self.toggle_trace)
+
+    @property
+    def control_center(self) -> ControlCenter:
+        if self._control_center is None:
+            self._control_center = ControlCenter(self)
+            self._control_center.stackUnder(self.ctrl_center_btn)
+            self.restore_control_center(self._control_center)
+        return self._control_center
+
+    def restore_control_center(self, control_center):
+        """ Show the settings read on connect (and the saved modes) on the control center, without writing them """
+        state = self.state
+        if state.lantern_brightness is not None:
+            control_center.lantern_brightness.blockSignals(True)
+            control_center.lantern_brightness.setValue(state.lantern_brightness)
+            control_center.lantern_brightness.blockSignals(False)
+        if state.boost_temp is not None:
+            control_center.boost_settings.show_values(state.boost_temp, state.boost_time)
+
+        for control in control_center.CONTROLS:
+            # recolored only: activating the lantern button would open the lantern settings
+            control.ENABLED = not settings.value(control.setting_name, False, bool)
+            control.on_click(update_setting=False)
+
+        lantern_settings, lantern_color = control_center.lantern_settings, state.lantern_color
+        if lantern_color in LanternAnimation.all:  # lantern is an animation preset, toggle the button!
+            idx = LanternAnimation.all.index(lantern_color)
+            if not lantern_settings.animation_toggles[idx]:
+                lantern_settings.animation_toggle(lantern_settings.ANIMATIONS[idx], send=False)
+        elif lantern_color:
+            rgb = tuple(lantern_color[:3])
+            lantern_settings.wheel.selected = rgb
+            lantern_settings.preview.setStyleSheet(f'background: rgb{rgb};'
+                                                   f'border: 1px solid white;')
+
+    @property
+    def profiles(self) -> HeatProfiles:
+        if self._profiles is None:
+            self._profiles = HeatProfiles(self)
+            self._profiles.lower()
+        return self._profiles
+
+    @property
+    def active_profile_window(self):
+        return self._profiles.active_profile if self._profiles is not None else None
+
+    def on_logo_clicked(self):
+        # shift-click shows the BLE diagnostics panel, a plain click the device birthday
+        if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+            if self._diagnostics is None:
+                from .diagnostics import DiagnosticsOverlay
+                self._diagnostics = DiagnosticsOverlay(self)
+            self._diagnostics.toggle()
+        else:
+            self.dob.setVisible(not self.dob.isVisible())
 
-        QMetaObject.connectSlotsByName(self)
+    @staticmethod
+    def toggle_trace():
+        path = trace.toggle()
+        if path:
+            log.info('Trace written to %s', path)
+        else:
+            log.info('Tracing started, press Ctrl+Shift+P again to stop')
 
+    @trace.traced()
     async def update_loop(self):
         """ Update the elements on this frame (if shown) """
         if not self._client.is_connected:
             return
 
-        global UPDATE_COUNT
-        UPDATE_COUNT += 1
-
+        state = self.state
         try:
-            lantern_settings = self.control_center.lantern_settings
-            if lantern_settings.isHidden() is False and lantern_settings.wheel.selected:
+            lantern_settings = self._control_center and self._control_center.lantern_settings
+            if lantern_settings and lantern_settings.isHidden() is False and lantern_settings.wheel.selected:
                 if lantern_settings.last_selection != lantern_settings.wheel.selected:
                     await self._client.send_lantern_color(lantern_settings.wheel.selected)
 
                 lantern_settings.last_selection = lantern_settings.wheel.selected
 
-            led = self.home.device.led
-            if settings.value('Modes/Stealth', False, bool):
-                if not led.isHidden():
-                    led.hide()
-            else:
-                if led.isHidden():
-                    led.show()
-
             operating_state = await self._client.get_operating_state()
             if operating_state not in (OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE):
-                global LAST_CHARGING_STATE
+                # (only this poller writes the charging fields, so the transitions below are never missed)
+                was_charging, was_bulk_charging = state.charging, state.bulk_charging
                 is_charging, bulk_charge = await self._client.is_currently_charging()
-                if settings.value('Modes/Ready', False, bool) and (LAST_CHARGING_STATE[0] is True
-                                                                   and LAST_CHARGING_STATE[0] != is_charging):
+                if settings.value('Modes/Ready', False, bool) and (was_charging is True
+                                                                   and was_charging != is_charging):
                     await self._client.preheat()
 
                 # if we are charging, update the battery status every minute
-                if (is_charging and bulk_charge) and UPDATE_COUNT % 30 == 0:
+                if (is_charging and bulk_charge) and state.age('battery') >= 60:
                     await self.update_battery()
 
-                last_bulk_charge = LAST_CHARGING_STATE[1]
-                if last_bulk_charge is True and (last_bulk_charge != bulk_charge):
+                if was_bulk_charging is True and (was_bulk_charging != bulk_charge):
                     self.home.ui_battery.eta.hide()
 
-                LAST_CHARGING_STATE = is_charging, bulk_charge
-
-            global LAST_OPERATING_STATE
-            if LAST_OPERATING_STATE != operating_state:
-                # Handle operating state changes:
-                if LAST_OPERATING_STATE:
-                    last_state_name = OperatingState(LAST_OPERATING_STATE).name
-                    curr_state_name = OperatingState(operating_state).name
-                    print(f'(DEBUG) OpState changed {last_state_name} --> {curr_state_name}')
-                    if LAST_OPERATING_STATE in (OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE):
-                        # we just came out of a heat cycle
-                        await self.update_battery()
-
-                        # slow our temp reader, and make sure it is started/active
-                        # it will automatically stop once it hits 100*F
-                        self.temp_timer.setInterval(1000 * 3)
-                        if not self.temp_timer.isActive():
-                            self.temp_timer.start()
-
-                        # lets update the dab count
-                        if not settings.value('Home/HideDabCounts', False, bool):
-                            total = await self._client.get_total_dab_count()
-                            if self.home.ui_total_dab_cnt.data != total:  # check if our dab count has changed
-                                self.home.ui_total_dab_cnt.update_data(total)
-                                # we can update the daily avg as well
-                                self.home.ui_daily_dab_cnt.update_data(await self._client.get_daily_dab_count())
-
-                        if operating_state not in (OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE):
-                            active_prof_window = self.profiles.active_profile
-                            if active_prof_window and active_prof_window.started:
-                                active_prof_window.cycle_finished()
-
-                LAST_OPERATING_STATE = operating_state
+                state.update(charging=is_charging, bulk_charging=bulk_charge)
+
+            # state changes run their hooks (on_heat_cycle_end, ...) once, from here
+            await self.operating.observe(operating_state)
 
             # Current operating state handling:
             if operating_state == OperatingState.TEMP_SELECT:
@@ -175,32 +239,119 @@ class PuffcoMain(QMainWindow):
                     await self._client.change_profile(current_profile_id)
                     if self.LAST_PROFILE_ID:
                         profile_name = await self._client.get_profile_name(self.LAST_PROFILE_ID)
-                        if profile_name and self.home.ui_active_profile.data != profile_name:
-                            self.home.ui_active_profile.update_data(profile_name)
+                        if profile_name and self.home.view.set('active_profile', profile_name):
                             self.home.device.colorize(*await self._client.profile_color_as_rgb())
 
                     self.LAST_PROFILE_ID = current_profile_id
 
             elif operating_state in (OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE):
+                # (every tick: update_temp stops its timer while the bowl is still below 100*F)
                 self.temp_timer.setInterval(1000)
                 if not self.temp_timer.isActive():
                     self.temp_timer.start()
 
-            elif operating_state == OperatingState.HEAT_CYCLE_FADE:
-                # we are fresh out of a heat cycle, lets update the battery display and slow our temperature updates
-                self.temp_timer.setInterval(1000 * 3)
-                await self.update_battery()
-
         except BleakError:
             # device is not connected, or our characteristics have not been populated
             pass
 
+        finally:
+            self.home.view.push()
+
+    async def on_heat_cycle_end(self, _transition):
+        # we just came out of a heat cycle (into the fade, usually)
+        await self.update_battery()
+
+        # slow our temp reader, and make sure it is started/active
+        # it will automatically stop once it hits 100*F
+        self.temp_timer.setInterval(1000 * 3)
+        if not self.temp_timer.isActive():
+            self.temp_timer.start()
+
+        active_prof_window = self.active_profile_window
+        if active_prof_window and active_prof_window.started:
+            active_prof_window.cycle_finished()
+
+        # lets update the dab count
+        if not settings.value('Home/HideDabCounts', False, bool):
+            total = await self._client.get_total_dab_count()
+            if self.state.update(total_dabs=total):  # check if our dab count has changed
+                # we can update the daily avg as well
+                self.state.update(daily_dabs=await self._client.get_daily_dab_count())
+
+    def on_heat_cycle_settled(self, _transition):
+        if self.sessions.recording:
+            # the cycle has fully faded out; store it (battery was refreshed when the cycle ended)
+            self.sessions.finish(self.battery_percentage)
+
+    @property
+    def LAST_PROFILE_ID(self) -> int:
+        return self.state.profile or 0
+
+    @LAST_PROFILE_ID.setter
+    def LAST_PROFILE_ID(self, idx: int):
+        self.state.update(profile=idx)
+
+    @property
+    def battery_percentage(self):
+        # the latest reading, even if it has not been pushed to the battery widget yet
+        return self.state.battery if self.state.battery is not None else self.home.ui_battery.current_percentage
+
+    def on_state_change(self, delta: dict):
+        for field in ('total_dabs', 'daily_dabs'):
+            if delta.get(field) is not None:
+                self.home.view.set(field, delta[field])
+
+        published = {field: delta[field] for field in FEED_FIELDS if field in delta}
+        if published.get('operating_state') is not None:
+            published['operating_state'] = OperatingState(published['operating_state']).name
+        for field in ('heater_temp', 'target_temp', 'elapsed'):
+            if published.get(field) is not None:
+                published[field] = round(published[field], 1)
+        if published:
+            self.feed.update(**published)
+
+    def begin_session(self):
+        active_prof_window = self.active_profile_window
+        idx = active_prof_window.idx if active_prof_window else self.LAST_PROFILE_ID
+        profile = self.PROFILES[idx] if idx < len(self.PROFILES) else None
+        self.sessions.begin(idx, profile.name if profile else None,
+                            profile.temperature if profile else float('nan'),
+                            self.battery_percentage)
+
+    @trace.traced()
     async def update_temp(self):
         if not self._client.is_connected:
             return
 
         try:
-            temp = await self._client.get_bowl_temperature()
+            state = self.state
+            operating_state = state.operating_state
+            now = time.monotonic()
+            if operating_state not in HEAT_CYCLE_STATES:
+                heater_temp = await self._client.get_heater_temp()
+                target_temp = elapsed = float('nan')
+                state.update(heater_temp=heater_temp, target_temp=target_temp, elapsed=elapsed)
+            elif now - self._slow_sampled_at >= SLOW_SAMPLE_INTERVAL or \
+                    state.age('operating_state') < now - self._slow_sampled_at:
+                # (all four in one round trip; the total time is kept in state by get_state_ttime)
+                heater_temp, target_temp, elapsed, _total = await gather(self._client.get_heater_temp(),
+                                                                         self._client.get_target_temp(),
+                                                                         self._client.get_state_etime(),
+                                                                         self._client.get_state_ttime())
+                self._slow_sampled_at = now
+                # a boost written while these were on the air is newer than what they read
+                state.update_since(now, heater_temp=heater_temp, target_temp=target_temp, elapsed=elapsed)
+                target_temp = state.target_temp if state.target_temp is not None else float('nan')
+            else:
+                heater_temp = await self._client.get_heater_temp()
+                target_temp = state.target_temp if state.target_temp is not None else float('nan')
+                # the elapsed time runs with the clock between reads
+                elapsed = state.elapsed + state.age('elapsed') if state.elapsed is not None else float('nan')
+                state.update(heater_temp=heater_temp, elapsed=elapsed)
+
+            temp = self._client.format_temperature(heater_temp)
+            self.telemetry.append(heater_temp, target_temp, operating_state, elapsed,
+                                  self.battery_percentage)
             num = ''.join(filter(str.isdigit, temp))
             if not num:
                 # atomizer is disconnected, check for changes every 20s
@@ -209,13 +360,7 @@ class PuffcoMain(QMainWindow):
                 #  we are at/below 100 Fahrenheit.. stop our ival
                 self.temp_timer.stop()
 
-            active_prof_window = self.profiles.active_profile
-            if not active_prof_window:
-                profile_id = await self._client.get_profile()
-                self.profiles.select_profile(profile_id)
-                active_prof_window = self.profiles.active_profile
-                active_prof_window.verified = True
-
+            active_prof_window = self.active_profile_window  # (none until the heat profiles tab was opened)
             if active_prof_window:
                 if not active_prof_window.verified:
                     profile_id = await self._client.get_profile()
@@ -225,19 +370,22 @@ class PuffcoMain(QMainWindow):
 
                     active_prof_window.verified = True
 
-                if LAST_OPERATING_STATE in (OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE) and \
+                if operating_state in (OperatingState.HEAT_CYCLE_PREHEAT, OperatingState.HEAT_CYCLE_ACTIVE) and \
                         not active_prof_window.started:
                     # adjust the UI if we have not already done so
                     active_prof_window.start(send_command=False)
 
                 active_prof_window.update_temp_reading(temp)
 
-            if temp and self.home.ui_bowl_temp.data != temp:
-                self.home.ui_bowl_temp.update_data(temp)
+            if temp:
+                self.home.view.set('bowl_temp', temp)
 
         except BleakError:
             pass
 
+        finally:
+            self.home.view.push()
+
     async def update_battery(self):
         if not self._client.is_connected:
             return
@@ -247,24 +395,24 @@ class PuffcoMain(QMainWindow):
             is_charging, _ = await self._client.is_currently_charging()
             eta = None
             if is_charging:
-                eta = await self._client.get_battery_charge_eta()
+                eta = await self._client.get_battery_charge_eta(is_charging)
                 hr, rem = divmod(eta, 3600)
                 mins, sec = divmod(rem, 60)
                 eta = f'{str(int(mins)).zfill(2)}:{str(int(sec)).zfill(2)}'
                 if hr > 0:
                     eta = str(int(hr)).zfill(2) + f':{eta}'
 
-            self.home.ui_battery.update_battery(percentage, is_charging, eta)
+            self.home.view.set('battery', (percentage, is_charging, eta))
+            self.state.update(battery=percentage, charge_eta=eta)  # charging is update_loop's
         except BleakError:
             pass
 
     def show_tab(self, frame):
-        global CURRENT_TAB
         is_home = frame == self.home
-        if (is_home and CURRENT_TAB == 'home') or (CURRENT_TAB == 'profiles' and not is_home):
+        if (is_home and self.current_tab == 'home') or (self.current_tab == 'profiles' and not is_home):
             return
 
-        CURRENT_TAB = 'home' if is_home else 'profiles'
+        self.current_tab = 'home' if is_home else 'profiles'
         other = self.profiles if is_home else self.home
 
         self.home_button.setStyleSheet(ACTIVE_TAB_STYLESHEET if is_home else INACTIVE_TAB_STYLESHEET)
@@ -272,13 +420,8 @@ class PuffcoMain(QMainWindow):
         self.home_button.setDown(is_home)
         self.profiles_button.setDown(not is_home)
 
-        # update the data
-        try:
-            fetch_task = ensure_future(frame.fill())
-            fetch_task.done()
-        except BleakError:
-            # no connect (typically happens when reading a characteristic in the same frame as establishing connection)
-            return self.show_tab(frame)
+        # update the data (a failed read, e.g. while still connecting, is logged by the supervisor)
+        TASKS.spawn(frame.fill, f'{type(frame).__name__}.fill', single_flight=True)
 
         frame.show()
         frame.setVisible(True)
@@ -287,7 +430,7 @@ class PuffcoMain(QMainWindow):
 
     async def connect(self, *, retry=False):
         if not retry:
-            print('Scanning for Peak Pro devices..')
+            log.info('Scanning for Peak Pro devices..')
 
         if PuffcoBleakClient.RETRIES >= 100:
             raise ConnectionRefusedError('Could not connect to any devices.')
@@ -296,7 +439,8 @@ class PuffcoMain(QMainWindow):
         connected, timeout = False, False
 
         self.home.update_connection_status('SCANNING', 'yellow')
-        discovered_devices_and_advertisement_data = await BleakScanner().discover(return_adv=True)
+        with trace.span('scan', 'connect', is_async=True):
+            discovered_devices_and_advertisement_data = await BleakScanner().discover(return_adv=True)
         for key, dev_and_adv_dat in discovered_devices_and_advertisement_data.items():
             device = dev_and_adv_dat[0]
             adv_dat = dev_and_adv_dat[1]
@@ -304,66 +448,75 @@ class PuffcoMain(QMainWindow):
             if device.address.startswith('84:2E:14:') or device.address.startswith('84:FD:27:') or \
                     Characteristics.SERVICE_UUID in adv_dat.service_uuids:
                 self.home.update_connection_status(f'Found "{device.name}"', 'orange')
-                print(f'Potential Peak Pro "{device.name}" ({device.address})')
+                log.info('Potential Peak Pro "%s" (%s)', device.name, device.address)
                 found_device_name = device.name
                 found_device_addr = device.address
                 break
 
         if not found_device_addr:
-            print('Could not locate a Peak Pro, rescanning..')
+            log.info('Could not locate a Peak Pro, rescanning..')
             return await self.connect(retry=True)
 
-        self._client = PuffcoBleakClient(found_device_addr,
-                                         disconnected_callback=lambda *args: ensure_future(self.on_disconnect(*args)))
+        self._client = PuffcoBleakClient(found_device_addr, state=self.state,
+                                         disconnected_callback=lambda *args: TASKS.spawn(
+                                             self.on_disconnect(*args), 'on_disconnect', scope='app', critical=True))
         error = False
         try:
             self.home.update_connection_status(f'Connecting to "{found_device_name}"', 'orange')
-            connected = await self._client.connect(timeout=3, use_cached=not retry)
+            with trace.span('connect', 'connect', is_async=True):
+                started = time.perf_counter()
+                connected = await self._client.connect(timeout=3, use_cached=not retry)
             if connected:
+                BLE_METRICS.record(('connect', found_device_addr), time.perf_counter() - started)
                 self._client.DEVICE_NAME = found_device_name
                 self._client.DEVICE_MAC_ADDRESS = found_device_addr
 
                 success = False
-                lorax_service = self._client.services.get_service(LoraxCharacteristics.LORAX_SERVICE_UUID)
-                if lorax_service:
-                    success = await self._client.init_lorax_proto()
-                    if not success:
-                        connected = False
-
-                else:
-                    try:
-                        device_fw_rev = (await self._client.read_gatt_char(Characteristics.SOFTWARE_REVISION)).decode()
-                    except (OSError, BleakError):
-                        device_fw_rev = None
-
-                    if device_fw_rev is None:
-                        self.home.update_connection_status(f'Connection Error', 'red')
-                        print('Error retrieving firmware revision, disconnecting.')
-                        await self._client.disconnect()
-                        self._client = None
-                        return await self.connect(retry=True)
-
-                    elif device_fw_rev == 'X':
-                        self.home.update_connection_status(f'Authenticating..', 'yellow')
-
-                        current_access_seed = list(await self._client.read_gatt_char(Characteristics.ACCESS_SEED_KEY))
-                        sliced_key = self._client.create_auth_token(current_access_seed, DEVICE_HANDSHAKE_KEY)
-
-                        # now we write this sliced key to the accessSeed characteristic, which should grant R/W perms
-                        # for the remainder of the characteristics
+                with trace.span('auth', 'connect', is_async=True):
+                    lorax_service = self._client.services.get_service(LoraxCharacteristics.LORAX_SERVICE_UUID)
+                    if lorax_service:
+                        success = await self._client.init_lorax_proto()
+                        if not success:
+                            connected = False
+
+                    else:
                         try:
-                            await self._client.write_gatt_char(Characteristics.ACCESS_SEED_KEY, sliced_key)
-                            success = True
-                        except (BleakError, OSError):
-                            raise RuntimeError(f'Failed to authenticate to device (Firmware: {device_fw_rev})')
+                            device_fw_rev = (await self._client.read_gatt_char(Characteristics.SOFTWARE_REVISION)).decode()
+                        except (OSError, BleakError):
+                            device_fw_rev = None
+
+                        if device_fw_rev is None:
+                            self.home.update_connection_status(f'Connection Error', 'red')
+                            log.error('Error retrieving firmware revision, disconnecting.')
+                            await self._client.disconnect()
+                            self._client = None
+
+                        elif device_fw_rev == 'X':
+                            self.home.update_connection_status(f'Authenticating..', 'yellow')
+
+                            current_access_seed = list(await self._client.read_gatt_char(Characteristics.ACCESS_SEED_KEY))
+                            sliced_key = self._client.create_auth_token(current_access_seed, DEVICE_HANDSHAKE_KEY)
+
+                            # now we write this sliced key to the accessSeed characteristic, which should grant R/W perms
+                            # for the remainder of the characteristics
+                            try:
+                                await self._client.write_gatt_char(Characteristics.ACCESS_SEED_KEY, sliced_key)
+                                success = True
+                            except (BleakError, OSError):
+                                raise RuntimeError(f'Failed to authenticate to device (Firmware: {device_fw_rev})')
+
+                if self._client is None:
+                    return await self.connect(retry=True)
 
                 if success:
-                    await self._on_connect()
+                    with trace.span('on_connect', 'connect', is_async=True):
+                        await self._on_connect()
         except exceptions.TimeoutError:  # could not connect to device
-            print('Timed out while connecting, retrying..')
+            log.warning('Timed out while connecting, retrying..')
+            BLE_METRICS.timeout(('connect', found_device_addr))
             timeout = error = True
         except BleakError as e:  # could not find device
-            print(f'(ERROR: BLEAK) "{e}", retrying..')
+            log.error('(BLEAK) "%s", retrying..', e)
             error = True
 
         if self.home.ui_connect_status.text() != 'DISCONNECTED' and not connected:
@@ -372,28 +525,43 @@ class PuffcoMain(QMainWindow):
         if connected and (error is False):
             await self._client.pair()
             self._client.RETRIES = 0
-            print('Connected!')
+            log.info('Connected!')
             self.home.update_connection_status('CONNECTED', '#4CD964')
+            self.state.update(connected=True, device=self._client.DEVICE_NAME)
             return connected
         else:
             if retry:
                 self._client.RETRIES += 1
+                BLE_METRICS.retry(('connect', found_device_addr))
 
             if not timeout:
-                print('Failed to connect, retrying..')
+                log.warning('Failed to connect, retrying..')
 
             await sleep(2.5)  # reconnectDelayMs: 2500
             return await self.connect(retry=True)
 
     async def on_disconnect(self, client: PuffcoBleakClient):
+        self.disconnects += 1
+        cancelled = TASKS.cancel_scope('connection')
+        if cancelled:
+            log.debug('Cancelled %s tasks still talking to the lost connection', cancelled)
+        # operating.reset() runs no exit hooks, so a heat cycle in progress is wrapped up here
+        if self.sessions.recording:
+            self.sessions.finish(self.battery_percentage)  # stored up to the last reading
+        self.state.clear('device', 'profile')  # the profile is re-selected (if it changed) after reconnecting
+        self.operating.reset()
+        self.state.update(connected=False)
         await self.home.reset()
         if not self.isVisible():
             self.show()
 
         if self.timer.isActive():
             self.timer.stop()
+        if self.temp_timer.isActive():
+            self.temp_timer.stop()
 
-        print(f'Lost connection to "{client.DEVICE_NAME}" ({client.DEVICE_MAC_ADDRESS}), attempting to reconnect...')
+        log.warning('Lost connection to "%s" (%s), attempting to reconnect...', client.DEVICE_NAME,
+                    client.DEVICE_MAC_ADDRESS)
         return await self.connect(retry=True)
 
     async def _on_connect(self):
@@ -404,10 +572,11 @@ class PuffcoMain(QMainWindow):
         self.ctrl_center_btn.setDisabled(False)
         self.dob.setText(f'DOB: {await self._client.get_device_birthday()}')
 
+        trace.instant('on_connect: theme', 'connect')
         if settings.value('General/Theme', 'unset', str) == 'unset':
             model = await self._client.get_device_model()
             if model not in DEVICE_THEME_MAP:
-                print(f'Unknown device model {model}')
+                log.warning('Unknown device model %s', model)
                 builtins.theme = theme = DEVICE_THEME_MAP['0']  # basic/default
             else:
                 builtins.theme = theme = DEVICE_THEME_MAP[model]
@@ -423,59 +592,40 @@ class PuffcoMain(QMainWindow):
                 self.ctrl_center_btn.setIconSize(pixmap.size())
                 self.ctrl_center_btn.setIcon(QIcon(pixmap))
 
-                self.home.device.device.setPixmap(QPixmap(theme.DEVICE))
+                self.home.device.device.setPixmap(PIXMAPS.source(theme.DEVICE))
                 self.home.device.device.resize(291, 430)
 
                 self.home.device.led.setMaximumWidth(self.home.device.device.width() - theme.LIGHTING_WIDTH_ADJ)
-                self.home.device.led.setPixmap(QPixmap(theme.LIGHTING))
+                self.home.device.led.setPixmap(PIXMAPS.source(theme.LIGHTING))
                 self.home.device.led.resize(self.home.device.device.width() - theme.LIGHTING_WIDTH_ADJ,
                                             self.home.device.device.height())
                 if self.home.device.color:
                     self.home.device.colorize(*self.home.device.color)
 
-                for button in self.profiles.profile_buttons.values():
-                    button._pixmap = QPixmap(theme.HOME_DATA)
+                for button in (self._profiles.profile_buttons.values() if self._profiles else ()):
+                    button._pixmap = PIXMAPS.source(theme.HOME_DATA)
                     button.update()
 
-        self.control_center.lantern_brightness.blockSignals(True)
-        self.control_center.lantern_brightness.setValue(await self._client.get_lantern_brightness())
-        self.control_center.lantern_brightness.blockSignals(False)
-
+        trace.instant('on_connect: control center', 'connect')
+        # only the device side here; the control center shows these once it is built (see restore_control_center)
         boost_temp, boost_time = await self._client.get_boost_settings(self.LAST_PROFILE_ID)
-        self.control_center.boost_settings.temp_slider.setValue(boost_temp)
-        self.control_center.boost_settings.time_slider.setValue(boost_time)
-
-        # Activate control center buttons:
-        for control in self.control_center.CONTROLS:
-            value = settings.value(control.setting_name, False, bool)
-
-            if 'lantern' in control.setting_name.lower():
-                # send the lantern status and continue. we do not want to activate the button,
-                # as that will cause the lantern UI to appear upon opening control center
-                await self._client.send_lantern_status(value)
-
-                lantern_color = await self._client.get_lantern_color()
-                if lantern_color in LanternAnimation.all:  # lantern is an animation preset, toggle the button!
-                    idx = LanternAnimation.all.index(lantern_color)
-                    self.control_center.lantern_settings.animation_toggle(['PULSING', 'ROTATING', 'DISCO_MODE'][idx])
-                else:
-                    rgb = tuple(lantern_color[:3])
-                    self.control_center.lantern_settings.wheel.selected = rgb
-                    self.control_center.lantern_settings.preview.setStyleSheet(f'background: rgb{rgb};'
-                                                                               f'border: 1px solid white;')
-
-                control.ENABLED = not value
-                control.on_click(update_setting=False)
-                continue
-
-            if value:
-                control.on_click()
+        self.state.update(lantern_brightness=await self._client.get_lantern_brightness(),
+                          boost_temp=boost_temp, boost_time=boost_time)
+        await self._client.send_lantern_status(settings.value('Modes/Lantern', False, bool))
+        await self._client.get_lantern_color()  # kept in state.lantern_color
+        if settings.value('Modes/Stealth', False, bool):
+            await self._client.set_stealth_mode(True)
+
+        if self._control_center is not None:
+            self.restore_control_center(self._control_center)
 
+        trace.instant('on_connect: profiles', 'connect')
         current_profile_name = await self._client.get_profile_name(self.LAST_PROFILE_ID)
 
         reset_idx = None
+        profiles = []
         # loop through the 4 profiles; fetching and storing the data for each of them
-        for i in range(0, 4):
+        for i in range(PROFILE_COUNT):
             await self._client.change_profile(i)
             name = await self._client.get_profile_name(i)
             if current_profile_name == name:
@@ -483,26 +633,37 @@ class PuffcoMain(QMainWindow):
 
             temp = await self._client.get_profile_temp(i)
             color_bytes = await self._client.get_profile_color(i)
-            time = await self._client.get_profile_time(i)
+            duration = await self._client.get_profile_time(i)
 
-            self.PROFILES.append(Profile(i, name, temp, time, color_bytes[:3], color_bytes))
+            boost = (boost_temp, boost_time) if i == self.LAST_PROFILE_ID else ()
+            profiles.append(Profile(i, name, temp, duration, color_bytes[:3], color_bytes, *boost))
             await sleep(0.1)  # short delay to prevent incorrect profile colors
+        self.PROFILES = profiles  # replaced, not added to: their device snapshots are what the library diffs against
 
         # reset the profile back to where it was
         if reset_idx is not None:
             await self._client.change_profile(reset_idx, current=True)
 
-        if self.profiles.isVisible():
-            self.profiles.setVisible(False)
+        trace.instant('on_connect: fill', 'connect')
+        if self._profiles is not None:  # otherwise filled when first opened
+            if self._profiles.isVisible():
+                self._profiles.setVisible(False)
 
-        await self.profiles.fill()
+            await self._profiles.fill()
         await self.home.fill(from_callback=True)
         if not self.isVisible():
             self.show()
 
         self.profiles_button.setDisabled(False)
 
+    def paintEvent(self, event):
+        super(PuffcoMain, self).paintEvent(event)
+        if trace.elapsed('first paint') is None:
+            trace.mark('first paint')
+            log.debug('Cold start: %s', trace.timeline())
+
     def closeEvent(self, event):
+        settings.sync()
         logger.close_log()
         loop.stop()
         event.accept()
@@ -0,0 +1,28 @@
+from PyQt6.QtGui import QImage
+
+from .pixmaps import PIXMAPS
+
+_LUTS = {}
+
+
+def color_lut(asset: str, size=None):
+    """
+    Read-only (height, width, 4) RGBA numpy array of a color picker asset, scaled the same way as
+    PIXMAPS.tinted(asset, size, paint=False). One array is shared by every picker using the same asset and size.
+    """
+    import numpy as np  # deferred until a color picker is first built
+
+    key = (asset, tuple(size) if size else None)
+    lut = _LUTS.get(key)
+    if lut is not None:
+        return lut
+
+    image = PIXMAPS.tinted(asset, size, paint=False).toImage().convertToFormat(QImage.Format.Format_RGBA8888)
+    w, h = image.width(), image.height()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(h, image.bytesPerLine())
+    lut = rows[:, :w * 4].reshape(h, w, 4).copy()
+    lut.flags.writeable = False
+    _LUTS[key] = lut
+    return lut
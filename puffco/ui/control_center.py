@@ -1,11 +1,12 @@
 from PyQt6.QtCore import Qt, QEvent
 from PyQt6.QtGui import QFont, QColor, QIcon, QPixmap, QCursor
 from PyQt6.QtWidgets import QFrame, QLabel, QSlider, QPushButton
-from PIL import Image, ImageOps
 
 from puffco.btnet import Constants, DeviceCommands
-from . import ensure_future, LanternAnimation
+from puffco.tasks import TASKS
+from . import LanternAnimation
 from .elements import ImageButton
+from .pixmaps import PIXMAPS
 from .profile_window import ColorSlider
 
 button_font = QFont()
@@ -116,8 +117,30 @@ class BoostSettings(QFrame):
         self.temp_slider.setValue(Constants.DEFAULT_BOOST_TEMP_CELSIUS)
         self.time_slider.setValue(Constants.DEFAULT_BOOST_DURATION)
 
+    def show_values(self, temp: int, duration: int):
+        """ Set both sliders without writing them back to the device """
+        for slider, val in ((self.temp_slider, temp), (self.time_slider, duration)):
+            slider.blockSignals(True)
+            slider.setValue(val)
+            slider.blockSignals(False)
+        self.value_label_te.setText(f'+{temp}°C')
+        self.value_label_t.setText(f'+{duration}s')
+
     def update_slider(self, slider: str, val: int):
-        ensure_future(client.send_boost_settings(slider, val)).done()
+        # the sliders show (and edit) the boost settings of the profile selected on the device
+        window = self.parent().parent()
+        profile = window.LAST_PROFILE_ID
+        field = 'boost_temp' if slider == 'temp' else 'boost_time'
+        edited = window.PROFILES[profile] if profile < len(window.PROFILES) else None
+        if edited is not None:
+            setattr(edited, field, val)
+
+        async def send():
+            await client.send_boost_settings(slider, val, profile)
+            if edited is not None:
+                edited.device[field] = val  # only now known to be on the device (a library load diffs against it)
+
+        TASKS.spawn(send, f'boost {slider} setting', latest=True)
         if slider == 'time':
             self.value_label_t.setText(f'+{val}s')
         else:
@@ -125,7 +148,7 @@ class BoostSettings(QFrame):
 
     def exit(self, _):
         control_center = self.parent()
-        control_center.toggle_boost_settings(True)#(False, True)
+        control_center.toggle_boost_settings(True)
 
 
 class ColorWheel(ColorSlider):
@@ -142,20 +165,18 @@ class ColorWheel(ColorSlider):
         pixmap = self.pixmap()
         w, h = pixmap.width(), pixmap.height()
         if w >= self.width() or h >= self.height():
-            pixmap = pixmap.scaled(parent.width(), parent.height() / 2,
-                                   Qt.AspectRatioMode.KeepAspectRatio)
-
-            w, h = pixmap.width(), pixmap.height()
-            self.image = self.image.resize((w, h))
-            self.setFixedSize(w, h)
-            self.setPixmap(pixmap)
+            scaled = pixmap.size().scaled(parent.width(), parent.height() // 2, Qt.AspectRatioMode.KeepAspectRatio)
+            self.set_asset((scaled.width(), scaled.height()))
 
     def mouseReleaseEvent(self, ev) -> None:
         if ev.button() != Qt.MouseButton.LeftButton:
             return
 
+        if self._pick_timer.isActive():
+            self.pick(self._pending_pos)
+
         if self.selecting and ((self.selected is None) or self.selected == self.last_selected):
-            self.mouseMoveEvent(ev)
+            self.pick(ev.pos())
             self.last_selected = self.selected
 
         self.selecting = False
@@ -168,6 +189,7 @@ class ColorWheel(ColorSlider):
 
 
 class LanternSettings(QFrame):
+    ANIMATIONS = ['PULSING', 'ROTATING', 'DISCO_MODE']  # same order as LanternAnimation.all
     animation_toggles = [False, False, False]  # pulse, rotating, disco
     last_selection = None
 
@@ -203,42 +225,39 @@ class LanternSettings(QFrame):
         self.disco_anim.move((self.pulse_anim.x() * 3) + 25, anim_y)
 
         self.animations = [self.pulse_anim, self.rotating_anim, self.disco_anim]
+        self._toggle_icons = [None] * len(self.animations)
 
     def exit(self, _):
         control_center = self.parent()
-        lantern_set = bool(self.wheel.selected) or client.LANTERN_COLOR in LanternAnimation.all
+        lantern_set = bool(self.wheel.selected) or client.state.lantern_color in LanternAnimation.all
         control_center.edit_lantern_settings(lantern_set, done=True)
         control_center.lantern_mode.ENABLED = lantern_set
         control_center.lantern_mode.recolor(forced=False)
         self.wheel.selected = None
 
-    def animation_toggle(self, anim):
-        others = []
-        if anim == 'PULSING':
-            others = [self.rotating_anim, self.disco_anim]
-        elif anim == 'ROTATING':
-            others = [self.pulse_anim, self.disco_anim]
-        elif anim == 'DISCO_MODE':
-            others = [self.pulse_anim, self.rotating_anim]
-
-        control = list(set(self.animations) - set(others))[0]
-        idx = self.animations.index(control)
+    def toggle_icons(self, idx):
+        """ (normal, inverted) icons for an animation toggle, built the first time it is needed """
+        if self._toggle_icons[idx] is None:
+            button = self.animations[idx]
+            normal = PIXMAPS.tinted(button.path, button.iconSize(), paint=False)
+            inverted = PIXMAPS.inverted(button.path, button.iconSize())
+            self._toggle_icons[idx] = ((normal, QIcon(normal)), (inverted, QIcon(inverted)))
+        return self._toggle_icons[idx]
+
+    def animation_toggle(self, anim, send=True):
+        idx = self.ANIMATIONS.index(anim)
         state = not self.animation_toggles[idx]
-        self.animation_toggles[idx] = state
-
-        # COLOR OUR TOGGLES CORRECTLY:
-        for other in others:
-            pixmap = other.alter_pixmap(other.path, other.iconSize(), paint=False, color=None)
-            other.setIcon(QIcon(pixmap))
-
-        pil_img = Image.fromqpixmap(control.PIXMAP)
-        alpha_channel = pil_img.split()[-1]
-        pil_img = ImageOps.invert(pil_img.convert('L'))
-        pil_img.putalpha(alpha_channel)
-        pixmap = control.PIXMAP = pil_img.convert('RGBA').toqpixmap()
-        control.setIcon(QIcon(pixmap))
+
+        # COLOR OUR TOGGLES CORRECTLY (only one animation can be active):
+        for i, button in enumerate(self.animations):
+            active = state if i == idx else False
+            self.animation_toggles[i] = active
+            button.PIXMAP, icon = self.toggle_icons(i)[active]
+            button.setIcon(icon)
+
         # send the animation info
-        ensure_future(client.send_lantern_animation(anim, state)).done()
+        if send:
+            TASKS.spawn(client.send_lantern_animation(anim, state))
 
 
 class ControlButton(ImageButton):
@@ -265,7 +284,7 @@ class ControlButton(ImageButton):
 
         forced = False
         if self._callback and update_setting:
-            if self.special and (not self.ENABLED) and client.LANTERN_COLOR in LanternAnimation.all:
+            if self.special and (not self.ENABLED) and client.state.lantern_color in LanternAnimation.all:
                 forced = self.ENABLED = True
 
             self._callback(forced if forced else self.ENABLED)
@@ -339,13 +358,13 @@ class ControlCenter(QFrame):
 
     def _lantern_callback(self, enabled):
         if enabled is False and (bool(self.lantern_settings.wheel.selected) or
-                                 client.LANTERN_COLOR in LanternAnimation.all):
+                                 client.state.lantern_color in LanternAnimation.all):
             enabled = True
 
         self.edit_lantern_settings(enabled)
 
     def edit_lantern_settings(self, enabled, done=False):
-        ensure_future(client.send_lantern_status(enabled)).done()
+        TASKS.spawn(client.send_lantern_status(enabled))
         if enabled and not done:
             self.parent().ctrl_center_btn.hide()
             self.lantern_settings.show()
@@ -357,8 +376,6 @@ class ControlCenter(QFrame):
 
     def toggle_boost_settings(self, done=False):
         enabled = not self.boost_settings.isVisible()
-        # print(f'toggle_boost_settings {enabled} {done}')
-        #ensure_future(client.send_lantern_status(enabled)).done()
         if enabled and not done:
             self.parent().ctrl_center_btn.hide()
             self.boost_settings.show()
@@ -370,12 +387,12 @@ class ControlCenter(QFrame):
 
     @staticmethod
     def toggle_stealth(enabled):
-        ensure_future(client.set_stealth_mode(enabled)).done()
+        TASKS.spawn(client.set_stealth_mode(enabled))
 
     @staticmethod
     def update_lantern_brightness(val):
-        ensure_future(client.send_lantern_brightness(val)).done()
+        TASKS.spawn(lambda: client.send_lantern_brightness(val), 'lantern brightness', latest=True)
 
     @staticmethod
     def power_down():
-        ensure_future(client.send_mode_command(DeviceCommands.MASTER_OFF)).done()
+        TASKS.spawn(client.send_mode_command(DeviceCommands.MASTER_OFF), 'power down')
@@ -0,0 +1,91 @@
+import time
+
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import QFrame, QLabel
+
+from puffco.tasks import TASKS
+from puffco.telemetry.metrics import BLE_METRICS
+
+HEADER = ('OPERATION', 'N', 'OPS/S', 'P50', 'P99', 'MAX', 'ERR', 'T/O', 'RETRY')
+ROW_FORMAT = '{:<24} {:>6} {:>5} {:>7} {:>7} {:>7} {:>4} {:>4} {:>5}'
+TASK_HEADER = ('TASK', 'N', 'FAIL', 'CANCEL', 'SKIP', 'DROP', 'P50', 'MAX')
+TASK_ROW_FORMAT = '{:<24} {:>6} {:>5} {:>6} {:>5} {:>5} {:>7} {:>7}'
+
+
+def format_us(microseconds: int) -> str:
+    if microseconds >= 1_000_000:
+        return f'{microseconds / 1e6:.1f}s'
+    if microseconds >= 1000:
+        return f'{microseconds / 1000:.1f}ms'
+    return f'{microseconds}us'
+
+
+class DiagnosticsOverlay(QFrame):
+    """ Live per-operation BLE latency table (shift-click the Puffco logo), refreshed once a second while shown """
+
+    def __init__(self, parent, metrics=BLE_METRICS, tasks=TASKS):
+        super(DiagnosticsOverlay, self).__init__(parent)
+        self.metrics = metrics
+        self.tasks = tasks
+        self.setHidden(True)
+        self.setFixedSize(parent.size())
+        self.setStyleSheet('background: rgba(0, 0, 0, 0.85);')
+
+        font = QFont('monospace', 8)
+        font.setStyleHint(QFont.StyleHint.Monospace)
+        self.table = QLabel('', self)
+        self.table.setFont(font)
+        self.table.setStyleSheet('background: transparent; color: white;')
+        self.table.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        self.table.setGeometry(10, 70, self.width() - 20, self.height() - 80)
+        self.table.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+
+        self._last_counts = {}
+        self._last_refresh = time.monotonic()
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+
+    def toggle(self):
+        self.setHidden(not self.isHidden())
+        if not self.isHidden():
+            self.raise_()
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        now = time.monotonic()
+        interval = max(now - self._last_refresh, 1e-3)
+        self._last_refresh = now
+
+        lines = [ROW_FORMAT.format(*HEADER)]
+        counts = {}
+        for key, count, p50, p99, peak, errors, timeouts, retries in self.metrics.rows():
+            counts[key] = count
+            rate = (count - self._last_counts.get(key, count)) / interval
+            name = ' '.join(map(str, key))
+            if len(name) > 24:  # keep the operation and the end of the path
+                operation = name.split(' ', 1)[0][:10]
+                name = f'{operation} ..{name[-(21 - len(operation)):]}'
+            lines.append(ROW_FORMAT.format(name, count, f'{rate:.1f}', format_us(p50), format_us(p99),
+                                           format_us(peak), errors, timeouts, retries))
+        self._last_counts = counts
+
+        uptime = now - self.metrics.started
+        lines.append('')
+        lines.append(f'{self.metrics.total()} operations in {uptime:.0f}s, '
+                     f'{sum(self.metrics.deduplicated.values())} reads shared one already in flight')
+
+        lines.append('')
+        lines.append(TASK_ROW_FORMAT.format(*TASK_HEADER))
+        for name, started, failed, cancelled, skipped, dropped, p50, peak in self.tasks.rows():
+            lines.append(TASK_ROW_FORMAT.format(name[-24:], started, failed, cancelled, skipped, dropped,
+                                                format_us(p50), format_us(peak)))
+        lines.append(f'{len(self.tasks)} tasks pending')
+        self.table.setText('\n'.join(lines))
+
+    def mousePressEvent(self, event):
+        self.toggle()
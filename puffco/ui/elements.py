@@ -2,6 +2,8 @@ from PyQt6.QtCore import Qt, QSize
 from PyQt6.QtGui import QPainter, QColor, QPixmap, QFont, QIcon
 from PyQt6.QtWidgets import QAbstractButton, QLabel, QGraphicsBlurEffect, QFrame, QPushButton
 
+from .pixmaps import PIXMAPS
+
 
 class DeviceVisualizer(QFrame):
     def __init__(self, parent):
@@ -9,31 +11,28 @@ class DeviceVisualizer(QFrame):
         self.move(215, 150)
         self.setStyleSheet('background: transparent;')
         self.device = QLabel('', self)
-        self.device.setPixmap(QPixmap(theme.DEVICE))
+        self.device.setPixmap(PIXMAPS.source(theme.DEVICE))
         self.device.resize(291, 430)
         self.device.setScaledContents(True)
         self.led = QLabel('', self)
         self.led.setFixedHeight(self.device.height())
         self.led.setMaximumWidth(self.device.width() - theme.LIGHTING_WIDTH_ADJ)
 
-        self.led.setPixmap(QPixmap(theme.LIGHTING))
+        self.led.setPixmap(PIXMAPS.source(theme.LIGHTING))
         self.led.setScaledContents(True)
         self.led.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.led.setStyleSheet(None)
         self.color = None
 
+    def set_stealth(self, enabled: bool):
+        self.led.setHidden(bool(enabled))
+
     def colorize(self, r: int, g: int, b: int, alpha: int = 255):
         self.color = (r, g, b)
-        pixmap = QPixmap(theme.LIGHTING)
-        painter = QPainter(pixmap)
-        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceIn)
-        painter.fillRect(pixmap.rect(), QColor(r, g, b, alpha))
-        painter.end()
-        self.led.setPixmap(pixmap)
-        b = QGraphicsBlurEffect()
-        b.setBlurRadius(5)
-        b.setBlurHints(QGraphicsBlurEffect.BlurHint.QualityHint)
-        self.led.setGraphicsEffect(b)
+        # the glow comes out of the cache pre-blurred, so no live blur effect is needed on the label
+        if self.led.graphicsEffect() is not None:
+            self.led.setGraphicsEffect(None)
+        self.led.setPixmap(PIXMAPS.glow(theme.LIGHTING, self.led.size(), (r, g, b, alpha)))
         self.led.raise_()
         self.led.update()
 
@@ -55,24 +54,7 @@ class ImageButton(QPushButton):
             self.clicked.connect(callback)
 
     def alter_pixmap(self, asset_path, size, paint, color):
-        pixmap = QPixmap(asset_path)
-        if size:
-            if isinstance(size, QSize):
-                w, h = size.width(), size.height()
-            else:
-                w, h = size
-            if w > pixmap.width():
-                w = pixmap.width()
-            if h > pixmap.height():
-                h = pixmap.height()
-            pixmap = pixmap.scaled(w, h)
-
-        if paint:
-            painter = QPainter(pixmap)
-            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceIn)
-            painter.fillRect(pixmap.rect(), color or QColor(255, 255, 255))
-            painter.end()
-
+        pixmap = PIXMAPS.tinted(asset_path, size, paint, color)
         self.PIXMAP = pixmap
         return pixmap
 
@@ -90,7 +72,7 @@ class ProfileButton(QAbstractButton):
         self.setGeometry(*geom)
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground, True)
         self.pix_asset = theme.HOME_DATA
-        self._pixmap = QPixmap(self.pix_asset)
+        self._pixmap = PIXMAPS.source(self.pix_asset)
 
         # add a 2px grayish border around us
         self._border = QFrame(parent)
@@ -117,8 +99,12 @@ class ProfileButton(QAbstractButton):
         self.temperature.setFont(f)
         self.temperature.move(10, 50)
 
+        self.stats = QLabel('', self)
+        self.stats.setFont(QFont('Slick', 9))
+        self.stats.move(150, 84)
+
         self.glow = QLabel('', self)
-        self.glow.setPixmap(QPixmap(':/themes/profile_bg_glow.png'))
+        self.glow.setPixmap(PIXMAPS.source(':/themes/profile_bg_glow.png'))
         self.glow.move(150, -30)
         b = QGraphicsBlurEffect()
         b.setBlurRadius(5)
@@ -131,6 +117,10 @@ class ProfileButton(QAbstractButton):
         return self._pixmap
 
     def set_pixmap_color(self, color):
+        color = tuple(color)
+        if color == self.color:
+            return
+
         self.color = color
         # color our glow effect
         pm = self.glow.pixmap()
@@ -141,17 +131,26 @@ class ProfileButton(QAbstractButton):
         painter.end()
         self.update()
 
+    @staticmethod
+    def _set_label(label, text):
+        text = str(text)
+        if label.text() == text:
+            return
+
+        label.setText(text)
+        label.adjustSize()
+
     def set_profile_name(self, name):
-        self.profile_name.setText(name)
-        self.profile_name.adjustSize()
+        self._set_label(self.profile_name, name)
 
     def set_duration(self, duration):
-        self.duration.setText(str(duration))
-        self.duration.adjustSize()
+        self._set_label(self.duration, duration)
+
+    def set_stats(self, stats):
+        self._set_label(self.stats, stats)
 
     def set_temperature(self, temperature):
-        self.temperature.setText(temperature)
-        self.temperature.adjustSize()
+        self._set_label(self.temperature, temperature)
 
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -183,7 +182,7 @@ class DataLabel(QLabel):
 
         super(DataLabel, self).__init__('', parent)
         self.setStyleSheet('background: transparent;')
-        self.setPixmap(QPixmap(theme.HOME_DATA))
+        self.setPixmap(PIXMAPS.source(theme.HOME_DATA))
         self.setScaledContents(True)
         self.setMaximumSize(340, 80)
         self.setMinimumSize(280, 80)
@@ -199,6 +198,10 @@ class DataLabel(QLabel):
         self._data.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
     def update_data(self, data: str):
+        data = str(data)
+        if data == self._data.text():
+            return
+
         self._data.setText(data)
         self._data.adjustSize()
 
@@ -229,7 +232,7 @@ class Battery(QFrame):
         self.percent.adjustSize()
         self.icon = QLabel('', self)
         self.icon.setMinimumSize(64, 21)
-        self.icon.setPixmap(QPixmap(self._asset).scaled(41, 21))
+        self.icon.setPixmap(PIXMAPS.tinted(self._asset, (41, 21), paint=False))
         self.icon.move(55, 3)
         self.eta = QLabel('', self)
         shrink = self.eta.font()
@@ -246,11 +249,9 @@ class Battery(QFrame):
         if self.eta.isHidden():
             self.eta.show()
 
-        if eta:
-            self.eta.setText(f'Charge ETA: ~ {eta}')
-            self.eta.adjustSize()
-        elif self.eta.text() and eta is None:
-            self.eta.setText('')
+        eta_text = f'Charge ETA: ~ {eta}' if eta else (self.eta.text() if eta is not None else '')
+        if eta_text != self.eta.text():
+            self.eta.setText(eta_text)
             self.eta.adjustSize()
 
         if percent != self.current_percentage:
@@ -269,17 +270,15 @@ class Battery(QFrame):
         else:
             asset_name = 'full'
 
-        if charging != self.last_charge_state:
-            if charging:
-                asset_name = 'charging_' + asset_name
-
-            self.last_charge_state = charging
+        if charging:
+            asset_name = 'charging_' + asset_name
+        self.last_charge_state = charging
 
         if asset_name.endswith('_'):
             asset_name = 'unknown'
 
         asset = f':/battery/{asset_name}.png'
         if self._asset != asset:
-            pixmap = QPixmap(asset)
-            self.icon.setPixmap(pixmap.scaled(41, 21))
+            self._asset = asset
+            self.icon.setPixmap(PIXMAPS.tinted(asset, (41, 21), paint=False))
             self.icon.update()
@@ -0,0 +1,180 @@
+import math
+from array import array
+
+from PyQt6.QtCore import Qt, QTimer, QPointF
+from PyQt6.QtGui import QColor, QPainter, QPen, QPixmap
+from PyQt6.QtWidgets import QWidget
+
+NAN = float('nan')
+
+
+class TemperatureGraph(QWidget):
+    """
+    Live bowl temperature vs. target curve, fed from a TelemetryRing.
+
+    Samples are folded into one min/max bucket per pixel column. When the cycle runs past the right edge,
+    neighbouring columns are merged pairwise (doubling the seconds per column), so memory and paint cost only
+    depend on the widget width. Finished columns are kept on a backing pixmap; each repaint only draws the
+    columns that changed since the last one, and repaints are capped at MAX_FPS no matter how fast samples arrive.
+    """
+    MAX_FPS = 5
+    SECONDS_PER_COLUMN = 0.5
+    SCALE_STEP = 50  # celsius; the y-axis grows in these steps
+
+    def __init__(self, parent, ring, *, color=(255, 255, 255)):
+        super(TemperatureGraph, self).__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground, True)
+        self.ring = ring
+        self.color = QColor(*color)
+        self.target_color = QColor(*color)
+        self.target_color.setAlpha(110)
+
+        self._repaint_timer = QTimer(self)
+        self._repaint_timer.setSingleShot(True)
+        self._repaint_timer.setInterval(1000 // self.MAX_FPS)
+        self._repaint_timer.timeout.connect(self.update)
+
+        self._cache = None
+        self.reset()
+
+    def reset(self, start_seq: int = None):
+        """ Start a new curve from `start_seq` (defaults to the next sample appended to the ring) """
+        width = max(self.width(), 1)
+        self._seconds_per_column = self.SECONDS_PER_COLUMN
+        self._origin = None
+        self._start_seq = self._last_seq = self.ring.count if start_seq is None else start_seq
+        self._temp_min = array('d', [NAN]) * width
+        self._temp_max = array('d', [NAN]) * width
+        self._temp_first = array('d', [NAN]) * width
+        self._temp_last = array('d', [NAN]) * width
+        self._target = array('d', [NAN]) * width
+        self._columns = 0  # columns in use
+        self._y_max = self.SCALE_STEP * 2
+        self._invalidate()
+
+    def resizeEvent(self, event):
+        super(TemperatureGraph, self).resizeEvent(event)
+        # re-fold the current curve into the new number of columns
+        self.reset(self._start_seq)
+        self.sync()
+
+    def sync(self):
+        """ Pull every sample appended to the ring since the last call """
+        ring = self.ring
+        for seq, (ts, temp, target, *_) in ring.since(self._last_seq):
+            if self._origin is None:
+                self._origin = ts
+
+            col = int((ts - self._origin) / self._seconds_per_column)
+            while col >= len(self._temp_min):
+                self._compact()
+                col = int((ts - self._origin) / self._seconds_per_column)
+
+            if not math.isnan(temp):
+                if math.isnan(self._temp_min[col]):
+                    self._temp_min[col] = self._temp_max[col] = self._temp_first[col] = temp
+                else:
+                    self._temp_min[col] = min(self._temp_min[col], temp)
+                    self._temp_max[col] = max(self._temp_max[col], temp)
+                self._temp_last[col] = temp
+
+            if not math.isnan(target):
+                self._target[col] = target
+
+            peak = max(v for v in (temp, target, 0) if not math.isnan(v))
+            if peak > self._y_max:
+                self._y_max = (int(peak // self.SCALE_STEP) + 1) * self.SCALE_STEP
+                self._invalidate()
+
+            self._dirty_from = min(self._dirty_from, col)
+            self._columns = max(self._columns, col + 1)
+
+        self._last_seq = ring.count
+        if self._dirty_from < self._columns and not self._repaint_timer.isActive():
+            self._repaint_timer.start()
+
+    def _compact(self):
+        # merge neighbouring columns so the same pixels cover twice the time
+        width = len(self._temp_min)
+        for i in range(width // 2):
+            a, b = 2 * i, 2 * i + 1
+            self._temp_min[i] = self._merge(min, self._temp_min[a], self._temp_min[b])
+            self._temp_max[i] = self._merge(max, self._temp_max[a], self._temp_max[b])
+            self._temp_first[i] = self._temp_first[a] if not math.isnan(self._temp_first[a]) else self._temp_first[b]
+            self._temp_last[i] = self._temp_last[b] if not math.isnan(self._temp_last[b]) else self._temp_last[a]
+            self._target[i] = self._target[b] if not math.isnan(self._target[b]) else self._target[a]
+
+        for col in (self._temp_min, self._temp_max, self._temp_first, self._temp_last, self._target):
+            col[width // 2:] = array('d', [NAN]) * (width - width // 2)
+
+        self._columns = (self._columns + 1) // 2
+        self._seconds_per_column *= 2
+        self._invalidate()
+
+    @staticmethod
+    def _merge(fn, a, b):
+        if math.isnan(a):
+            return b
+        if math.isnan(b):
+            return a
+        return fn(a, b)
+
+    def _invalidate(self):
+        self._cache = None
+        self._dirty_from = 0
+
+    def _y(self, value: float) -> float:
+        h = self.height() - 2
+        return 1 + h - (min(value, self._y_max) / self._y_max) * h
+
+    def _previous_column(self, col):
+        for i in range(col - 1, -1, -1):
+            if not math.isnan(self._temp_last[i]):
+                return i
+        return None
+
+    def paintEvent(self, event):
+        if self._cache is None or self._cache.size() != self.size():
+            self._cache = QPixmap(self.size())
+            self._cache.fill(Qt.GlobalColor.transparent)
+            self._dirty_from = 0
+
+        start = self._dirty_from
+        if start < self._columns:
+            painter = QPainter(self._cache)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Clear)
+            painter.fillRect(start, 0, self.width() - start, self.height(), Qt.GlobalColor.transparent)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+
+            target_pen = QPen(self.target_color, 1, Qt.PenStyle.DashLine)
+            temp_pen = QPen(self.color, 2)
+            prev = self._previous_column(start)
+            prev_target = None
+            if start and not math.isnan(self._target[start - 1]):
+                prev_target = QPointF(start - 1, self._y(self._target[start - 1]))
+
+            for col in range(start, self._columns):
+                target = self._target[col]
+                if not math.isnan(target):
+                    point = QPointF(col, self._y(target))
+                    painter.setPen(target_pen)
+                    painter.drawLine(point if prev_target is None else prev_target, point)
+                    prev_target = point
+
+                if math.isnan(self._temp_min[col]):
+                    continue
+
+                painter.setPen(temp_pen)
+                if prev is not None:
+                    painter.drawLine(QPointF(prev, self._y(self._temp_last[prev])),
+                                     QPointF(col, self._y(self._temp_first[col])))
+                painter.drawLine(QPointF(col, self._y(self._temp_min[col])),
+                                 QPointF(col, self._y(self._temp_max[col])))
+                prev = col
+
+            painter.end()
+            self._dirty_from = self._columns
+
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._cache)
+        painter.end()
@@ -3,6 +3,7 @@ from PyQt6.QtWidgets import QFrame, QLabel
 
 from . import BleakError
 from .elements import Battery, DataLabel, DeviceVisualizer
+from .viewmodel import ViewModel
 
 
 class HomeScreen(QFrame):
@@ -48,13 +49,23 @@ class HomeScreen(QFrame):
         self.ui_bowl_temp.move(30, 275)
         self.ui_daily_dab_cnt.move(30, 375)
         self.ui_total_dab_cnt.move(30, 475)
-        if settings.value('Home/HideDabCounts', False, bool):
-            self.ui_daily_dab_cnt.hide()
-            self.ui_total_dab_cnt.hide()
+        self.set_dab_counts_hidden(settings.value('Home/HideDabCounts', False, bool))
+        settings.subscribe('Home/HideDabCounts', self.set_dab_counts_hidden)
+
+        self.view = ViewModel(self)
+        self.view.bind('active_profile', self.ui_active_profile.update_data)
+        self.view.bind('bowl_temp', self.ui_bowl_temp.update_data)
+        self.view.bind('daily_dabs', self.ui_daily_dab_cnt.update_data)
+        self.view.bind('total_dabs', self.ui_total_dab_cnt.update_data)
+        self.view.bind('battery', lambda state: self.ui_battery.update_battery(*state))
 
         # bring the device visualization to the front of the layout
         self.device.raise_()
 
+    def set_dab_counts_hidden(self, hidden: bool):
+        self.ui_daily_dab_cnt.setHidden(bool(hidden))
+        self.ui_total_dab_cnt.setHidden(bool(hidden))
+
     async def reset(self):
         self.setUpdatesEnabled(False)
         self.ui_active_profile.reset_properties()
@@ -62,6 +73,7 @@ class HomeScreen(QFrame):
         if not settings.value('Home/HideDabCounts', False, bool):
             self.ui_daily_dab_cnt.reset_properties()
             self.ui_total_dab_cnt.reset_properties()
+        self.view.forget()
         self.setUpdatesEnabled(True)
 
     def update_connection_status(self, text, text_color: str = None):
@@ -71,30 +83,27 @@ class HomeScreen(QFrame):
         self.ui_connect_status.adjustSize()
 
     async def fill(self, *, from_callback=False):
-        self.setUpdatesEnabled(False)
         if from_callback:
             self.update_connection_status('CONNECTED', '#4CD964')
 
         try:
             profile_name = await client.get_profile_name(self.parent().LAST_PROFILE_ID)
-            if from_callback or (profile_name != self.ui_active_profile.data):
+            if self.view.set('active_profile', profile_name) or from_callback:
                 self.device.colorize(*await client.profile_color_as_rgb())
-                self.ui_active_profile.update_data(profile_name)
 
             await self.parent().update_battery()
-            self.ui_bowl_temp.update_data(await client.get_bowl_temperature())
+            self.view.set('bowl_temp', await client.get_bowl_temperature())
             if from_callback:
                 self.ui_device_name.setText(await client.get_device_name())
                 self.ui_device_name.adjustSize()
                 if not settings.value('Home/HideDabCounts', False, bool):
-                    self.ui_daily_dab_cnt.update_data(await client.get_daily_dab_count())
-                    self.ui_total_dab_cnt.update_data(await client.get_total_dab_count())
+                    self.parent().state.update(daily_dabs=await client.get_daily_dab_count(),
+                                               total_dabs=await client.get_total_dab_count())  # shown on change
 
         except BleakError:
             # no connection..
             pass
 
+        self.view.push()
         if not self.isVisible():
             self.setVisible(True)
-
-        self.setUpdatesEnabled(True)
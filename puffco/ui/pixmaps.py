@@ -0,0 +1,161 @@
+from collections import OrderedDict
+
+from PyQt6.QtCore import QRectF, QSize, Qt
+from PyQt6.QtGui import QColor, QImage, QPainter, QPixmap
+from PyQt6.QtWidgets import QGraphicsBlurEffect, QGraphicsPixmapItem, QGraphicsScene
+
+WHITE = (255, 255, 255, 255)
+GLOW_COLOR_STEP = 4  # tinted glows are cached per 4 levels of each channel
+
+
+class PixmapCache:
+    """
+    Process-wide LRU of decoded, scaled and tinted pixmaps, bounded by an approximate byte budget.
+    Callers always receive their own QPixmap handle (Qt shares the pixel data until someone paints on it),
+    so nothing drawn on a returned pixmap can leak back into the cache.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def cost(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, key):
+        pixmap = self._entries.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return QPixmap(pixmap)
+
+    def put(self, key, pixmap: QPixmap):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= self.cost(old)
+
+        self._entries[key] = pixmap
+        self.bytes += self.cost(pixmap)
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= self.cost(evicted)
+            self.evictions += 1
+        return QPixmap(pixmap)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def source(self, path: str) -> QPixmap:
+        """ The asset at `path`, decoded once """
+        key = (path, None, None, False)
+        pixmap = self.get(key)
+        if pixmap is None:
+            pixmap = self.put(key, QPixmap(path))
+        return pixmap
+
+    def tinted(self, path: str, size=None, paint=True, color=None) -> QPixmap:
+        """ `path` scaled down to `size` (never up), optionally filled with `color` (white by default) """
+        if isinstance(size, QSize):
+            size = (size.width(), size.height())
+        elif size:
+            size = tuple(size)
+
+        if paint:
+            color = QColor(color).getRgb() if color is not None else WHITE
+        else:
+            color = None
+
+        key = (path, size or None, color, bool(paint))
+        pixmap = self.get(key)
+        if pixmap is not None:
+            return pixmap
+
+        pixmap = self.source(path)
+        if size:
+            w, h = size
+            pixmap = pixmap.scaled(min(w, pixmap.width()), min(h, pixmap.height()))
+
+        if paint:
+            painter = QPainter(pixmap)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceIn)
+            painter.fillRect(pixmap.rect(), QColor(*color))
+            painter.end()
+
+        return self.put(key, pixmap)
+
+    def inverted(self, path: str, size=None) -> QPixmap:
+        """ Grayscale negative of `path` (as returned by tinted(path, size, paint=False)), keeping its alpha """
+        if isinstance(size, QSize):
+            size = (size.width(), size.height())
+        key = ('invert', path, tuple(size) if size else None)
+        pixmap = self.get(key)
+        if pixmap is not None:
+            return pixmap
+
+        original = self.tinted(path, size, paint=False).toImage()
+        image = original.convertToFormat(QImage.Format.Format_Grayscale8)
+        image.invertPixels()
+        image = image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+        painter = QPainter(image)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_DestinationIn)
+        painter.drawImage(0, 0, original)  # take the alpha channel back from the original icon
+        painter.end()
+        return self.put(key, QPixmap.fromImage(image))
+
+    def blurred(self, path: str, size: QSize, radius: float) -> QPixmap:
+        """ `path` scaled to `size` and blurred once, the same way a QGraphicsBlurEffect would draw it """
+        key = ('blur', path, (size.width(), size.height()), radius)
+        pixmap = self.get(key)
+        if pixmap is not None:
+            return pixmap
+
+        source = self.source(path).scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                          Qt.TransformationMode.SmoothTransformation)
+        effect = QGraphicsBlurEffect()
+        effect.setBlurRadius(radius)
+        effect.setBlurHints(QGraphicsBlurEffect.BlurHint.QualityHint)
+        item = QGraphicsPixmapItem(source)
+        item.setGraphicsEffect(effect)
+        scene = QGraphicsScene()
+        scene.addItem(item)
+
+        image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(image)
+        scene.render(painter, QRectF(image.rect()), QRectF(source.rect()))
+        painter.end()
+        return self.put(key, QPixmap.fromImage(image))
+
+    def glow(self, path: str, size: QSize, color, radius: float = 5) -> QPixmap:
+        """
+        The blurred `path` mask filled with `color`.
+        Tinting after the blur gives the same result as blurring a tinted image, so the blur runs once per asset
+        and size, and every colour after that is a single fill (cached per quantized colour).
+        """
+        r, g, b, *alpha = color
+        step = GLOW_COLOR_STEP
+        rgba = tuple(min(255, round(c / step) * step) for c in (r, g, b, alpha[0] if alpha else 255))
+        key = ('glow', path, (size.width(), size.height()), radius, rgba)
+        pixmap = self.get(key)
+        if pixmap is not None:
+            return pixmap
+
+        pixmap = self.blurred(path, size, radius)
+        painter = QPainter(pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceIn)
+        painter.fillRect(pixmap.rect(), QColor(*rgba))
+        painter.end()
+        return self.put(key, pixmap)
+
+
+PIXMAPS = PixmapCache()
@@ -1,11 +1,18 @@
-from PIL import Image, ImageColor
-from PyQt6.QtCore import QSize, Qt, QTimer
-from PyQt6.QtGui import QFont, QMouseEvent, QPixmap
+import logging
+
+from PyQt6.QtCore import QPoint, QSize, Qt, QTimer
+from PyQt6.QtGui import QColor, QFont, QMouseEvent
 from PyQt6.QtWidgets import QMainWindow, QLabel, QFrame, QSlider, QLineEdit, QCheckBox
 
 from puffco.btnet import Constants, LanternAnimation
-from . import ensure_future
+from puffco.btnet.profiles import ProfileTransaction, ProfileWriteError
+from puffco.tasks import TASKS
+from .colors import color_lut
 from .elements import ImageButton
+from .pixmaps import PIXMAPS
+from .graph import TemperatureGraph
+
+log = logging.getLogger(__name__)
 
 RAINBOW_PREVIEW_CSS = "border: 1px solid white;" \
                       'background-image: url(:/icons/rainbow.png)'
@@ -19,36 +26,58 @@ class ColorSlider(QLabel):
     def __init__(self, parent):
         super(ColorSlider, self).__init__('', parent)
         self.setMouseTracking(True)
-        pixmap = QPixmap(f':/themes/{self.ASSET}')
-        self.image = Image.fromqpixmap(pixmap)
+        self.set_asset(None)
+        self._pending_pos = None
+        # mouse moves are coalesced; at most one pick per display refresh
+        self._pick_timer = QTimer(self)
+        self._pick_timer.setSingleShot(True)
+        self._pick_timer.timeout.connect(lambda: self.pick(self._pending_pos))
+
+    def set_asset(self, size):
+        asset = f':/themes/{self.ASSET}'
+        self.lut = color_lut(asset, size)
+        pixmap = PIXMAPS.tinted(asset, size, paint=False)
         self.setPixmap(pixmap)
-        self.setFixedSize(self.pixmap().size())
+        self.setFixedSize(pixmap.size())
 
     def mouseMoveEvent(self, ev: QMouseEvent) -> None:
         if not self.selecting:
             return
 
-        pos = ev.pos()
+        self._pending_pos = ev.pos()
+        if not self._pick_timer.isActive():
+            screen = self.screen()
+            refresh_rate = screen.refreshRate() if screen else 60
+            self._pick_timer.start(int(1000 / max(refresh_rate, 1)))
+
+    def pick(self, pos: QPoint) -> None:
+        self._pick_timer.stop()
+        if pos is None:
+            return
+
+        h, w = self.lut.shape[:2]
         x, y = pos.x(), pos.y()
-        if y >= self.image.height:
+        if y >= h:
             y = min(2, y)
 
-        if x >= self.image.width:
-            x = self.image.width - 1
+        if x >= w:
+            x = w - 1
 
-        pixel_color = self.image.getpixel((max(0, x), max(0, y)))
-        if not sum(pixel_color):
+        pixel_color = self.lut[max(0, y), max(0, x)]
+        if not pixel_color[:3].any():
             # there is no color here
             return
 
-        self.selected = pixel_color
-        self.parent().preview.setStyleSheet(f'background: {"rgba" if len(pixel_color) == 4 else "rgb"}{self.selected};'
+        self.selected = tuple(int(c) for c in pixel_color[:3])
+        self.parent().preview.setStyleSheet(f'background: rgb{self.selected};'
                                             f'border: 1px solid white;')
 
     def mouseReleaseEvent(self, ev: QMouseEvent) -> None:
         if ev.button() != Qt.MouseButton.LeftButton:
             return
 
+        if self._pick_timer.isActive():  # apply the last coalesced move
+            self.pick(self._pending_pos)
         self.selecting = False
 
     def mousePressEvent(self, ev: QMouseEvent) -> None:
@@ -146,6 +175,23 @@ class EditControls(QFrame):
         self.rainbow_button.move(80, 0)
         self.start_rainbow_state = False
 
+    def rebind(self, idx, temperature, duration, color, rainbow):
+        self._idx = idx
+        for control, value in ((self.temperature_control, temperature), (self.duration_control, duration)):
+            control.slider.blockSignals(True)
+            control.slider.setValue(value)
+            control.slider.blockSignals(False)
+
+        self.rainbow_button.blockSignals(True)
+        self.rainbow_button.setChecked(rainbow)
+        self.rainbow_button.blockSignals(False)
+        if rainbow:
+            self.toggle_rainbow_profile(True)
+        else:
+            self.color_control.slider.selected = None
+            self.color_control.preview.setStyleSheet(f'border: 1px solid white;'
+                                                     f'background-color: rgb{color};')
+
     def show(self) -> None:
         self.start_rainbow_state = self.rainbow_button.isChecked()
         return super(EditControls, self).show()
@@ -156,7 +202,7 @@ class EditControls(QFrame):
             self.color_control.preview.setStyleSheet(RAINBOW_PREVIEW_CSS)
         else:
             default_color = list(Constants.FACTORY_HEX_COLORS.values())[self._idx]
-            rgb_val = ImageColor.getcolor(default_color, 'RGB')
+            rgb_val = QColor(default_color).getRgb()[:3]
             self.color_control.slider.selected = self.parent()._color = rgb_val
             self.color_control.preview.setStyleSheet(f'background: rgb{rgb_val};'
                                                      f'border: 1px solid white;')
@@ -168,19 +214,16 @@ class EditControls(QFrame):
         if new_name and old_name != new_name:
             profile.name = new_name
             self.setWindowTitle(new_name)
-            await client.set_profile_name(new_name, self._idx)
 
         new_temp = self.temperature_control.value
         if new_temp and old_temp != new_temp:
             profile.temperature_f = new_temp
             # new temp is in Fahrenheit, convert to celsius
             profile.temperature = round((new_temp - 32) * 0.5556, 2)
-            await client.set_profile_temp(profile.temperature, self._idx)
 
         new_dur = self.duration_control.value
         if old_dur and new_dur != old_dur:
             profile.duration = new_dur
-            await client.set_profile_time(new_dur, self._idx)
 
         new_color = self.color_control.value
         update = new_color != old_color
@@ -198,9 +241,18 @@ class EditControls(QFrame):
                     profile.color_bytes[5] = 1  # enable LED
 
                 profile.color = new_color
-            await client.set_profile_color(profile.color_bytes, self._idx)
 
-        await home.profiles.fill(self._idx)
+        # only what differs from the device is written, in one go, then verified with one read-back
+        try:
+            await ProfileTransaction(client, profile).commit()
+        except ProfileWriteError as e:
+            log.warning('Could not save the profile: %s', e)
+            window = self.parent()
+            if window.idx == profile.idx:
+                window.rebind(profile.idx, profile.name, profile.temperature_f, profile.duration,
+                              tuple(profile.color), profile.rainbow)
+        finally:
+            await home.profiles.fill(self._idx)
 
 
 class ProfileWindow(QMainWindow):
@@ -217,8 +269,7 @@ class ProfileWindow(QMainWindow):
         self._temp = f'{_temp} °F'
         self.r_temp = _temp
         self.r_dur = raw_dur
-        m, s = divmod(raw_dur, 60)
-        self._dur = f'{str(m).zfill(2)}:{str(s).zfill(2)}'
+        self._dur = self.format_duration(raw_dur)
         self._color = _color
         self.setWindowTitle(_name)
         self.setFixedSize(self.SIZE)
@@ -291,9 +342,7 @@ class ProfileWindow(QMainWindow):
         self.controls = EditControls(self, idx, _temp, raw_dur, _color)
         self.controls.move(self.controls.x() + 32, self.controls.y() - 60)
         self.controls.hide()
-
-        if rainbow:
-            self.controls.rainbow_button.setChecked(True)
+        self.controls.rebind(idx, _temp, raw_dur, _color, rainbow)
 
         self.temp_boost = ImageButton(':/icons/boost_temp.png', self, paint=False, size=(54, 54),
                                       callback=self.send_boost)
@@ -305,12 +354,60 @@ class ProfileWindow(QMainWindow):
         self.temp_boost.hide()
         self.time_boost.hide()
 
+        self.graph = TemperatureGraph(self, parent.telemetry, color=theme.TEXT_COLOR)
+        self.graph.setGeometry(40, 95, self.width() - 80, 80)
+        self.graph.hide()
+
         self.stopwatch = QTimer(self)
         self.stopwatch.setInterval(1000)
-        self.stopwatch.timeout.connect(lambda: ensure_future(self.update_stopwatch()).done())
+        self.stopwatch.timeout.connect(lambda: TASKS.spawn(self.update_stopwatch, 'stopwatch', single_flight=True))
+
+    @staticmethod
+    def format_duration(seconds):
+        m, s = divmod(seconds, 60)
+        return f'{str(m).zfill(2)}:{str(s).zfill(2)}'
+
+    def rebind(self, idx, _name, _temp, raw_dur, _color=None, rainbow=False):
+        """ Show another profile (or fresh data for this one) in this window, back in its idle state """
+        self.idx = idx
+        self._name = _name
+        self._temp = f'{_temp} °F'
+        self.r_temp = _temp
+        self.r_dur = raw_dur
+        self._dur = self.format_duration(raw_dur)
+        self._color = _color
+        self.setWindowTitle(_name)
+        self.stopwatch.stop()
+        self.graph.hide()
+        self.time_boost.hide()
+        self.temp_boost.hide()
+        self.verified = False
+        if not self.controls.isHidden():  # left in edit mode
+            self.p_name.selectionChanged.connect(lambda: self.p_name.setSelection(0, 0))
+
+        self.p_name.setText(_name)
+        self.p_name.adjustSize()
+        self.temperature.setText(self._temp)
+        self.duration.setText(self._dur)
+        self.controls.rebind(idx, _temp, raw_dur, _color, rainbow)
+        self.reset_layout()
+
+    def reset_layout(self):
+        self.started = False
+        self.p_name.setReadOnly(True)
+        self.start_text.show()
+        self.start_button.show()
+        self.cancel_button.hide()
+        self.cancel_text.hide()
+        self.edit_button.show()
+        self.confirm_edit_button.hide()
+        self.cancel_edit_button.hide()
+        self.temperature.move(*self.TEMP_DEFAULT_XY)
+        self.duration.move(self.temperature.x() + 10, self.temperature.y() + 60)
+        self.controls.hide()
 
     def closeEvent(self, a0) -> None:
-        ensure_future(client.send_lantern_status(False)).done()
+        TASKS.spawn(client.send_lantern_status(False))
         a0.accept()
 
     async def update_stopwatch(self):
@@ -332,7 +429,14 @@ class ProfileWindow(QMainWindow):
             profile = self.parent().PROFILES[self.idx]
             val = profile.temperature
 
-        ensure_future(client.boost(val, is_time=boost_time)).done()
+        sessions = self.parent().sessions
+
+        async def boost():
+            await client.boost(val, is_time=boost_time)
+            sessions.boost('time' if boost_time else 'temp',  # once the device has it
+                           Constants.DABBING_ADDED_TIME if boost_time else Constants.DABBING_ADDED_TEMP_CELSIUS)
+
+        TASKS.spawn(boost(), 'boost')
 
     def uppercase_text(self, text):
         self.p_name.setText(str(text[:self.PROFILE_NAME_MAX_LENGTH]).upper())
@@ -340,6 +444,8 @@ class ProfileWindow(QMainWindow):
 
     def update_temp_reading(self, text):
         self.temperature.setText(text)
+        if self.graph.isVisible():
+            self.graph.sync()
 
     def start(self, *, send_command=True):
         if self.started:
@@ -354,11 +460,13 @@ class ProfileWindow(QMainWindow):
         self.temp_boost.show()
 
         self.temperature.move(200, 183)
+        self.graph.reset()
+        self.graph.show()
         self.stopwatch.start()
         self.duration.move(self.temperature.x() + 15, self.temperature.y() + 60)
         self.started = True
         if send_command:
-            ensure_future(client.preheat()).done()
+            TASKS.spawn(client.preheat())
 
     def cycle_finished(self):
         if self.stopwatch.isActive():
@@ -383,24 +491,14 @@ class ProfileWindow(QMainWindow):
             self.temperature.setText(self._temp)
             self.duration.setText(self._dur)
         else:
-            ensure_future(self.controls.write_to_device(self._name, self.r_temp, self.r_dur, self._color)).done()
+            TASKS.spawn(self.controls.write_to_device(self._name, self.r_temp, self.r_dur, self._color),
+                        'write profile')
 
         if cancel:
-            ensure_future(client.preheat(cancel=True)).done()
+            TASKS.spawn(client.preheat(cancel=True))
 
-        self.started = False
         self.p_name.selectionChanged.connect(lambda: self.p_name.setSelection(0, 0))
-        self.p_name.setReadOnly(True)
-        self.start_text.show()
-        self.start_button.show()
-        self.cancel_button.hide()
-        self.cancel_text.hide()
-        self.edit_button.show()
-        self.confirm_edit_button.hide()
-        self.cancel_edit_button.hide()
-        self.temperature.move(*self.TEMP_DEFAULT_XY)
-        self.duration.move(self.temperature.x() + 10, self.temperature.y() + 60)
-        self.controls.hide()
+        self.reset_layout()
 
     def edit_clicked(self):
         self.p_name.selectionChanged.disconnect()
@@ -411,5 +509,6 @@ class ProfileWindow(QMainWindow):
         self.confirm_edit_button.show()
         self.cancel_edit_button.show()
         self.temperature.move(190, 120)
+        self.graph.hide()
         self.controls.show()
         self.duration.move(self.temperature.x() + 10, self.temperature.y() + 60)
@@ -1,13 +1,19 @@
-from PyQt6.QtGui import QPixmap, QFont
+from PyQt6.QtGui import QFont
 from PyQt6.QtWidgets import QFrame, QLabel
 
-from . import ensure_future, LanternAnimation
+from puffco.btnet.profiles import PROFILE_FIELDS
+from puffco.tasks import TASKS
+from . import LanternAnimation
 from .elements import ProfileButton
+from .pixmaps import PIXMAPS
 from .profile_window import ProfileWindow
 
 
 class Profile:
-    def __init__(self, idx, name, temperature, time, color, color_bytes):
+    __slots__ = ('idx', 'name', 'temperature', 'temperature_f', 'duration', 'color', 'color_bytes',
+                 'boost_temp', 'boost_time', 'device')
+
+    def __init__(self, idx, name, temperature, time, color, color_bytes, boost_temp=None, boost_time=None):
         self.idx = idx
         self.name = name
         self.temperature = temperature
@@ -15,13 +21,30 @@ class Profile:
         self.duration = time
         self.color = color
         self.color_bytes = color_bytes
+        self.boost_temp = boost_temp  # None until read from the device (or set locally)
+        self.boost_time = boost_time
+        self.device = self.snapshot()  # the values last read from (or confirmed by) the device
+
+    def snapshot(self) -> dict:
+        return {field: list(getattr(self, field)) if field == 'color_bytes' else getattr(self, field)
+                for field in PROFILE_FIELDS}
+
+    def restore(self, values: dict):
+        self.name = values['name']
+        self.temperature = values['temperature']
+        self.temperature_f = round(9.0 / 5.0 * self.temperature + 32)
+        self.duration = values['duration']
+        self.color_bytes = list(values['color_bytes'])
+        self.color = self.color_bytes[:3]
+        self.boost_temp = values.get('boost_temp')
+        self.boost_time = values.get('boost_time')
 
     @property
     def rainbow(self):
         return (bytes(self.color_bytes) == LanternAnimation.DISCO_MODE) or self.color_bytes[3] == 1
 
     def __str__(self):
-        return str(self.__dict__)
+        return str({slot: getattr(self, slot) for slot in self.__slots__})
 
 
 class HeatProfiles(QFrame):
@@ -38,9 +61,13 @@ class HeatProfiles(QFrame):
         self.heading.adjustSize()
         self.heading.move(150, 5)
         self.active_profile = None
+        self.windows = {}
 
         self.setVisible(False)
         self.profile_buttons = {}
+        self.stats = {}
+        self._stats = None  # ProfileStats
+        self._stats_sessions = 0  # number of stored sessions folded into it
         self.create_profile_labels()
 
     def create_profile_labels(self):
@@ -54,20 +81,58 @@ class HeatProfiles(QFrame):
 
     def select_profile(self, profile_num):
         if self.active_profile:
-            self.active_profile.destroy(True, True)
+            self.active_profile.hide()
             self.active_profile = None
 
         profile = self.parent().PROFILES[profile_num]
-        ensure_future(client.change_profile(profile_num, current=True)).done()
-        ensure_future(client.send_lantern_color(profile.color_bytes)).done()
-        ensure_future(client.send_lantern_status(True)).done()
+        TASKS.spawn(client.change_profile(profile_num, current=True))
+        TASKS.spawn(client.send_lantern_color(profile.color_bytes))
+        TASKS.spawn(client.send_lantern_status(True))
+
+        # one window per profile, built the first time it is opened and rebound to the profile data afterwards
+        args = (profile_num, profile.name, profile.temperature_f, profile.duration, tuple(profile.color),
+                profile.rainbow)
+        window = self.windows.get(profile_num)
+        if window is None:
+            window = self.windows[profile_num] = ProfileWindow(self.parent(), *args)
+        else:
+            window.rebind(*args)
+
+        self.active_profile = window
+        window.show()
+
+    def update_stats(self):
+        store = self.parent().sessions.store
+        if self._stats is not None and self._stats_sessions == len(store):
+            return
+
+        from puffco.telemetry.analytics import ProfileStats, analyze  # numpy, only once profiles are opened
+
+        if self._stats is None or self._stats_sessions > len(store):  # (first use, or the store was truncated)
+            self._stats, self._stats_sessions = ProfileStats(), 0
+        # only the sessions stored since the last fill are decompressed and analysed
+        self._stats.add(analyze(store.query(first=self._stats_sessions)))
+        self._stats_sessions = len(store)
+        self.stats = self._stats.summary()
+
+    def stats_text(self, idx):
+        stats = self.stats.get(idx)
+        if not stats or not stats['sessions']:
+            return ''
 
-        self.active_profile = ProfileWindow(self.parent(), profile_num, profile.name, profile.temperature_f,
-                                            profile.duration, tuple(profile.color), profile.rainbow)
-        self.active_profile.show()
+        text = f'{stats["sessions"]} DABS'
+        if stats['time_to_target'] is not None:
+            text += f'  ~{round(stats["time_to_target"])}s TO TEMP'
+        if stats['overshoot'] is not None:
+            text += f'  +{round(stats["overshoot"] * 1.8)}°F PEAK'
+        return text
 
     async def fill(self, idx=None):
-        self.setUpdatesEnabled(False)
+        # re-enabling updates repaints the whole frame, so a single card edit skips the bracket
+        batch = idx is None
+        if batch:
+            self.setUpdatesEnabled(False)
+        self.update_stats()
 
         for profile in self.parent().PROFILES:
             if idx is not None and profile.idx != idx:
@@ -77,17 +142,20 @@ class HeatProfiles(QFrame):
             label.set_profile_name(profile.name)
             label.set_temperature(f'{profile.temperature_f} °F')
             label.set_duration(f'{profile.duration // 60}:{str(profile.duration % 60).zfill(2)}')
+            label.set_stats(self.stats_text(profile.idx))
             if profile.rainbow:
-                label.pix_asset = theme.RAINBOW_PROFILE
-                label.color = None
-                label._pixmap = QPixmap(label.pix_asset)
+                if label.pix_asset != theme.RAINBOW_PROFILE:
+                    label.pix_asset = theme.RAINBOW_PROFILE
+                    label.color = None
+                    label._pixmap = PIXMAPS.source(label.pix_asset)
                 label.set_pixmap_color((0, 0, 0))
             else:
                 if label.pix_asset != theme.HOME_DATA:
                     label.pix_asset = theme.HOME_DATA
-                    label._pixmap = QPixmap(label.pix_asset)
+                    label._pixmap = PIXMAPS.source(label.pix_asset)
                     label.update()
 
                 label.set_pixmap_color(profile.color)
             label.raise_()
-        self.setUpdatesEnabled(True)
+        if batch:
+            self.setUpdatesEnabled(True)
@@ -0,0 +1,57 @@
+_UNSET = object()
+
+
+class ViewModel:
+    """
+    Last value shown for each field of a screen, and the widget setters bound to those fields.
+    Refreshes `set` every value they read; only fields whose value actually changed are queued,
+    and `push` hands the queued fields to their setters in one pass with repaints suspended on `root`.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._bindings = {}
+        self._values = {}
+        self._pending = {}
+        self.pushes = self.changes = self.unchanged = 0
+
+    def bind(self, field, setter):
+        self._bindings.setdefault(field, []).append(setter)
+
+    def get(self, field, default=None):
+        value = self._pending.get(field, self._values.get(field, _UNSET))
+        return default if value is _UNSET else value
+
+    def set(self, field, value) -> bool:
+        """ Queue `value` for `field`, returns False (and queues nothing) if it is already shown """
+        if self._pending.get(field, self._values.get(field, _UNSET)) == value:
+            self.unchanged += 1
+            return False
+
+        self._pending[field] = value
+        self.changes += 1
+        return True
+
+    def update(self, **fields):
+        for field, value in fields.items():
+            self.set(field, value)
+
+    def forget(self, *fields):
+        """ The widgets were reset behind our back; push these fields (all by default) again next time """
+        for field in fields or list(self._values):
+            self._values.pop(field, None)
+
+    def push(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        self.pushes += 1
+        self.root.setUpdatesEnabled(False)
+        try:
+            for field, value in pending.items():
+                self._values[field] = value
+                for setter in self._bindings.get(field, ()):
+                    setter(value)
+        finally:
+            self.root.setUpdatesEnabled(True)
@@ -0,0 +1,884 @@
+"""
+UI and client micro-benchmarks
+------------------------------
+
+Run from the repository root (after compiling the Qt resources):
+    python tools/benchmarks.py            # everything
+    python tools/benchmarks.py colorize   # just the named benchmarks
+
+Widgets are rendered offscreen unless QT_QPA_PLATFORM says otherwise.
+"""
+
+import asyncio
+import builtins
+import os
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtWidgets import QApplication
+
+BENCHMARKS = {}
+app = None
+PROFILE_COLORS = [(0, 0, 255), (110, 233, 22), (248, 11, 0), (255, 255, 255)]
+
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f'  {name:<32} mean {statistics.fmean(samples) * 1000:8.3f} ms   '
+          f'p95 {p95 * 1000:8.3f} ms   (n={len(samples)})')
+
+
+def measure(fn, n=200):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class FakeClient:
+    """
+    Stands in for PuffcoBleakClient: every command is an instant no-op.
+    Reads return `returns[name]` when given, `value` otherwise.
+    """
+    is_connected = True
+
+    def __init__(self, value=0, **returns):
+        self.value = value
+        self.returns = returns
+        self.calls = 0
+
+    def __getattr__(self, name):
+        async def command(*args, **kwargs):
+            self.calls += 1
+            return self.returns.get(name, self.value)
+        return command
+
+
+def setup_app():
+    global app
+    app = QApplication.instance() or QApplication([])
+    if not hasattr(builtins, 'settings'):
+        from puffco.settings import Settings
+        from puffco.ui.themes import THEMES
+
+        builtins.settings = Settings(os.path.join(tempfile.mkdtemp(), 'settings.ini'))
+        builtins.theme = THEMES['basic']
+    if not hasattr(builtins, 'client'):
+        builtins.client = FakeClient()
+    asyncio.set_event_loop(asyncio.get_event_loop_policy().new_event_loop())
+    return app
+
+
+def drain():
+    """ Run every coroutine the UI fired off with ensure_future """
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncio.sleep(0))
+    app.processEvents()
+
+
+@benchmark
+def colorize():
+    """ profile switch -> device glow recolored and repainted """
+    setup_app()
+    from PyQt6.QtGui import QColor, QPainter, QPixmap
+    from PyQt6.QtWidgets import QGraphicsBlurEffect, QFrame
+    from puffco.ui.elements import DeviceVisualizer
+
+    host = QFrame()
+    host.resize(480, 720)
+    device = DeviceVisualizer(host)
+    host.show()
+
+    def legacy(r, g, b, alpha=255):  # the colorize implementation before the glow cache
+        pixmap = QPixmap(theme.LIGHTING)
+        painter = QPainter(pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceIn)
+        painter.fillRect(pixmap.rect(), QColor(r, g, b, alpha))
+        painter.end()
+        device.led.setPixmap(pixmap)
+        blur = QGraphicsBlurEffect()
+        blur.setBlurRadius(5)
+        blur.setBlurHints(QGraphicsBlurEffect.BlurHint.QualityHint)
+        device.led.setGraphicsEffect(blur)
+        device.led.raise_()
+        device.led.update()
+
+    def switch(fn):
+        def run(i):
+            fn(*PROFILE_COLORS[i % len(PROFILE_COLORS)])
+            device.repaint()
+        return run
+
+    report('legacy colorize + repaint', measure(switch(legacy)))
+    device.led.setGraphicsEffect(None)
+    report('cached glow colorize + repaint', measure(switch(device.colorize)))
+    host.close()
+
+
+@benchmark
+def profile_open():
+    """ tapping a profile card -> profile window shown """
+    setup_app()
+    from puffco.ui import PuffcoMain
+    from puffco.ui.profile_window import ProfileWindow
+    from puffco.ui.profiles import Profile
+
+    def make_main():
+        main = PuffcoMain()
+        main.PROFILES = [Profile(i, f'PROFILE {i}', 232 + i * 10, 30 + i * 15, color, list(color) + [0, 0, 1, 0, 0])
+                         for i, color in enumerate(PROFILE_COLORS)]
+        return main
+
+    def legacy_select(main):  # select_profile before the window pool
+        profiles = main.profiles
+
+        def select(profile_num):
+            if profiles.active_profile:
+                profiles.active_profile.destroy(True, True)
+            profile = main.PROFILES[profile_num]
+            profiles.active_profile = ProfileWindow(main, profile_num, profile.name, profile.temperature_f,
+                                                    profile.duration, tuple(profile.color), profile.rainbow)
+            profiles.active_profile.show()
+        return select
+
+    for name, select_fn in (('destroy + recreate', legacy_select), ('pooled rebind', lambda m: m.profiles.select_profile)):
+        main = make_main()
+        select, baseline, peak = select_fn(main), len(app.allWidgets()), 0
+
+        def run(i):
+            nonlocal peak
+            select(i % len(main.PROFILES))
+            drain()  # the device writes select_profile starts
+            peak = max(peak, len(app.allWidgets()))
+
+        report(name, measure(run, n=100))
+        print(f'  {"":<32} peak widgets {peak - baseline}')
+        drain()
+        main.deleteLater()
+        drain()
+
+
+@benchmark
+def poll_tick():
+    """ home screen refresh with unchanged device state -> layout and paint events """
+    setup_app()
+    from PyQt6.QtCore import QEvent, QObject
+    from puffco.ui import PuffcoMain
+
+    class EventCounter(QObject):
+        counts = {QEvent.Type.LayoutRequest: 0, QEvent.Type.Paint: 0}
+
+        def eventFilter(self, obj, event):
+            if event.type() in self.counts:
+                self.counts[event.type()] += 1
+            return False
+
+    builtins.client = FakeClient(get_profile_name='PROFILE 1', profile_color_as_rgb=(0, 0, 255),
+                                 get_battery_percentage=80, is_currently_charging=(False, False),
+                                 get_bowl_temperature='452 °F', get_device_name='PEAK PRO',
+                                 get_daily_dab_count='4.2', get_total_dab_count='1337')
+    main = PuffcoMain()
+    main._client = client
+    counter = EventCounter()
+    app.installEventFilter(counter)
+    loop = asyncio.get_event_loop()
+
+    def tick(_):
+        loop.run_until_complete(main.home.fill())
+        app.processEvents()
+
+    for name, n in (('first fill', 1), ('idle ticks', 100)):
+        for event_type in counter.counts:
+            counter.counts[event_type] = 0
+        report(name, measure(tick, n=n))
+        layouts, paints = counter.counts.values()
+        print(f'  {"":<32} per tick: {layouts / n:.2f} layout requests, {paints / n:.2f} paints')
+
+    view = main.home.view
+    print(f'  {"":<32} view model: {view.changes} changes, {view.unchanged} unchanged, {view.pushes} pushes')
+    app.removeEventFilter(counter)
+    main.hide()
+
+
+@benchmark
+def event_loop():
+    """ idle CPU use and wake-up latency, busy processEvents loop vs qasync """
+    # in a fresh interpreter: the loops and QApplication earlier benchmarks left behind would skew (or stop) it
+    sys.stdout.flush()
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--event-loop-probe'], check=True)
+
+
+def event_loop_probe():
+    setup_app()
+    import threading
+    from PyQt6.QtCore import QTimer
+    from qasync import QEventLoop
+
+    def legacy_loop():  # puffco.py's process() loop before qasync
+        loop = asyncio.new_event_loop()
+
+        async def process():
+            while True:
+                app.processEvents()
+                await asyncio.sleep(0)
+        loop.create_task(process())
+        return loop
+
+    def probe(loop, idle=2.0, n=50):
+        """ CPU used while idle for `idle` seconds, then `n` wake-ups from each source """
+        async def run():
+            cpu = time.process_time()
+            await asyncio.sleep(idle)
+            cpu = (time.process_time() - cpu) / idle
+            latencies = {'QTimer 5 ms': [], 'asyncio.sleep 5 ms': [], 'call_soon_threadsafe': []}
+            for _ in range(n):
+                fired = loop.create_future()
+                start = time.perf_counter()
+                QTimer.singleShot(5, lambda: fired.done() or fired.set_result(time.perf_counter()))
+                latencies['QTimer 5 ms'].append(await fired - start - 0.005)
+
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                latencies['asyncio.sleep 5 ms'].append(time.perf_counter() - start - 0.005)
+
+                # a BLE notification arriving from the backend's thread
+                notified = loop.create_future()
+                threading.Thread(target=lambda: (time.sleep(0.005), loop.call_soon_threadsafe(
+                    notified.set_result, time.perf_counter()))).start()
+                sent = await notified
+                latencies['call_soon_threadsafe'].append(time.perf_counter() - sent)
+            return cpu, latencies
+
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    for name, loop in (('processEvents busy loop', legacy_loop()), ('qasync', QEventLoop(app))):
+        cpu, latencies = probe(loop)
+        print(f'  {name}: {cpu * 100:.1f}% CPU while idle')
+        for source, samples in latencies.items():
+            report(f'  {source} latency', samples)
+
+
+COLD_START = """
+from puffco import trace
+import builtins, json, os, sys, tempfile
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+from puffco.settings import Settings
+from puffco.ui.themes import THEMES
+from puffco.ui import PuffcoMain
+trace.mark('imports')
+app = QApplication([])
+trace.mark('application')
+builtins.settings = Settings(os.path.join(tempfile.mkdtemp(), 'settings.ini'))
+builtins.theme = THEMES['basic']
+window = PuffcoMain()
+def done():
+    if trace.elapsed('first paint') is None and trace.elapsed('window shown') + 2 > trace.time.perf_counter() - trace.START:
+        return
+    sys.__stdout__.write(json.dumps(trace.MARKS))
+    sys.__stdout__.flush()
+    os._exit(0)
+poll = QTimer()
+poll.timeout.connect(done)
+poll.start(5)
+app.exec()
+"""
+
+
+@benchmark
+def cold_start():
+    """ fresh interpreter -> imports done, window shown, first paint """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    runs = []
+    for _ in range(10):
+        out = subprocess.run([sys.executable, '-c', COLD_START], capture_output=True, text=True, env=env,
+                             cwd=tempfile.mkdtemp(), check=True).stdout
+        runs.append(dict(json.loads(out[out.index('[['):])))
+
+    for name in runs[0]:
+        report(name, [run[name] for run in runs if name in run])
+
+
+@benchmark
+def trace_overhead():
+    """ cost of the tracing hooks on a poll coroutine, tracing off vs on """
+    from puffco import trace
+
+    async def poll():
+        with trace.span('step'):
+            pass
+
+    traced_poll = trace.traced('poll')(poll)
+    loop = asyncio.new_event_loop()
+
+    def run(fn):
+        async def many():
+            for _ in range(1000):
+                await fn()
+        return lambda _: loop.run_until_complete(many())
+
+    report('plain x1000 (tracing off)', measure(run(poll), n=50))
+    report('traced x1000 (tracing off)', measure(run(traced_poll), n=50))
+    trace.start()
+    report('traced x1000 (tracing on)', measure(run(traced_poll), n=50))
+    trace.TRACE = None
+    loop.close()
+
+
+@benchmark
+def ble_metrics():
+    """ recording a BLE round-trip latency, and building the diagnostics table """
+    from puffco.telemetry.metrics import OperationMetrics
+
+    metrics = OperationMetrics()
+    keys = [('READ_SHORT', f'/p/app/path{i}') for i in range(12)]
+
+    def record(i):
+        for j in range(1000):
+            metrics.record(keys[j % len(keys)], (i * 1000 + j) % 5000 * 1e-5)
+
+    report('record x1000', measure(record, n=50))
+    report('rows (12 operations)', measure(lambda _: metrics.rows(), n=50))
+
+
+@benchmark
+def metrics_scrape():
+    """ /metrics: rendering the exposition, and a full localhost scrape """
+    setup_app()
+    from puffco.httpd import serve_metrics
+    from puffco.telemetry.metrics import BLE_METRICS
+    from puffco.ui import PuffcoMain
+
+    window = PuffcoMain()
+    window.hide()
+    for i in range(300):
+        window.telemetry.append(200 + i % 50, 230, 8, i, 80)
+        for j in range(12):
+            BLE_METRICS.record(('READ_SHORT', f'/p/app/path{j}'), (i % 40 + j) * 1e-3)
+    window.home.view.update(total_dabs='1234', daily_dabs='3.4', battery=(80, False, None))
+
+    loop = asyncio.get_event_loop()
+    server = loop.run_until_complete(serve_metrics(window, 0))
+    exporter_route = server.routes[('GET', '/metrics')]
+
+    async def scrape():
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+        return response
+
+    report('render', measure(lambda _: exporter_route(None), n=100))
+    report('scrape over localhost', measure(lambda _: loop.run_until_complete(scrape()), n=100))
+    body = loop.run_until_complete(scrape()).split(b'\r\n\r\n', 1)[1]
+    print(f'  {len(body)} bytes, {len(body.splitlines())} lines')
+    loop.run_until_complete(server.stop())
+    BLE_METRICS.reset()
+
+
+@benchmark
+def gateway_fanout():
+    """ one temperature delta fanned out to 1 / 10 / 50 WebSocket subscribers (device reads stay at one) """
+    import base64
+    from puffco.gateway import Gateway
+    from puffco.telemetry.feed import StateFeed
+
+    class Window:
+        feed = StateFeed()
+        _client = FakeClient()
+
+    loop = asyncio.get_event_loop()
+    gateway = Gateway(Window(), 0)
+    port = loop.run_until_complete(gateway.start())
+
+    async def subscribe():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(f'GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'.encode())
+        await reader.readuntil(b'\r\n\r\n')
+        await read_message(reader)  # the snapshot
+        return reader, writer
+
+    async def read_message(reader):
+        _head, n = await reader.readexactly(2)
+        return await reader.readexactly(n)
+
+    async def deliver(readers):
+        Window.feed.update(heater_temp=200.0 + Window.feed.version % 100)  # a new value every time
+        for reader in readers:
+            await read_message(reader)
+
+    connections = []
+    for count in (1, 10, 50):
+        while len(connections) < count:
+            connections.append(loop.run_until_complete(subscribe()))
+        readers = [reader for reader, _writer in connections]
+        report(f'{count} subscribers', measure(lambda _: loop.run_until_complete(deliver(readers)), n=100))
+    print(f'  device calls: {Window._client.calls}')
+
+    for _reader, writer in connections:
+        writer.close()
+    loop.run_until_complete(gateway.stop())
+
+
+@benchmark
+def slow_link():
+    """ 2 s poll timer against a link where each poll takes 5 s (time scaled 100x): fire-and-forget vs single-flight """
+    from puffco.tasks import TaskSupervisor
+
+    tick, poll_time, ticks = 0.02, 0.05, 50
+
+    async def run(start):
+        state = {'running': 0, 'peak': 0, 'polls': 0}
+
+        async def update_loop():
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+            state['polls'] += 1
+            await asyncio.sleep(poll_time)
+            state['running'] -= 1
+
+        for _ in range(ticks):
+            start(update_loop)
+            await asyncio.sleep(tick)
+        await asyncio.sleep(poll_time)
+        return state
+
+    loop = asyncio.new_event_loop()
+    supervisor = TaskSupervisor()
+    for label, start in (('ensure_future(...).done()', lambda fn: asyncio.ensure_future(fn()).done()),
+                         ('TASKS.spawn(single_flight)', lambda fn: supervisor.spawn(fn, 'update_loop',
+                                                                                   single_flight=True))):
+        state = loop.run_until_complete(run(start))
+        print(f'  {label:<32} polls {state["polls"]:3}   peak concurrent {state["peak"]}')
+    loop.close()
+
+
+@benchmark
+def read_dedup():
+    """ update_loop, update_temp and HomeScreen.fill reading at the same instant over a 5 ms link """
+    from unittest import mock
+    from bleak import BleakClient
+    from puffco.btnet import Characteristics
+    from puffco.btnet.client import PuffcoBleakClient
+    from puffco.telemetry.metrics import BLE_METRICS
+
+    link = {'reads': 0}
+
+    async def read_over_link(self, char, **kwargs):
+        link['reads'] += 1
+        await asyncio.sleep(0.005)
+        return bytearray(b'\x00\x00\x48\x43')  # 200.0
+
+    async def poll(client):
+        # the characteristics each of the three pollers asks for in one tick
+        await asyncio.gather(
+            client.get_operating_state(), client.get_profile(),  # update_loop
+            client.get_heater_temp(), client.get_profile(),  # update_temp
+            client.get_heater_temp(), client.get_profile(), client.get_battery_percentage())  # HomeScreen.fill
+
+    loop = asyncio.new_event_loop()
+    with mock.patch.object(BleakClient, 'read_gatt_char', read_over_link):
+        client = PuffcoBleakClient('00:00:00:00:00:00')
+        report('7 concurrent requests', measure(lambda _: loop.run_until_complete(poll(client)), n=50))
+        loop.run_until_complete(client.get_battery_charge_eta(is_charging=True))
+    loop.close()
+    shared = sum(BLE_METRICS.deduplicated.values())
+    print(f'  {link["reads"]} link reads for {link["reads"] + shared} requests ({shared} shared)')
+    BLE_METRICS.reset()
+
+
+@benchmark
+def profile_save():
+    """
+    saving an edited profile (all four fields) over a 5 ms link whose requests overlap (as lorax commands do):
+    one await per field vs ProfileTransaction
+    """
+    from unittest import mock
+    from bleak import BleakClient
+    from puffco.btnet import Characteristics
+    from puffco.btnet.client import PuffcoBleakClient
+    from puffco.btnet.profiles import PROFILE_FIELDS, ProfileTransaction, ProfileWriteError
+    from puffco.ui.profiles import Profile
+
+    memory = {}
+    link = {'ops': 0, 'ignore': None}
+
+    async def write(self, char, data, response=None):
+        link['ops'] += 1
+        await asyncio.sleep(0.005)
+        if char != link['ignore']:
+            memory[char] = bytearray(data)
+
+    async def read(self, char, **kwargs):
+        link['ops'] += 1
+        await asyncio.sleep(0.005)
+        return memory[char]
+
+    loop = asyncio.new_event_loop()
+    with mock.patch.object(BleakClient, 'write_gatt_char', write), \
+            mock.patch.object(BleakClient, 'read_gatt_char', read):
+        client = PuffcoBleakClient('00:00:00:00:00:00')
+        profile = Profile(0, 'EVERGREEN', 232, 30, [0, 0, 255], [0, 0, 255, 0, 1, 0, 0, 0])
+
+        async def sequential(i):  # write_to_device before the transaction API
+            await client.set_profile_name(f'PROFILE {i}', 0)
+            await client.set_profile_temp(240 + i % 10, 0)
+            await client.set_profile_time(30 + i % 10, 0)
+            await client.set_profile_color([i % 255, 0, 255, 0, 1, 0, 0, 0], 0)
+
+        def edit(i):
+            profile.name, profile.temperature, profile.duration = f'PROFILE {i}', 240 + i % 10, 30 + i % 10
+            profile.color_bytes = [i % 255, 0, 255, 0, 1, 0, 0, 0]
+
+        async def three_steps(i):  # the transaction's link traffic before it was pipelined: select, writes, reads
+            edit(i)
+            changes = ProfileTransaction(client, profile).diff()
+            await client.change_profile(0)
+            await asyncio.gather(*(getattr(client, PROFILE_FIELDS[field][0])(value, 0)
+                                   for field, value in changes.items()))
+            await asyncio.gather(*(getattr(client, PROFILE_FIELDS[field][1])(0) for field in changes))
+            profile.device.update(changes)
+
+        async def transaction(i):
+            edit(i)
+            await ProfileTransaction(client, profile).commit()
+
+        for label, save in (('sequential, unverified', sequential), ('transaction, 3 steps (before)', three_steps),
+                            ('transaction, pipelined', transaction)):
+            link['ops'] = 0
+            report(label, measure(lambda i: loop.run_until_complete(save(i + 1)), n=20))
+            print(f'  {"":<32} {link["ops"] / 20:.0f} link operations per save')
+
+        link['ignore'] = Characteristics.PROFILE_PREHEAT_TEMP  # a device that does not take the temperature
+        try:
+            loop.run_until_complete(transaction(99))
+        except ProfileWriteError as e:
+            print(f'  rejected write: {e}; local temperature rolled back to {profile.temperature}')
+    loop.close()
+
+
+@benchmark
+def device_state():
+    """ DeviceState: a poll tick's writes, and snapshots taken by readers between changes """
+    from puffco.btnet.state import DeviceState
+
+    state = DeviceState()
+    state.listen(lambda delta: None)
+
+    def tick(i):
+        state.update(operating_state=5, heater_temp=200.0 + i % 3, target_temp=float('nan'), elapsed=float(i % 3),
+                     battery=80, charging=False, bulk_charging=False)
+
+    report('poll tick (7 fields)', measure(tick, n=10000))
+    report('snapshot, unchanged', measure(lambda _: state.snapshot(), n=10000))
+    report('snapshot after a change', measure(lambda i: (tick(i), state.snapshot()), n=10000))
+    print(f'  {"":<32} version {state.version}, {sys.getsizeof(state)} bytes per state object')
+
+
+@benchmark
+def opstate_hooks():
+    """ one heat cycle (with a battery-display blip mid-cycle) polled every 2 s: heat-cycle work per cycle """
+    from collections import Counter
+    from puffco.btnet import OperatingState as S
+    from puffco.btnet.opstate import OperatingStateMachine
+    from puffco.btnet.state import DeviceState
+    from puffco.ui import DEBOUNCED_STATES, HEAT_CYCLE_STATES, SETTLED_STATES
+
+    polls = [S.IDLE] * 3 + [S.HEAT_CYCLE_PREHEAT] * 10 + [S.HEAT_CYCLE_ACTIVE] * 10 + [S.BATTERY_DISPLAY] + \
+            [S.HEAT_CYCLE_ACTIVE] * 10 + [S.HEAT_CYCLE_FADE] * 5 + [S.IDLE] * 3
+
+    def legacy():  # update_loop's comparisons against LAST_OPERATING_STATE
+        work, last = Counter(), None
+        for operating_state in polls:
+            if last != operating_state:
+                if last:
+                    if last in HEAT_CYCLE_STATES:
+                        work['battery refresh'] += 1
+                        work['dab count refresh'] += 1
+                        if operating_state not in HEAT_CYCLE_STATES:
+                            work['cycle finished'] += 1
+                    if operating_state in HEAT_CYCLE_STATES and last not in HEAT_CYCLE_STATES:
+                        work['session started'] += 1
+                if operating_state not in HEAT_CYCLE_STATES and operating_state != S.HEAT_CYCLE_FADE:
+                    work['session stored'] += 1 if work['session started'] > work['session stored'] else 0
+                last = operating_state
+            if operating_state == S.HEAT_CYCLE_FADE:
+                work['battery refresh'] += 1
+        return work
+
+    def machine():
+        work = Counter()
+        operating = OperatingStateMachine(DeviceState(), DEBOUNCED_STATES)
+        operating.on_exit(HEAT_CYCLE_STATES, lambda _t: work.update(('battery refresh', 'dab count refresh',
+                                                                     'cycle finished')))
+        operating.on_enter(HEAT_CYCLE_STATES, lambda _t: work.update(('session started',)))
+        operating.on_enter(SETTLED_STATES, lambda _t: work.update(('session stored',)))
+        for i, operating_state in enumerate(polls):
+            loop.run_until_complete(operating.observe(operating_state, now=i * 2.0))
+        return work, operating
+
+    loop = asyncio.new_event_loop()
+
+    before, (after, operating) = legacy(), machine()
+    for name in ('battery refresh', 'dab count refresh', 'cycle finished', 'session started', 'session stored'):
+        print(f'  {name:<32} before {before[name]:3}   after {after[name]:3}')
+    print(f'  {"":<32} {len(operating.history)} transitions, {operating.debounced} debounced: ' +
+          ', '.join(f'{t.target.name} after {t.duration:.0f}s' for t in operating.history if t.duration is not None))
+    report('observe, unchanged state', measure(lambda _: loop.run_until_complete(operating.observe(S.IDLE)), n=1000))
+    loop.close()
+
+
+@benchmark
+def boost_tap():
+    """ boost button -> override written, over a 30 ms link, mid heat cycle """
+    import struct
+    from unittest import mock
+    from bleak import BleakClient
+    from puffco.btnet import Characteristics, Constants, OperatingState
+    from puffco.btnet.client import PuffcoBleakClient
+
+    link = {'reads': 0, 'writes': 0}
+    device = {Characteristics.HEATER_TARGET_TEMP: 232.0, Characteristics.STATE_TOTAL_TIME: 45.0}
+
+    async def read(self, char, **kwargs):
+        link['reads'] += 1
+        await asyncio.sleep(0.030)
+        return bytearray(struct.pack('f', device[char]))
+
+    async def write(self, char, data, response=None):
+        link['writes'] += 1
+        await asyncio.sleep(0.030)
+
+    async def legacy(client, is_time):  # boost before it used the polled values
+        if is_time:
+            await client.get_state_ttime()
+        else:
+            await client.get_target_temp()
+        await client.write_gatt_char(Characteristics.TIME_OVERRIDE if is_time else Characteristics.TEMPERATURE_OVERRIDE,
+                                     struct.pack('f', 0))
+
+    loop = asyncio.new_event_loop()
+    with mock.patch.object(BleakClient, 'read_gatt_char', read), \
+            mock.patch.object(BleakClient, 'write_gatt_char', write):
+        client = PuffcoBleakClient('00:00:00:00:00:00')
+        state = client.state
+
+        def polled():  # what the state machine and update_temp leave behind mid-cycle
+            state.update(operating_state=OperatingState.HEAT_CYCLE_PREHEAT)
+            state.update(operating_state=OperatingState.HEAT_CYCLE_ACTIVE)
+            state.update(target_temp=device[Characteristics.HEATER_TARGET_TEMP],
+                         total_time=device[Characteristics.STATE_TOTAL_TIME])
+
+        def stale():  # the values were read before the cycle moved on
+            polled()
+            state.update(operating_state=OperatingState.HEAT_CYCLE_PREHEAT)
+
+        def tap(i):  # alternating temperature and time boosts
+            return client.boost(45 if i % 2 else 232, is_time=bool(i % 2))
+
+        for label, run, setup in (('read + write (before)', lambda i: legacy(client, bool(i % 2)), polled),
+                                  ('polled values, one write', tap, polled),
+                                  ('stale values, read + write', tap, stale)):
+            link['reads'] = link['writes'] = 0
+            samples = []
+            for i in range(40):
+                setup()
+                start = time.perf_counter()
+                loop.run_until_complete(run(i))
+                samples.append(time.perf_counter() - start)
+            report(label, samples)
+            print(f'  {"":<32} {(link["reads"] + link["writes"]) / 40:.1f} round trips per tap '
+                  f'({link["reads"]} reads, {link["writes"]} writes)')
+
+        polled()
+        async def two_taps():  # spawned side by side, as the profile window does
+            await asyncio.gather(client.boost(232), client.boost(232))
+
+        loop.run_until_complete(two_taps())
+        print(f'  {"":<32} two quick temperature taps: target {device[Characteristics.HEATER_TARGET_TEMP]:.0f} -> '
+              f'{state.target_temp:.0f} (+{Constants.DABBING_ADDED_TEMP_CELSIUS} each)')
+    loop.close()
+
+
+@benchmark
+def profile_library():
+    """ loading a set of four library profiles on lorax firmware (8 ms per command on the link, 30 ms replies) """
+    from unittest import mock
+    from puffco.btnet.client import PuffcoBleakClient
+    from puffco.btnet.profiles import commit_profiles
+    from puffco.library import ProfileLibrary
+    from puffco.ui.profiles import Profile
+
+    memory = {}
+    link = {'ops': 0, 'lock': None}
+
+    async def send(path):
+        async with link['lock']:  # commands go out one after another
+            link['ops'] += 1
+            await asyncio.sleep(0.008)
+
+    async def write_short(self, path, data):
+        await send(path)
+        memory[path] = bytearray(data)
+
+    async def read_short(self, path):
+        await send(path)
+        await asyncio.sleep(0.030)  # replies overlap
+        return memory[path]
+
+    def device_profiles():
+        return [Profile(i, f'PROFILE {i + 1}', 200 + i * 10, 30, list(color), [*color, 0, 1, 0, 0, 0], 10, 15)
+                for i, color in enumerate(PROFILE_COLORS)]
+
+    library = ProfileLibrary(os.path.join(tempfile.mkdtemp(), 'profiles.db'))
+    for i in range(200):
+        library.save({'name': f'SAVED {i}', 'temperature': 180 + i % 60, 'duration': 20 + i % 40,
+                      'color_bytes': [i % 256, 0, 255, 0, 1, 0, 0, 0], 'boost_temp': 5 + i % 10, 'boost_time': 10 + i % 5})
+    library.save_set('FULL', ['SAVED 1', 'SAVED 2', 'SAVED 3', 'SAVED 4'])
+    for i, color in enumerate(PROFILE_COLORS):  # the device's own profiles, with new temperatures
+        library.save({'name': f'PROFILE {i + 1}', 'temperature': 210 + i * 10, 'duration': 30,
+                      'color_bytes': [*color, 0, 1, 0, 0, 0], 'boost_temp': 10, 'boost_time': 15})
+    library.save_set('TWEAKED', [f'PROFILE {i + 1}' for i in range(4)])
+
+    loop = asyncio.new_event_loop()
+    link['lock'] = asyncio.Lock()
+    with mock.patch.object(PuffcoBleakClient, 'write_short', write_short), \
+            mock.patch.object(PuffcoBleakClient, 'write', write_short), \
+            mock.patch.object(PuffcoBleakClient, 'read_short', read_short):
+        client = PuffcoBleakClient('00:00:00:00:00:00')
+        client.USE_LORAX_PROTOCOL = True
+
+        async def reset():  # the device holds exactly PROFILE 1-4
+            profiles = device_profiles()
+            for profile in profiles:
+                profile.device = {}
+            await commit_profiles(client, profiles)
+            return profiles
+
+        async def sequential(profiles, set_name):  # every field, one write and read-back at a time
+            for profile, name in zip(profiles, library.get_set(set_name)):
+                entry = library.get(name)
+                for setter, getter, value in (
+                        (client.set_profile_name, client.get_profile_name, name),
+                        (client.set_profile_temp, client.get_profile_temp, entry['temperature']),
+                        (client.set_profile_time, client.get_profile_time, entry['duration']),
+                        (client.set_profile_color, client.get_profile_color, entry['color_bytes']),
+                        (client.set_boost_temp, client.get_boost_temp, entry['boost_temp']),
+                        (client.set_boost_time, client.get_boost_time, entry['boost_time'])):
+                    await setter(value, profile.idx)
+                    await getter(profile.idx)
+
+        async def run(swap, set_name):
+            profiles = await reset()
+            link['ops'] = 0
+            start = time.perf_counter()
+            await swap(profiles, set_name)
+            return time.perf_counter() - start, link['ops']
+
+        for label, swap, set_name in (
+                ('sequential, every field', sequential, 'FULL'),
+                ('diff sync, every field differs', lambda profiles, name: library.load_set(client, profiles, name), 'FULL'),
+                ('diff sync, temperatures differ', lambda profiles, name: library.load_set(client, profiles, name),
+                 'TWEAKED')):
+            runs = [loop.run_until_complete(run(swap, set_name)) for _ in range(5)]
+            report(label, [seconds for seconds, _ops in runs])
+            print(f'  {"":<32} {runs[0][1]} link operations per swap')
+    loop.close()
+    library.close()
+
+
+@benchmark
+def ring_reads():
+    """ telemetry ring readers over a full 4096-sample ring: window() stats and decimate() to 200 buckets """
+    from puffco.telemetry import TelemetryRing
+
+    ring = TelemetryRing(4096)
+    for i in range(5000):  # wrapped around once
+        ring.append(float('nan') if i % 50 == 0 else 200 + i % 37, 232.0, 8, i / 2, 80, timestamp=float(i))
+    ring.window(1)  # (imports numpy)
+    report('window, every sample', measure(lambda _: ring.window(1e9, now=5000.0), n=200))
+    report('decimate to 200 buckets', measure(lambda _: ring.decimate(200), n=200))
+
+
+@benchmark
+def session_stats():
+    """ heat profile stats: analysing 5000 stored two-minute sessions, and folding in one new session """
+    from array import array
+    from puffco.btnet import OperatingState
+    from puffco.telemetry.analytics import ProfileStats, analyze, profile_summary
+    from puffco.telemetry.sessions import HeatSession, SessionStore
+
+    def session(i):  # one sample a second: a 40 s ramp, then holding around the target
+        target = 230.0 + i % 4 * 10
+        heater = [min(target + 3, 20 + s * (target - 20) / 40) - s % 5 for s in range(120)]
+        columns = {'t': array('d', range(120)), 'heater_temp': array('f', heater),
+                   'target_temp': array('f', [target] * 120),
+                   'operating_state': array('b', [OperatingState.HEAT_CYCLE_PREHEAT] * 40 +
+                                            [OperatingState.HEAT_CYCLE_ACTIVE] * 80)}
+        meta = {'profile': i % 4, 'target_temp': target, 'boosts': [[60.0, 'temp', 5]] if i % 3 == 0 else []}
+        return i * 600.0, i * 600.0 + 120, meta, columns
+
+    sessions = [HeatSession(*session(i)) for i in range(5000)]
+    report('analyze 5000 sessions', measure(lambda _: profile_summary(analyze(sessions)), n=10))
+
+    store = SessionStore(os.path.join(tempfile.mkdtemp(), 'sessions.pcs'))
+    for i in range(500):
+        store.append(*session(i))
+    stats, folded = ProfileStats(), 0
+    stats.add(analyze(store.query()))
+    folded = len(store)
+
+    def full(i):  # update_stats before: everything in the store, again
+        store.append(*session(500 + i))
+        profile_summary(analyze(store.query()))
+
+    def incremental(i):
+        nonlocal folded
+        store.append(*session(510 + i))
+        stats.add(analyze(store.query(first=folded)))
+        folded = len(store)
+        stats.summary()
+
+    report('500 stored + 1, analyse all', measure(full, n=10))
+    report('500 stored + 1, fold in the new', measure(incremental, n=10))
+    incremental_summary, full_summary = stats.summary(), profile_summary(analyze(store.query()))
+    same = all(a == b or (a is not None and b is not None and abs(a - b) < 1e-9)
+               for idx in full_summary for a, b in zip(incremental_summary[idx].values(), full_summary[idx].values()))
+    print(f'  {"":<32} incremental summary matches a full pass: {same}')
+    store.close()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--event-loop-probe']:
+        event_loop_probe()
+        sys.exit()
+
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        print(f'{name}: {BENCHMARKS[name].__doc__.strip()}')
+        BENCHMARKS[name]()